@@ -1,9 +1,33 @@
+import sys
+from services.Startup import StartupProfile
+
+# Installed before anything else is imported, so the report covers every import
+startup_profile = StartupProfile().install() if __name__ == "__main__" and "--profile-startup" in sys.argv else None
+
 from services.STT import SpeechToText
 from services.TextGen import TextGenerator
-from services.TTS import TextToSpeech
+from services.Speculation import SpeculativeGenerator
+from services.TTS import PCM_SAMPLE_RATE, TextToSpeech
+from services.AudioBuffer import AudioBuffer
 from services.pipecat_openai_tts import OpenAITTSBlock
 from services.ConversationExtractor import ConversationExtractor
-import pipecat  # Import the pipecat module
+from services.AudioStream import CaptureService, DuplexCapture
+from services.Telemetry import get_telemetry, in_context
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import inspect
+import queue
+import threading
+
+GREETING = "Hello! I'm your AI voice assistant. How can I help you today?"
+EXIT_MESSAGE = "Goodbye! It was nice talking to you."
+# Fixed phrases synthesized into the TTS cache at startup
+PREWARM_PHRASES = [GREETING, EXIT_MESSAGE]
+
+def block_span_name(block):
+    """Name of the telemetry span timing a pipeline block"""
+    return "block." + type(block).__name__
+
 
 # Define your own Pipeline class
 class Pipeline:
@@ -11,13 +35,166 @@ class Pipeline:
         self.blocks = blocks
     
     def process(self, input_data):
+        telemetry = get_telemetry()
         current_data = input_data
         for block in self.blocks:
-            current_data = block(current_data)
+            with telemetry.span(block_span_name(block)):
+                current_data = block(current_data)
             if current_data is None:
                 break
         return current_data
 
+class PipelineCancelled(Exception):
+    """Raised inside stage workers when a StreamingPipeline run is cancelled"""
+
+
+_END_OF_STREAM = object()
+
+
+class StreamingPipeline:
+    """
+    Runs pipeline blocks concurrently, one worker thread per stage, joined by
+    bounded queues so a slow consumer applies backpressure upstream.
+
+    A block may return a generator to emit several partial outputs (tokens,
+    sentences, audio chunks) for one input; each is handed downstream as soon
+    as it is produced. A block with a `stream(inputs)` method receives the
+    whole input iterator instead, which lets it aggregate partials. None
+    outputs are dropped, matching Pipeline's stop-on-None behaviour, and a
+    BranchBlock routes each input through its chosen branch's blocks.
+
+    Each block's telemetry span covers one input, from the call until its
+    last output was handed downstream, and notes when the first output was
+    ready.
+    """
+
+    def __init__(self, blocks, maxsize=4):
+        self.blocks = blocks
+        self.maxsize = maxsize
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Stop all stages of the current run as soon as possible"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def process(self, input_data):
+        """Run to completion and return the last output, like Pipeline.process"""
+        result = None
+        for output in self.stream(input_data):
+            result = output
+        return result
+
+    def stream(self, input_data):
+        """Yield the final stage's outputs as soon as each one is produced"""
+        self._cancel_event.clear()
+        yield from self._run(self.blocks, iter([input_data]), self._cancel_event)
+
+    def _run(self, blocks, inputs, cancel_event):
+        errors = []
+        source = inputs
+        threads = []
+        for block in blocks:
+            out_queue = queue.Queue(maxsize=self.maxsize)
+            thread = threading.Thread(
+                target=in_context(self._stage_worker),
+                args=(block, source, out_queue, cancel_event, errors),
+                daemon=True,
+            )
+            threads.append(thread)
+            source = self._drain(out_queue, cancel_event)
+
+        for thread in threads:
+            thread.start()
+        completed = False
+        try:
+            for output in source:
+                yield output
+            completed = True
+        except PipelineCancelled:
+            pass
+        finally:
+            # Also reached when the consumer stops iterating early
+            if not completed:
+                cancel_event.set()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def _stage_worker(self, block, inputs, out_queue, cancel_event, errors):
+        try:
+            for output in self._outputs(block, inputs, cancel_event):
+                if output is not None:
+                    self._put(out_queue, output, cancel_event)
+        except PipelineCancelled:
+            pass
+        except Exception as e:
+            errors.append(e)
+            cancel_event.set()
+        finally:
+            try:
+                self._put(out_queue, _END_OF_STREAM, cancel_event)
+            except PipelineCancelled:
+                pass
+
+    def _outputs(self, block, inputs, cancel_event):
+        telemetry = get_telemetry()
+        name = block_span_name(block)
+        if isinstance(block, BranchBlock):
+            for item in inputs:
+                branch = block.if_true if block.condition(item) else block.if_false
+                yield from self._run(branch.blocks, iter([item]), cancel_event)
+            return
+        if hasattr(block, "stream"):
+            with telemetry.span(name) as span:
+                for output in self._guard(block.stream(inputs), cancel_event):
+                    span.output()
+                    yield output
+            return
+        for item in inputs:
+            with telemetry.span(name) as span:
+                result = block(item)
+                if inspect.isgenerator(result):
+                    for output in self._guard(result, cancel_event):
+                        span.output()
+                        yield output
+                    continue
+            yield result
+
+    def _guard(self, generator, cancel_event):
+        try:
+            for output in generator:
+                if cancel_event.is_set():
+                    raise PipelineCancelled()
+                yield output
+        finally:
+            generator.close()
+
+    def _drain(self, in_queue, cancel_event):
+        while True:
+            try:
+                item = in_queue.get(timeout=0.05)
+            except queue.Empty:
+                if cancel_event.is_set():
+                    raise PipelineCancelled()
+                continue
+            if item is _END_OF_STREAM:
+                return
+            yield item
+
+    def _put(self, out_queue, item, cancel_event):
+        while True:
+            try:
+                out_queue.put(item, timeout=0.05)
+                return
+            except queue.Full:
+                if cancel_event.is_set():
+                    raise PipelineCancelled()
+
 # Add this class to implement branching functionality
 class BranchBlock:
     def __init__(self, condition, if_true, if_false):
@@ -34,57 +211,120 @@ class BranchBlock:
             return self.if_false.process(input_data)
 
 class SpeechToTextBlock:
-    def __init__(self):
-        self.stt = SpeechToText()
+    def __init__(self, stt=None):
+        self.stt = stt or SpeechToText()
         self.last_text = None
     
-    def __call__(self, audio_file):
-        if audio_file:
-            self.last_text = self.stt.transcribe_audio(audio_file)
+    def __call__(self, audio):
+        if audio:
+            self.last_text = self.stt.transcribe_audio(audio)
+            get_telemetry().mark("transcript")
             return self.last_text
         return None
 
 class TextGeneratorBlock:
-    def __init__(self):
-        self.text_gen = TextGenerator()
+    def __init__(self, stream=False, speculative=False, response_cache=None, client=None):
+        self.text_gen = TextGenerator(client=client, response_cache=response_cache)
+        # When streaming, yield sentence chunks for a StreamingPipeline
+        self.stream_sentences = stream
+        # Feed partial transcripts to speculator.on_partial to start replies early
+        self.speculator = SpeculativeGenerator(self.text_gen) if speculative else None
     
     def __call__(self, text):
         if text:
+            if self.speculator is not None:
+                tokens = self.speculator.resolve(text)
+                if self.stream_sentences:
+                    return self.text_gen.stream_sentences(text, tokens=tokens)
+                return "".join(tokens).strip()
+            if self.stream_sentences:
+                return self.text_gen.stream_sentences(text)
             return self.text_gen.generate_response(text)
         return None
 
 class AudioRecorderBlock:
-    def __init__(self, silence_duration=4, max_record_time=30):
-        self.stt = SpeechToText()
+    def __init__(self, silence_duration=0.8, max_record_time=30, stt=None, player=None, source=None):
+        self.stt = stt or SpeechToText()
         self.silence_duration = silence_duration
         self.max_record_time = max_record_time
+        # When given, the microphone is opened right away but its input is
+        # ignored until the player has finished the previous reply
+        self.player = player
+        # Optional callable returning the frame source for each utterance
+        self.source = source
+        # Set while an utterance is being recorded
+        self.listening = threading.Event()
     
     def __call__(self, _):
         print("\nListening...")
-        return self.stt.record_audio(silence_duration=self.silence_duration, 
-                                    max_record_time=self.max_record_time)
+        hold = (lambda: self.player.playing) if self.player is not None else None
+        self.listening.set()
+        try:
+            return self.stt.record_audio(silence_duration=self.silence_duration, 
+                                        max_record_time=self.max_record_time,
+                                        source=self.source() if self.source else None,
+                                        hold=hold)
+        finally:
+            self.listening.clear()
+
+class StreamingSpeechToTextBlock:
+    """
+    Records and transcribes one utterance at the same time, replacing an
+    AudioRecorderBlock + SpeechToTextBlock pair. Each partial transcript is
+    passed to the `on_partial` callbacks while the caller is still talking;
+    the final transcript is the block's output.
+    """
+
+    def __init__(self, stt=None, backend=None, silence_duration=0.8, max_record_time=30, player=None, source=None,
+                 on_partial=None):
+        self.stt = stt or SpeechToText()
+        self.backend = backend
+        self.silence_duration = silence_duration
+        self.max_record_time = max_record_time
+        self.player = player
+        self.source = source
+        self.on_partial = list(on_partial or [])
+        self.last_text = None
+        self.listening = threading.Event()
+
+    def __call__(self, _):
+        print("\nListening...")
+        hold = (lambda: self.player.playing) if self.player is not None else None
+        self.last_text = None
+        self.listening.set()
+        try:
+            for hypothesis in self.stt.stream_transcription(silence_duration=self.silence_duration,
+                                                            max_record_time=self.max_record_time,
+                                                            source=self.source() if self.source else None,
+                                                            hold=hold, backend=self.backend):
+                if hypothesis.is_final:
+                    self.last_text = hypothesis.text
+                    get_telemetry().mark("transcript")
+                else:
+                    for callback in self.on_partial:
+                        callback(hypothesis.text)
+        finally:
+            self.listening.clear()
+        return self.last_text
 
 class AudioPlayerBlock:
-    def __init__(self):
-        self.tts = TextToSpeech()
+    def __init__(self, tts=None, wait=True):
+        self.tts = tts or TextToSpeech()
+        # When False, audio is queued on the playback engine and the block returns at once
+        self.wait = wait
     
-    def __call__(self, speech_file):
-        if speech_file:
+    def __call__(self, speech):
+        if speech:
             try:
-                self.tts.play_audio(speech_file)
+                if isinstance(speech, (bytes, bytearray, AudioBuffer)):
+                    done = self.tts.play(speech)
+                    if self.wait:
+                        done.result()
+                else:
+                    self.tts.play_audio(speech)
             except Exception as e:
                 print(f"Error playing audio: {e}")
-                # If there's an error, wait a moment and try to release the file
-                import time
-                time.sleep(1)
-                try:
-                    import os
-                    if os.path.exists(speech_file):
-                        # Just proceed without playing if we can't access it
-                        pass
-                except:
-                    pass
-        return speech_file  # Pass through for chaining
+        return speech  # Pass through for chaining
 
 class PrintBlock:
     def __init__(self, prefix=""):
@@ -102,23 +342,87 @@ class ExitCheckBlock:
     def __call__(self, text):
         if text and text.lower() in ['exit', 'quit', 'goodbye', 'bye']:
             self.should_exit = True
-            return "Goodbye! It was nice talking to you."
+            return EXIT_MESSAGE
         return text
 
 class AIVoiceAgentPipeline:
-    def __init__(self):
+    """
+    The voice agent loop: record, transcribe, generate, speak.
+
+    The caller is heard through the shared, always-open microphone capture,
+    or through `source`, any frame source such as
+    PacedSource(WavFileSource("recording.wav")). With `full_duplex=True`
+    that input is also monitored while the assistant responds. Speech detected during that time barges in:
+    playback stops, the in-flight generation and synthesis are cancelled
+    and the caller's utterance is recorded from its start. `player` is the
+    PlaybackEngine to speak through; the default plays through pygame.
+
+    With `streaming_stt=True` the utterance is transcribed while it is
+    spoken, using `stt_backend` (a TranscriptionBackend; the OpenAI API by
+    default), and partial transcripts are available to later stages. The
+    OpenAI backend's final transcript comes no sooner after the end of
+    speech than without streaming; only an incremental backend such as
+    VoskBackend shortens that gap.
+    With `speculative=True` as well, the reply is generated from the
+    partial transcript while the caller finishes talking and kept if the
+    final transcript matches it (see SpeculativeGenerator).
+    `response_cache`, a ResponseCache, answers repeated questions without
+    calling the model.
+
+    Everything the agent holds belongs to its one call; what calls share
+    is passed in: `client` for the OpenAI service (such as a CallClient),
+    `response_cache` and `extractor`, a ConversationExtractor writing to a
+    shared store. See CallScheduler for running many agents in one process.
+    """
+
+    def __init__(self, streaming=True, full_duplex=False, source=None, player=None, streaming_stt=False,
+                 stt_backend=None, speculative=False, response_cache=None, client=None, extractor=None):
+        if full_duplex and not streaming:
+            raise ValueError("Full-duplex mode needs the streaming pipeline, which can be cancelled")
+        if speculative and not streaming_stt:
+            raise ValueError("Speculative generation needs the partial transcripts of streaming_stt")
+
+        # One speech-to-text and one text-to-speech service are shared by
+        # all blocks; they all use `client` underneath, the shared OpenAI
+        # client by default
+        speech_to_text = SpeechToText(client=client,
+                                      capture=CaptureService(source) if source is not None else None)
+        text_to_speech = TextToSpeech(client=client, player=player)
+        self.speech_to_text = speech_to_text
+        # Audio devices made for this call alone, closed with it
+        self._own_capture = speech_to_text.capture if source is not None else None
+        self._own_player = player
+
         # Create pipeline blocks
-        self.recorder = AudioRecorderBlock()
-        self.stt = SpeechToTextBlock()
+        self.capture = None
+        if full_duplex:
+            listen = {"source": lambda: self.capture.listen()}
+        else:
+            listen = {"player": text_to_speech.player}
+        if streaming_stt:
+            # One block records and transcribes, so it stands in for both stages
+            self.stt = self.recorder = StreamingSpeechToTextBlock(stt=speech_to_text, backend=stt_backend,
+                                                                  **listen)
+        else:
+            self.recorder = AudioRecorderBlock(stt=speech_to_text, **listen)
+            self.stt = SpeechToTextBlock(stt=speech_to_text)
         self.exit_check = ExitCheckBlock()
-        self.text_gen = TextGeneratorBlock()
-        self.tts = OpenAITTSBlock(voice="nova")
+        self.text_gen = TextGeneratorBlock(stream=streaming, speculative=speculative,
+                                           response_cache=response_cache, client=client)
+        if speculative:
+            self.stt.on_partial.append(self.text_gen.speculator.on_partial)
+        # Speech stays in memory and is queued on the playback engine, so the
+        # recorder is armed while the tail of the reply is still playing. Raw
+        # PCM goes to the mixer as it is, with no mp3 to decode.
+        self.tts = OpenAITTSBlock(voice="nova", tts=text_to_speech, to_file=False, fmt="pcm")
         self.user_printer = PrintBlock("You: ")
         self.assistant_printer = PrintBlock("Assistant: ")
-        self.audio_player = AudioPlayerBlock()
+        self.audio_player = AudioPlayerBlock(tts=text_to_speech, wait=False)
         
         # Add the conversation extractor
-        self.extractor = ConversationExtractor()
+        self.extractor = extractor if extractor is not None else ConversationExtractor()
+        # Set by hang_up() to end the call at the next turn boundary
+        self.hung_up = threading.Event()
         
         # Create the exit branch pipeline
         self.exit_pipeline = Pipeline([  # Use Pipeline class with a list of blocks
@@ -127,23 +431,22 @@ class AIVoiceAgentPipeline:
             self.audio_player
         ])
         
-        # Create a custom block factory that captures user input for the extractor
-        def create_extractor_block(user_text):
-            return self.InformationExtractorBlock(self.extractor, user_text)
-
         # Create the conversation pipeline with information extraction
         self.conversation_pipeline = Pipeline([
             self.text_gen,
             self.assistant_printer,
-            lambda text: create_extractor_block(self.stt.last_text)(text),  # Capture user input
+            # Read the user input lazily so the extractor sees the current turn
+            self.InformationExtractorBlock(self.extractor, lambda: self.stt.last_text,
+                                           memory=self.text_gen.text_gen.memory),
             self.tts,
             self.audio_player
         ])
         
-        # Build the main pipeline with our custom branching
-        self.pipeline = Pipeline([  # Use Pipeline class with a list of blocks
-            self.recorder,
-            self.stt,
+        # Build the main pipeline with our custom branching. The streaming
+        # engine overlaps generation, synthesis and playback across stages.
+        pipeline_class = StreamingPipeline if streaming else Pipeline
+        self.pipeline = pipeline_class([
+            *([self.stt] if streaming_stt else [self.recorder, self.stt]),
             self.user_printer,
             self.exit_check,
             BranchBlock(
@@ -152,39 +455,154 @@ class AIVoiceAgentPipeline:
                 if_false=self.conversation_pipeline
             )
         ])
+        
+        # Start capturing only once every block exists, since the capture thread checks their state
+        if full_duplex:
+            # Barge-in detection on the call's capture service, whose input stays open for the whole call
+            self.capture = DuplexCapture(speech_to_text.capture, armed=self._assistant_active,
+                                         on_barge_in=self.barge_in)
     
     # Add a new block to extract information
     class InformationExtractorBlock:
-        def __init__(self, extractor, user_text=None):
+        def __init__(self, extractor, user_text=None, memory=None):
             self.extractor = extractor
+            # Either the user's text or a callable returning it
             self.user_text = user_text
+            # ConversationMemory to pin the session's extracted details into
+            self.memory = memory
             
         def __call__(self, assistant_text):
-            if assistant_text and self.user_text:
+            user_text = self.user_text() if callable(self.user_text) else self.user_text
+            if assistant_text and user_text:
                 extracted_info = self.extractor.extract_information(
-                    self.user_text, assistant_text
+                    user_text, assistant_text
                 )
                 # Optionally print extracted information
                 if any(extracted_info.values()):
                     print("\n[Important information extracted]")
+                    if self.memory is not None:
+                        self.memory.pin_facts(self.extractor.get_session_summary())
             return assistant_text  # Pass through for chaining
+
+        def stream(self, assistant_texts):
+            """Pass partial replies straight through and extract once the full reply is known"""
+            parts = []
+            for text in assistant_texts:
+                parts.append(text)
+                yield text
+            if parts:
+                self(" ".join(parts))
     
-    def start_conversation(self):
+    def _input_ended(self):
+        """True once the caller's audio source has run out, e.g. at the end of a WAV file"""
+        capture = self.capture if self.capture is not None else self.speech_to_text.capture
+        return capture.ended
+
+    def _open_output(self):
+        try:
+            self.audio_player.tts.player.open(sample_rate=PCM_SAMPLE_RATE if self.tts.fmt == "pcm" else None)
+        except Exception as e:
+            print(f"Error opening the audio output: {e}")
+
+    def _open_input(self):
+        """Start capturing; the microphone then stays open for the whole call"""
+        if self.capture is not None:
+            # The full-duplex capture runs from the start already
+            return
+        try:
+            self.speech_to_text.capture.start()
+        except Exception as e:
+            # Left for the first turn to retry and report
+            print(f"Error opening the audio input: {e}")
+
+    def _warm_up(self, phrases):
+        """Start the OpenAI client and synthesize the fixed phrases into the cache"""
+        tts = self.tts.tts
+        try:
+            tts.api.client
+        except Exception as e:
+            print(f"Error starting the OpenAI client: {e}")
+        tts.prewarm(phrases, self.tts.voice, response_format=self.tts.fmt)
+
+    def _assistant_active(self):
+        """True from the end of the caller's utterance until the reply has finished playing"""
+        return self.audio_player.tts.player.playing or not self.recorder.listening.is_set()
+
+    def hang_up(self):
+        """End the call from outside: stop speaking, cut the current turn short and stop listening"""
+        self.hung_up.set()
+        self.audio_player.tts.stop()
+        if isinstance(self.pipeline, StreamingPipeline):
+            self.pipeline.cancel()
+        if self._own_capture is not None:
+            self._own_capture.close()
+
+    def close(self):
+        """Release this call's own audio input and output; the shared microphone and speaker stay open"""
+        if self.capture is not None:
+            self.capture.close()
+        if self._own_capture is not None:
+            self._own_capture.close()
+        if self._own_player is not None:
+            self._own_player.close()
+
+    def barge_in(self):
+        """The caller started talking over the assistant: stop speaking and responding"""
+        print("\n[Barge-in] Caller is speaking, stopping the reply")
+        self.audio_player.tts.stop()
+        if not self.recorder.listening.is_set():
+            self.pipeline.cancel()
+
+    def start_conversation(self, profile=None):
+        """Greet the caller and run turns until they say goodbye; `profile` is a StartupProfile to report"""
         print("AI Voice Agent activated. Speak to interact.")
         print("Say 'exit' or 'quit' to end the conversation.")
+        step = profile.step if profile is not None else lambda name: None
         
-        # Initial greeting
-        initial_greeting = "Hello! I'm your AI voice assistant. How can I help you today?"
-        print("Assistant: " + initial_greeting)
-        tts = TextToSpeech()
-        speech_file = tts.generate_speech(initial_greeting, voice="nova")
-        tts.play_audio(speech_file)
+        # Initial greeting, synthesized or read from the cache while the audio
+        # devices start; it plays as soon as it and the output are ready. The
+        # OpenAI client and the remaining fixed phrases are warmed up in the
+        # background.
+        print("Assistant: " + GREETING)
+        threading.Thread(target=self._warm_up, args=([p for p in PREWARM_PHRASES if p != GREETING],),
+                         daemon=True).start()
+
+        def synthesize_greeting():
+            audio = self.tts(GREETING)
+            step("greeting synthesized")
+            return audio
+
+        def open_input():
+            self._open_input()
+            step("audio input open")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            greeting = pool.submit(synthesize_greeting)
+            pool.submit(open_input)
+            self._open_output()
+            step("audio output open")
+            greeting = greeting.result()
+            if greeting:
+                self.tts.tts.play(greeting)
+            step("greeting queued")
+        if profile is not None:
+            profile.uninstall()
+            print(profile.report())
         
         # Run the pipeline in a loop
-        while not self.exit_check.should_exit:
+        while not self.exit_check.should_exit and not self.hung_up.is_set():
             try:
                 # None is a placeholder input to start the pipeline
                 self.pipeline.process(None)
+                if self.hung_up.is_set():
+                    print("\nCall ended.")
+                    break
+                if self.capture and self.pipeline.cancelled:
+                    # Drop audio a stage queued while the run was being cancelled
+                    self.audio_player.tts.stop()
+                if self._input_ended():
+                    print("\nAudio input ended.")
+                    break
                 
                 if self.exit_check.should_exit:
                     print("\nExiting AI Voice Agent...")
@@ -195,7 +613,23 @@ class AIVoiceAgentPipeline:
                 break
             except Exception as e:
                 print(f"Error in pipeline: {e}")
+            finally:
+                # A speculation the turn didn't use (no speech, exit) is of no further use
+                if self.text_gen.speculator is not None:
+                    self.text_gen.speculator.discard()
+                get_telemetry().flush()
+        
+        # Let the goodbye finish playing
+        if not self.hung_up.is_set():
+            self.audio_player.tts.player.wait()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI voice agent")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import and initialization times once the greeting is playing")
+    parser.parse_args()
     agent = AIVoiceAgentPipeline()
-    agent.start_conversation()
\ No newline at end of file
+    if startup_profile is not None:
+        startup_profile.step("agent built")
+    agent.start_conversation(startup_profile)
+    get_telemetry().close()
\ No newline at end of file
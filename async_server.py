@@ -0,0 +1,178 @@
+"""
+Async (ASGI) version of web_server.py for serving many concurrent calls.
+
+Each caller gets its own conversation, keyed by a session id that is
+returned with every reply and sent back by the client (as `session_id` in
+the request body or an `X-Session-Id` header). LLM and TTS calls are awaited
+on the event loop, so one slow completion never blocks other requests.
+
+    python async_server.py --port 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+from services.AudioBuffer import MIME_TYPES
+from services.OpenAIClient import get_async_service
+from services.ReplyStream import aiter_reply_events, sse_event
+from services.ResponseCache import ResponseCache
+from services.SessionStore import SessionStore
+from services.Telemetry import get_telemetry
+from services.TextGen import TextGenerator
+from services.TTS import TextToSpeech
+
+VOICE = "nova"
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+
+class ConversationSession:
+    """Conversation state of one caller"""
+
+    def __init__(self):
+        self.text_generator = TextGenerator(response_cache=response_cache)
+        # Turns of one session are handled one at a time, in order
+        self.lock = asyncio.Lock()
+
+
+class GenerateRequest(BaseModel):
+    text: str
+    session_id: Optional[str] = None
+    # Speech format: mp3 for browsers, pcm or wav for clients that play or process raw audio; "none"
+    # streams sentences without speech, for clients that have the avatar service speak them
+    format: str = "mp3"
+
+
+# Replies to frequent questions, shared by every caller
+response_cache = ResponseCache(max_items=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+                               semantic=os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1")
+sessions = SessionStore(ConversationSession,
+                        max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+                        ttl=float(os.getenv("SESSION_TTL", "1800")))
+tts = TextToSpeech()
+
+
+async def _expire_sessions(interval=60):
+    while True:
+        await asyncio.sleep(interval)
+        sessions.expire()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    task = asyncio.create_task(_expire_sessions())
+    try:
+        yield
+    finally:
+        task.cancel()
+        get_telemetry().close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/", response_class=HTMLResponse)
+async def index():
+    """Render the main page with the Simli avatar"""
+    with open(TEMPLATE_PATH, "r") as f:
+        return f.read()
+
+
+def _check_format(fmt, allow_none=False):
+    if fmt not in MIME_TYPES and not (allow_none and fmt == "none"):
+        raise HTTPException(status_code=400, detail=f"Unsupported audio format: {fmt}")
+
+
+@app.post("/api/generate-response")
+async def generate_response(body: GenerateRequest, request: Request):
+    """Generate the AI reply for one session and return it with a URL for its speech"""
+    _check_format(body.format)
+    session_id, session = sessions.get(body.session_id or request.headers.get("X-Session-Id"))
+    async with session.lock:
+        ai_response = await session.text_generator.generate_response_async(body.text)
+    try:
+        await tts.synthesize_async(ai_response, voice=VOICE, response_format=body.format)
+    except Exception as e:
+        print(f"Error generating speech: {e}")
+        return {"text": ai_response, "audio_url": None, "session_id": session_id}
+    key = tts.cache.key(ai_response, VOICE, tts.model, body.format)
+    return {"text": ai_response, "audio_url": f"/api/audio/{key}.{body.format}", "session_id": session_id}
+
+
+@app.post("/api/generate-response-stream")
+async def generate_response_stream(body: GenerateRequest, request: Request):
+    """
+    Stream the AI reply as Server-Sent Events: the session id first, then
+    text deltas as they are generated and the speech of each sentence as
+    soon as it is synthesized (or each sentence's text, with format "none")
+    """
+    _check_format(body.format, allow_none=True)
+    session_id, session = sessions.get(body.session_id or request.headers.get("X-Session-Id"))
+    response_format = None if body.format == "none" else body.format
+
+    async def events():
+        yield sse_event("session", {"session_id": session_id})
+        async with session.lock:
+            async for event, data in aiter_reply_events(session.text_generator, tts, body.text, voice=VOICE,
+                                                        response_format=response_format):
+                yield sse_event(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/api/audio/{name}")
+async def audio(name):
+    """Serve synthesized speech straight from the TTS cache, as <key>.<format> (mp3 without one)"""
+    key, _, fmt = name.partition(".")
+    data = await asyncio.to_thread(tts.cache.get, key)
+    if data is None or (fmt or "mp3") not in MIME_TYPES:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return Response(content=data, media_type=MIME_TYPES[fmt or "mp3"])
+
+
+@app.get("/api/simli-config")
+async def simli_config():
+    """Return Simli configuration for the frontend"""
+    return {
+        "roomUrl": os.getenv("SIMLI_ROOM_URL",
+                             "https://pc-7efd6f2a87c8db0e8fe4ea108a6e11b6.daily.co/hoHfCDtVcKbk3uy8l2LB"),
+        "sessionId": os.getenv("SIMLI_SESSION_ID", ""),
+        "token": os.getenv("SIMLI_TOKEN", ""),
+        # WebSocket of the Simli avatar service (services/simli.py); empty to play mp3 through the SDK
+        "audioSocketUrl": os.getenv("SIMLI_AUDIO_WS_URL", ""),
+    }
+
+
+@app.get("/api/stats")
+async def stats():
+    """Active sessions, OpenAI latency percentiles and cache hit rates"""
+    return {
+        "sessions": len(sessions),
+        "session_metrics": sessions.metrics,
+        "openai": get_async_service().latency_summary(),
+        "tts_cache_hit_rate": tts.cache.hit_rate,
+        "response_cache": {**response_cache.metrics, "hit_rate": response_cache.hit_rate},
+        "telemetry": get_telemetry().summary(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Latency histograms in the Prometheus text format (enable with TELEMETRY=memory or any sink)"""
+    return Response(content=get_telemetry().prometheus(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
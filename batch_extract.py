@@ -0,0 +1,41 @@
+"""
+Backfill information extraction and session summaries over conversation history.
+
+Examples:
+    python batch_extract.py --storage conversation_data.jsonl --output backfill/
+    python batch_extract.py --import transcripts.jsonl --output imported/ --workers 8
+
+Re-running with the same --output resumes from the last completed chunk;
+--no-resume deletes the earlier output first.
+"""
+import argparse
+
+from services.BatchProcessor import BatchProcessor, iter_store, iter_transcripts
+from services.ConversationStore import open_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--storage", help="conversation store to reprocess (.jsonl, .db or .sqlite)")
+    source.add_argument("--import", dest="import_path",
+                        help="external transcripts (JSON Lines) or a legacy conversation_data.json")
+    parser.add_argument("--output", required=True, help="directory for part files, checkpoint and summaries")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="turns per chunk")
+    parser.add_argument("--no-resume", action="store_true", help="discard an earlier run's output and start over")
+    args = parser.parse_args()
+
+    processor = BatchProcessor(args.output, workers=args.workers, chunk_size=args.chunk_size)
+    if args.storage:
+        store = open_store(args.storage, flush_interval=0)
+        try:
+            processor.run(iter_store(store), resume=not args.no_resume)
+        finally:
+            store.close()
+    else:
+        processor.run(iter_transcripts(args.import_path), resume=not args.no_resume)
+
+
+if __name__ == "__main__":
+    main()
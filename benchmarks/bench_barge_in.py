@@ -0,0 +1,106 @@
+"""
+Measures barge-in: a prerecorded utterance (recording.wav by default) is
+played into a CaptureService with a DuplexCapture tap, in real time, while
+the assistant is "speaking" through a PlaybackEngine with a headless sink.
+Reports how long after the caller's speech onset playback was stopped, and
+whether the recorded utterance starts before that onset.
+
+    python benchmarks/bench_barge_in.py --wav recording.wav --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.AudioPlayback import NullSink, PlaybackEngine
+from services.AudioStream import (
+    FRAME_SIZE, ArraySource, CaptureService, DuplexCapture, PacedSource, StreamingRecorder,
+    VoiceActivityDetector, WavFileSource,
+)
+
+
+def speech_onset(samples, sample_rate, vad):
+    """Time of the first frame of the onset run, as found by offline VAD"""
+    vad.reset()
+    for i, frame in enumerate(ArraySource(samples, sample_rate=sample_rate)):
+        if vad.update(frame) == "start":
+            return (i - vad.onset_frames + 1) * FRAME_SIZE / sample_rate
+    return None
+
+
+def run_once(samples, sample_rate, lead_in, vad_threshold):
+    # The assistant talks for far longer than the test runs
+    player = PlaybackEngine(NullSink(realtime=True))
+    player.play(b"\0\0" * 24000 * 30, fmt="pcm")
+    stopped = {}
+    listening = []
+
+    def on_barge_in():
+        player.stop()
+        stopped["at"] = time.monotonic()
+
+    audio = np.concatenate([np.zeros(int(lead_in * sample_rate), dtype=np.int16), samples,
+                            np.zeros(sample_rate, dtype=np.int16)])
+    vad = VoiceActivityDetector(energy_threshold=vad_threshold, onset_frames=5)
+    capture = DuplexCapture(CaptureService(PacedSource(ArraySource(audio, sample_rate=sample_rate))),
+                            armed=lambda: player.playing and not listening,
+                            on_barge_in=on_barge_in, vad=vad)
+    started = time.monotonic()
+    onset = lead_in + speech_onset(samples, sample_rate, VoiceActivityDetector(energy_threshold=vad_threshold,
+                                                                               onset_frames=5))
+    while "at" not in stopped and not capture.ended:
+        time.sleep(0.005)
+    listening.append(True)
+    recorder = StreamingRecorder(capture.listen(), vad=VoiceActivityDetector(energy_threshold=vad_threshold),
+                                 max_record_time=len(audio) / sample_rate)
+    recorded = recorder.record()
+    player.close()
+    if "at" not in stopped:
+        return None
+    # Does the recording contain the onset? Compare it with the source audio
+    head = recorded[:FRAME_SIZE] if recorded is not None else None
+    position = None
+    if head is not None:
+        for start in range(0, len(audio) - FRAME_SIZE, FRAME_SIZE):
+            if np.array_equal(audio[start:start + FRAME_SIZE], head):
+                position = start / sample_rate
+                break
+    return {
+        "stop_delay": stopped["at"] - started - onset,
+        "recorded_from": None if position is None else position - onset,
+        "recorded_seconds": 0 if recorded is None else len(recorded) / sample_rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      "recording.wav"))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--lead-in", type=float, default=1.0, help="seconds of assistant speech before the caller talks")
+    parser.add_argument("--peak", type=int, default=16000, help="normalize the recording to this peak amplitude")
+    parser.add_argument("--vad-threshold", type=int, default=800)
+    args = parser.parse_args()
+
+    source = WavFileSource(args.wav)
+    samples = source.samples.astype(np.float64)
+    samples = (samples * args.peak / max(1, np.abs(samples).max())).astype(np.int16)
+
+    results = [run_once(samples, source.sample_rate, args.lead_in, args.vad_threshold) for _ in range(args.runs)]
+    detected = [r for r in results if r is not None]
+    print(f"barge-in detected in {len(detected)}/{len(results)} runs")
+    if detected:
+        delays = [r["stop_delay"] * 1000 for r in detected]
+        print(f"playback stopped after onset  mean {statistics.mean(delays):6.1f} ms   max {max(delays):6.1f} ms")
+        for r in detected:
+            offset = "not found" if r["recorded_from"] is None else f"{r['recorded_from'] * 1000:+.0f} ms"
+            print(f"recording starts at onset {offset}, {r['recorded_seconds']:.2f}s captured")
+
+
+if __name__ == "__main__":
+    main()
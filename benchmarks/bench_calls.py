@@ -0,0 +1,156 @@
+"""
+Runs many calls in one process with CallScheduler, against the stub
+OpenAI server: each caller is recording.wav said a few times, replayed in
+real time, and each call's speech goes to its own headless sink. Reports
+the time from the end of each utterance to the start of the reply's
+playback across all calls, the OpenAI requests that had to wait for a
+slot and the process's peak memory.
+
+    python benchmarks/bench_calls.py --calls 10 --turns 2
+    python benchmarks/bench_calls.py --calls 10 --per-call-requests 1 --max-upstream 4
+"""
+import argparse
+import contextlib
+import io
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import caller_audio
+from benchmarks.stub_openai_server import start_stub_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(0.95 * len(values)))]
+
+
+class _TimedSource:
+    """Notes when the paced caller audio started, which dates every utterance in it"""
+
+    def __init__(self, source):
+        self.source = source
+        self.sample_rate = source.sample_rate
+        self.started = None
+
+    def __iter__(self):
+        for frame in self.source:
+            if self.started is None:
+                self.started = time.monotonic()
+            yield frame
+
+    def close(self):
+        self.source.close()
+
+
+def run_calls(calls=10, turns=2, wav=os.path.join(ROOT, "recording.wav"), gap=3.0, peak=16000, max_calls=None,
+              max_upstream=24, per_call_requests=3, first_token_latency=0.3, token_latency=0.02,
+              speech_latency=0.2, transcription_latency=0.3, verbose=False):
+    """Run `calls` concurrent calls of `turns` utterances each and return their reply latencies in milliseconds"""
+    server, base_url = start_stub_server(first_token_latency=first_token_latency, token_latency=token_latency,
+                                         speech_latency=speech_latency, transcription_latency=transcription_latency)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from multi_call import SharedServices
+    from services.AudioPlayback import NullSink
+    from services.AudioStream import ArraySource, PacedSource
+    from services.CallScheduler import CallScheduler
+    from services.TTSCache import TTSCache
+
+    audio, sample_rate = caller_audio(wav, turns, gap, peak)
+    # Where each utterance ends in the caller's audio, in seconds
+    utterance = (len(audio) / sample_rate - 0.5) / turns - gap
+    speech_ends = [0.5 + k * (utterance + gap) + utterance for k in range(turns)]
+
+    class TimedSink(NullSink):
+        def __init__(self):
+            super().__init__(realtime=True)
+            self.starts = []
+
+        def start(self, chunk):
+            self.starts.append(time.monotonic())
+            super().start(chunk)
+
+    cwd = os.getcwd()
+    output = sys.stdout if verbose else io.StringIO()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(output):
+        # The conversation log is written to the working directory
+        os.chdir(tmp)
+        try:
+            services = SharedServices(max_upstream, per_call_requests, full_duplex=True)
+            # Every caller asks the same question; don't let the caches hide generation or synthesis
+            services.response_cache = None
+            uncached = TTSCache(cache_dir=None, max_memory_items=0)
+
+            def factory(call):
+                agent = services.agent(call)
+                agent.tts.tts.cache = uncached
+                return agent
+
+            scheduler = CallScheduler(factory, max_calls=max_calls or calls)
+            started = time.perf_counter()
+            submitted = [scheduler.submit(_TimedSource(PacedSource(ArraySource(audio, sample_rate=sample_rate))),
+                                          TimedSink()) for _ in range(calls)]
+            scheduler.drain()
+            elapsed = time.perf_counter() - started
+            services.close()
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+    latencies = []
+    for call in submitted:
+        for end in speech_ends:
+            end += call.source.started
+            replies = [start for start in call.sink.starts if start > end]
+            if replies:
+                latencies.append(replies[0] - end)
+    limiter = services.limiter.metrics
+    return {
+        "calls": calls,
+        "call_errors": scheduler.metrics["failed"],
+        "replies": len(latencies),
+        "reply_latency.p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "reply_latency.p95_ms": _p95(latencies) * 1000 if latencies else None,
+        "upstream_waited": limiter["waited"],
+        "upstream_wait_ms": limiter["wait_seconds"] * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "elapsed_s": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--wav", default=os.path.join(ROOT, "recording.wav"))
+    parser.add_argument("--gap", type=float, default=3.0, help="seconds of silence after each utterance")
+    parser.add_argument("--max-calls", type=int, default=None, help="calls running at once (default: all)")
+    parser.add_argument("--max-upstream", type=int, default=24)
+    parser.add_argument("--per-call-requests", type=int, default=3)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--speech-latency", type=float, default=0.2)
+    parser.add_argument("--transcription-latency", type=float, default=0.3)
+    parser.add_argument("--verbose", action="store_true", help="show the agents' own output")
+    args = parser.parse_args()
+
+    results = run_calls(args.calls, args.turns, args.wav, args.gap, max_calls=args.max_calls,
+                        max_upstream=args.max_upstream, per_call_requests=args.per_call_requests,
+                        first_token_latency=args.first_token_latency, token_latency=args.token_latency,
+                        speech_latency=args.speech_latency, transcription_latency=args.transcription_latency,
+                        verbose=args.verbose)
+    for name, value in results.items():
+        print(f"{name:<28} {'-' if value is None else f'{value:10.1f}'}")
+
+
+if __name__ == "__main__":
+    main()
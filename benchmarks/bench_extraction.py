@@ -0,0 +1,114 @@
+"""
+Checks that the compiled ExtractionEngine returns exactly what the original
+ConversationExtractor loop returned on a golden set of turns, then times
+both on a synthetic bulk corpus.
+
+    python benchmarks/bench_extraction.py --turns 100000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_search import synthetic_turns
+from services.ExtractionEngine import DEFAULT_PATTERNS, ExtractionEngine
+
+KEYWORDS = [
+    "appointment", "schedule", "meeting", "remember", "important",
+    "deadline", "contact", "follow up", "call back", "priority",
+    "urgent", "critical", "key point", "action item"
+]
+
+GOLDEN_TURNS = [
+    ("I need you to book an appointment for me.",
+     "Sure, I can help with that! What kind of appointment would you like to book?"),
+    ("My email is jane.doe@example.com and my number is +1 (555) 123-4567.",
+     "Thanks Ms. Doe. I'll remember that and follow up by email."),
+    ("Can we meet on 12/05/2025 at 3:30 pm? It's urgent.",
+     "Yes, Dr. Alan Grant is free at 15:30. Is that meeting still a priority?"),
+    ("See https://example.com/path?x=1&y=2 for the deadline.",
+     "Got it. The key point is the deadline on 1-2-24, right?"),
+    ("Call back Mr. Smith.Then schedule it.", "OK!Will do. Action item noted..."),
+    ("İstanbul office CONTACT details please", "The İstanbul office contact is 555.987.6543."),
+    ("nothing special here", "no keywords or entities at all"),
+    ("", ""),
+    ("Prof. Xavier\nsaid 10:00AM and 9:15:30 PM", "Important:\tcritical stuff! Follow up? yes."),
+    ("numbers 1234567890 and 555-1234 and (555)555-5555", "Mrs. Robinson, Dr.Who, Mr. O'Neil"),
+]
+
+
+# Customized patterns have no trigger, so they take the per-turn path in batch mode
+CUSTOM_PATTERNS = {**DEFAULT_PATTERNS, "next": r'bye\W+(\w+)', "order": r'#(\d+)'}
+
+CUSTOM_TURNS = [
+    ("hi", "bye"),
+    ("hello world", "ok"),
+    ("Order #123 please, bye now", "Bye Sam! #45 noted"),
+    ("#", "9"),
+]
+
+
+def legacy_extract(patterns, keywords, user_text, assistant_text):
+    """The original ConversationExtractor.extract_information matching logic"""
+    combined_text = f"User: {user_text}\nAssistant: {assistant_text}"
+    extracted_info = defaultdict(list)
+    for info_type, pattern in patterns.items():
+        matches = re.findall(pattern, combined_text)
+        if matches:
+            extracted_info[info_type].extend(matches)
+    sentences = re.split(r'(?<=[.!?])\s+', combined_text)
+    for sentence in sentences:
+        if any(keyword in sentence.lower() for keyword in keywords):
+            extracted_info["important_points"].append(sentence.strip())
+    return dict(extracted_info)
+
+
+def check_golden(engine, turns, patterns=DEFAULT_PATTERNS):
+    expected = [legacy_extract(patterns, KEYWORDS, u, a) for u, a in turns]
+    single = [engine.extract(u, a) for u, a in turns]
+    batch = engine.extract_batch(turns)
+    for i, want in enumerate(expected):
+        for got, mode in ((single[i], "single"), (batch[i], "batch")):
+            if got != want or list(got) != list(want):
+                raise AssertionError(f"{mode} mismatch on turn {i}:\n  expected {want}\n  got      {got}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = ExtractionEngine(DEFAULT_PATTERNS, KEYWORDS)
+    corpus = [(entry["user_text"], entry["assistant_text"]) for _, _, entry in synthetic_turns(args.turns)]
+    check_golden(engine, GOLDEN_TURNS)
+    check_golden(engine, corpus[:5000])
+    # Kept apart from GOLDEN_TURNS, whose "İstanbul" sends the whole batch down the per-turn fallback
+    check_golden(ExtractionEngine(CUSTOM_PATTERNS, KEYWORDS), CUSTOM_TURNS, CUSTOM_PATTERNS)
+    print(f"golden set: identical results on {len(GOLDEN_TURNS) + len(CUSTOM_TURNS) + min(5000, len(corpus))} turns")
+
+    start = time.perf_counter()
+    for user_text, assistant_text in corpus:
+        legacy_extract(DEFAULT_PATTERNS, KEYWORDS, user_text, assistant_text)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user_text, assistant_text in corpus:
+        engine.extract(user_text, assistant_text)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(corpus), args.batch_size):
+        engine.extract_batch(corpus[i:i + args.batch_size])
+    batch = time.perf_counter() - start
+
+    for name, elapsed in (("legacy loop", legacy), ("engine, per turn", single), ("engine, batched", batch)):
+        print(f"{name:<18} {elapsed:7.2f} s   {len(corpus) / elapsed:10.0f} turns/s   {legacy / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmarks ConversationExtractor end to end at scale: extracting and
+storing synthetic receptionist turns, then searching and summarizing them,
+with the JSONL and the SQLite storage backends.
+
+    python benchmarks/bench_extractor.py --turns 50000 --backend both
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_search import QUERIES, synthetic_turns
+from services.ConversationExtractor import ConversationExtractor
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def measure(turns=20000, backend="jsonl", repeats=5):
+    """Extract, store, search and summarize `turns` turns; returns throughput and latencies in ms"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ext = "db" if backend == "sqlite" else "jsonl"
+        extractor = ConversationExtractor(storage_file=os.path.join(tmp, f"conversations.{ext}"), legacy_file=None)
+        corpus = [(session_id, entry["user_text"], entry["assistant_text"])
+                  for _, session_id, entry in synthetic_turns(turns)]
+
+        start = time.perf_counter()
+        for session_id, user_text, assistant_text in corpus:
+            extractor.current_session_id = session_id
+            extractor.extract_information(user_text, assistant_text)
+        stored = time.perf_counter() - start
+
+        # The first search also catches the index up with the stored history
+        start = time.perf_counter()
+        extractor.search_conversations(QUERIES[0][0], limit=20)
+        first_search = time.perf_counter() - start
+
+        searches = []
+        for _ in range(repeats):
+            for query, filters in QUERIES:
+                start = time.perf_counter()
+                extractor.search_conversations(query, **{"limit": 20, **filters})
+                searches.append(time.perf_counter() - start)
+
+        summaries = []
+        for i in range(repeats * 10):
+            start = time.perf_counter()
+            extractor.get_session_summary(f"session_{i * 7 % max(1, turns // 20)}")
+            summaries.append(time.perf_counter() - start)
+        extractor.store.close()
+
+    return {
+        "extract_store.turns_per_s": turns / stored,
+        "first_search_ms": first_search * 1000,
+        "search.p50_ms": statistics.median(searches) * 1000,
+        "search.p95_ms": _percentile(searches, 95) * 1000,
+        "session_summary.p50_ms": statistics.median(summaries) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=50000)
+    parser.add_argument("--backend", choices=["jsonl", "sqlite", "both"], default="both")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    for backend in (["jsonl", "sqlite"] if args.backend == "both" else [args.backend]):
+        results = measure(args.turns, backend, args.repeats)
+        print(f"{backend:<6} extract + store {results['extract_store.turns_per_s']:9.0f} turns/s   "
+              f"first search {results['first_search_ms']:8.1f} ms   "
+              f"search p50 {results['search.p50_ms']:7.2f} ms  p95 {results['search.p95_ms']:7.2f} ms   "
+              f"session summary p50 {results['session_summary.p50_ms']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Shows per-turn prompt size over a long session, comparing the old unbounded
+history with the token-budgeted ConversationMemory used by TextGenerator.
+
+    python benchmarks/bench_memory.py --turns 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ConversationMemory import ConversationMemory, TokenCounter
+from services.TextGen import SYSTEM_PROMPT
+
+USER_LINES = [
+    "Hi, I'd like to book an appointment for next Tuesday.",
+    "What are your opening hours on the weekend?",
+    "Can I reschedule my meeting with Dr. Smith to the afternoon?",
+    "My phone number is 555-123-4567, please call back if anything changes.",
+    "Do you have parking near the office?",
+    "Is it possible to bring a friend to the consultation?",
+]
+ASSISTANT_LINES = [
+    "Of course, I can help with that. What time works best for you on Tuesday?",
+    "We're open from ten to four on Saturdays and closed on Sundays.",
+    "Sure, Dr. Smith has openings at two and at three thirty. Which would you prefer?",
+    "Thanks, I've noted your number and we'll call you back if anything changes.",
+    "Yes, there's a public car park right next to the building, and the first hour is free.",
+    "Absolutely, you're welcome to bring someone along to the consultation.",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    counter = TokenCounter()
+    memory = ConversationMemory(SYSTEM_PROMPT, max_tokens=args.budget, counter=counter)
+    unbounded = [{"role": "system", "content": SYSTEM_PROMPT}]
+    unbounded_tokens = counter.count_message(unbounded[0])
+
+    rows = []
+    rebuilds = 0
+    start = time.perf_counter()
+    for turn in range(1, args.turns + 1):
+        user = rng.choice(USER_LINES)
+        unbounded.append({"role": "user", "content": user})
+        unbounded_tokens += counter.count_message(unbounded[-1])
+        payload_before = memory._payload
+        memory.add("user", user)
+        bounded_tokens = memory.token_count
+        if memory.messages is not payload_before:
+            rebuilds += 1
+        rows.append((turn, unbounded_tokens, bounded_tokens))
+
+        reply = rng.choice(ASSISTANT_LINES)
+        unbounded.append({"role": "assistant", "content": reply})
+        unbounded_tokens += counter.count_message(unbounded[-1])
+        memory.add("assistant", reply)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'turn':>5} {'unbounded prompt':>17} {'budgeted prompt':>16}")
+    for turn, full, bounded in rows:
+        if turn == 1 or turn % 25 == 0:
+            print(f"{turn:>5} {full:>17} {bounded:>16}")
+    print(f"max budgeted prompt: {max(r[2] for r in rows)} tokens (budget {args.budget})")
+    print(f"payload rebuilds: {rebuilds} of {args.turns} turns, evictions: {memory.evictions}")
+    print(f"memory bookkeeping: {elapsed / (2 * args.turns) * 1e6:.1f} us per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Runs whole AIVoiceAgentPipeline turns offline: the caller is a WAV file
+(recording.wav by default) replayed in real time as the microphone, the
+OpenAI API is the local stub server and playback goes to a NullSink.
+Reports the time from the caller's end of speech to the transcript, the
+first LLM token, the first synthesized audio and the start of playback.
+
+    python benchmarks/bench_pipeline.py --turns 3
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.stub_openai_server import start_stub_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TURN_EVENTS = ["transcript", "first_token", "first_audio", "playback_start"]
+
+
+def caller_audio(wav, turns, gap, peak):
+    """The utterance `turns` times, each followed by `gap` seconds of silence for the reply"""
+    from services.AudioStream import WavFileSource
+
+    source = WavFileSource(wav)
+    samples = source.samples.astype(np.float64)
+    samples = (samples * peak / max(1, np.abs(samples).max())).astype(np.int16)
+    silence = np.zeros(int(gap * source.sample_rate), dtype=np.int16)
+    parts = [silence[:source.sample_rate // 2]]
+    for _ in range(turns):
+        parts += [samples, silence]
+    return np.concatenate(parts), source.sample_rate
+
+
+def run_turns(turns=3, wav=os.path.join(ROOT, "recording.wav"), gap=3.0, peak=16000, streaming_stt=False,
+              first_token_latency=0.3, token_latency=0.02, speech_latency=0.2, transcription_latency=0.3,
+              verbose=False):
+    """Run the agent over `turns` utterances and return its turn latencies in milliseconds"""
+    server, base_url = start_stub_server(first_token_latency=first_token_latency, token_latency=token_latency,
+                                         speech_latency=speech_latency, transcription_latency=transcription_latency)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    import app
+    from services.AudioPlayback import NullSink, PlaybackEngine
+    from services.AudioStream import ArraySource, PacedSource
+    from services.Telemetry import Telemetry, set_telemetry
+    from services.TTSCache import TTSCache
+
+    audio, sample_rate = caller_audio(wav, turns, gap, peak)
+    telemetry = Telemetry()
+    set_telemetry(telemetry)
+    cwd = os.getcwd()
+    output = sys.stdout if verbose else io.StringIO()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(output):
+        # The conversation log is written to the working directory
+        os.chdir(tmp)
+        try:
+            agent = app.AIVoiceAgentPipeline(full_duplex=True, streaming_stt=streaming_stt,
+                                             source=PacedSource(ArraySource(audio, sample_rate=sample_rate)),
+                                             player=PlaybackEngine(NullSink()))
+            # Every turn gets the same reply; don't let the cache hide synthesis
+            agent.tts.tts.cache = TTSCache(cache_dir=None, max_memory_items=0)
+            agent.start_conversation()
+        finally:
+            os.chdir(cwd)
+            set_telemetry(None)
+            server.shutdown()
+
+    summary = telemetry.summary()
+    results = {"turns": summary.get("turn.end_of_speech_to_playback_start", {}).get("count", 0)}
+    for event in TURN_EVENTS:
+        stats = summary.get(f"turn.end_of_speech_to_{event}")
+        if stats:
+            results[f"end_of_speech_to_{event}.p50_ms"] = stats["p50"] * 1000
+            results[f"end_of_speech_to_{event}.p95_ms"] = stats["p95"] * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--wav", default=os.path.join(ROOT, "recording.wav"))
+    parser.add_argument("--gap", type=float, default=3.0, help="seconds of silence after each utterance")
+    parser.add_argument("--peak", type=int, default=16000, help="normalize the recording to this peak amplitude")
+    parser.add_argument("--streaming-stt", action="store_true")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--speech-latency", type=float, default=0.2)
+    parser.add_argument("--transcription-latency", type=float, default=0.3)
+    parser.add_argument("--verbose", action="store_true", help="show the agent's own output")
+    args = parser.parse_args()
+
+    results = run_turns(args.turns, args.wav, args.gap, args.peak, args.streaming_stt, args.first_token_latency,
+                        args.token_latency, args.speech_latency, args.transcription_latency, args.verbose)
+    print(f"{results.pop('turns')} turns completed")
+    for event in TURN_EVENTS:
+        if f"end_of_speech_to_{event}.p50_ms" in results:
+            print(f"end of speech to {event:<15} p50 {results[f'end_of_speech_to_{event}.p50_ms']:7.1f} ms   "
+                  f"p95 {results[f'end_of_speech_to_{event}.p95_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
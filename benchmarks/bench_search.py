@@ -0,0 +1,131 @@
+"""
+Benchmarks conversation search on a synthetic corpus of receptionist turns,
+comparing the indexed search backends with the old linear substring scan.
+
+    python benchmarks/bench_search.py --turns 1000000 --backend both
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.SearchIndex import InvertedIndex, SQLiteSearchIndex
+
+FIRST_NAMES = ["Smith", "Jones", "Patel", "Garcia", "Nguyen", "Kim", "Brown", "Okafor", "Rossi", "Novak"]
+TOPICS = ["appointment", "invoice", "refund", "parking", "prescription", "insurance", "delivery", "meeting"]
+USER_TEMPLATES = [
+    "Hi, I need to reschedule my {topic} with Dr. {name} to {day}.",
+    "Can you call me back at 555-{a:03d}-{b:04d} about the {topic}?",
+    "What time is my {topic} on {day}?",
+    "My email is {lower}@example.com, please send the {topic} details.",
+]
+ASSISTANT_TEMPLATES = [
+    "Of course, I've moved your {topic} with Dr. {name} to {day}.",
+    "Sure, we'll call you back about the {topic} shortly.",
+    "Your {topic} is booked for {day} at ten in the morning.",
+    "I've sent the {topic} details to your email.",
+]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+QUERIES = [
+    ("refund", {}),
+    ("reschedule appointment garcia", {}),
+    ("prescription", {"entity_type": "email"}),
+    ("invoice", {"start_date": "2025-03-01", "end_date": "2025-03-07"}),
+    ("parking nguyen", {"limit": 10, "offset": 20}),
+]
+
+
+def synthetic_turns(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        name = rng.choice(FIRST_NAMES)
+        values = {"topic": rng.choice(TOPICS), "name": name, "lower": name.lower(), "day": rng.choice(DAYS),
+                  "a": rng.randrange(1000), "b": rng.randrange(10000)}
+        template = rng.randrange(len(USER_TEMPLATES))
+        info = {"name": [f"Dr. {name}"]} if template == 0 else {}
+        if template == 3:
+            info["email"] = [f"{name.lower()}@example.com"]
+        day = 1 + (i * 365 // count)
+        entry = {
+            "timestamp": f"2025-{1 + (day - 1) // 31 % 12:02d}-{1 + (day - 1) % 28:02d}T10:00:00",
+            "user_text": USER_TEMPLATES[template].format(**values),
+            "assistant_text": ASSISTANT_TEMPLATES[template].format(**values),
+            "extracted_info": info,
+        }
+        yield i, f"session_{i // 20}", entry
+
+
+def linear_scan(entries, query):
+    """The original search_conversations loop"""
+    results = []
+    for entry_id, session_id, entry in entries:
+        if query.lower() in entry["user_text"].lower() or query.lower() in entry["assistant_text"].lower():
+            results.append(entry_id)
+    return results
+
+
+def time_queries(index, repeats):
+    timings = []
+    for _ in range(repeats):
+        for query, filters in QUERIES:
+            start = time.perf_counter()
+            index.search(query, **{"limit": 20, **filters})
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings
+
+
+def report(name, timings):
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    print(f"{name:<22} p50 {statistics.median(timings) * 1000:9.2f} ms   p95 {p95 * 1000:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=1_000_000)
+    parser.add_argument("--backend", choices=["memory", "sqlite", "both"], default="both")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--scan-sample", type=int, default=100_000,
+                        help="turns used to time the linear scan, extrapolated to the full corpus")
+    args = parser.parse_args()
+
+    sample = list(synthetic_turns(min(args.scan_sample, args.turns)))
+    start = time.perf_counter()
+    for query, _ in QUERIES:
+        linear_scan(sample, query)
+    scan_per_query = (time.perf_counter() - start) / len(QUERIES) * args.turns / len(sample)
+    print(f"linear scan            ~{scan_per_query * 1000:9.2f} ms per query (extrapolated to {args.turns} turns)")
+    del sample
+
+    if args.backend in ("memory", "both"):
+        index = InvertedIndex()
+        start = time.perf_counter()
+        for record in synthetic_turns(args.turns):
+            index.add(*record)
+        print(f"inverted index build   {time.perf_counter() - start:9.1f} s for {len(index)} turns")
+        report("inverted index query", time_queries(index, args.repeats))
+        del index
+
+    if args.backend in ("sqlite", "both"):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = SQLiteSearchIndex(os.path.join(tmp, "search.db"))
+            start = time.perf_counter()
+            batch = []
+            for record in synthetic_turns(args.turns):
+                batch.append(record)
+                if len(batch) >= 10000:
+                    index.add_many(batch)
+                    batch = []
+            index.add_many(batch)
+            print(f"sqlite fts5 build      {time.perf_counter() - start:9.1f} s for {len(index)} turns")
+            report("sqlite fts5 query", time_queries(index, args.repeats))
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measures the Simli avatar service offline, against the stub Simli and
+OpenAI servers: how long a room URL lookup takes cold and cached, how many
+upstream requests a burst of concurrent lookups makes, and how evenly
+/ws/avatar-audio paces the PCM frames of a few sentences spoken back to
+back.
+
+    python benchmarks/bench_simli.py --lookups 100 --sentences 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_openai_server import start_stub_server as start_openai_stub
+from benchmarks.stub_simli_server import start_stub_server as start_simli_stub
+
+SENTENCES = [
+    "Thanks for calling, I'd be happy to help with that.",
+    "We are open from nine until six, Monday to Friday.",
+    "Would you like me to book an appointment for you?",
+]
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(0.95 * len(values)))]
+
+
+async def measure_rooms(base_url, lookups):
+    from services.simli import SimliClient
+
+    client = SimliClient(base_url=base_url, session_id="bench", token="bench")
+    try:
+        start = time.perf_counter()
+        await client.room_url()
+        cold = time.perf_counter() - start
+        cached = []
+        for _ in range(lookups):
+            start = time.perf_counter()
+            await client.room_url()
+            cached.append(time.perf_counter() - start)
+        client.rooms.invalidate()
+        start = time.perf_counter()
+        await asyncio.gather(*(client.room_url() for _ in range(lookups)))
+        burst = time.perf_counter() - start
+    finally:
+        await client.close()
+    return cold, cached, burst
+
+
+def measure_pacing(sentences):
+    """Frame arrival times of `sentences` spoken through /ws/avatar-audio, relative to the first frame"""
+    from fastapi.testclient import TestClient
+    from services.simli import FRAME_MS, app
+
+    arrivals = []
+    with TestClient(app) as client, client.websocket_connect("/ws/avatar-audio") as websocket:
+        start = time.perf_counter()
+        for text in sentences:
+            websocket.send_json({"text": text})
+        done = 0
+        while done < len(sentences):
+            message = websocket.receive()
+            if message.get("bytes") is not None:
+                arrivals.append(time.perf_counter())
+            elif '"done"' in (message.get("text") or ""):
+                done += 1
+    first_frame = arrivals[0] - start
+    frame = FRAME_MS / 1000
+    # Once the lead is sent, frame i should arrive i frames after the first
+    lead = next(i for i, t in enumerate(arrivals) if t - arrivals[0] > frame / 2)
+    jitter = [abs((t - arrivals[lead]) - (i * frame)) for i, t in enumerate(arrivals[lead:])]
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    return first_frame, len(arrivals), lead, jitter, gaps
+
+
+def measure(lookups=50, sentences=3, room_latency=0.2, speech_latency=0.1):
+    """Run both measurements against fresh stub servers; latencies in ms"""
+    simli_stub, simli_url = start_simli_stub(room_latency=room_latency)
+    openai_stub, openai_url = start_openai_stub(speech_latency=speech_latency)
+    os.environ.update({"OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": openai_url, "SIMLI_API_BASE": simli_url,
+                       "SIMLI_SESSION_ID": "bench", "SIMLI_TOKEN": "bench", "TTS_CACHE_DIR": ""})
+    try:
+        cold, cached, burst = asyncio.run(measure_rooms(simli_url, lookups))
+        burst_requests = simli_stub.room_requests - 1
+        first_frame, frames, lead, jitter, gaps = measure_pacing((SENTENCES * sentences)[:sentences])
+    finally:
+        simli_stub.shutdown()
+        openai_stub.shutdown()
+    return {
+        "room_lookup.cold_ms": cold * 1000,
+        "room_lookup.cached_p50_ms": statistics.median(cached) * 1000,
+        "room_lookup.burst_ms": burst * 1000,
+        "room_lookup.burst_upstream_requests": burst_requests,
+        "audio.first_frame_ms": first_frame * 1000,
+        "audio.frames": frames,
+        "audio.lead_frames": lead,
+        "audio.jitter.p50_ms": statistics.median(jitter) * 1000,
+        "audio.jitter.p95_ms": _p95(jitter) * 1000,
+        "audio.max_gap_ms": max(gaps) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=50, help="cached and concurrent room lookups")
+    parser.add_argument("--sentences", type=int, default=3, help="sentences spoken back to back")
+    parser.add_argument("--room-latency", type=float, default=0.2)
+    parser.add_argument("--speech-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = measure(args.lookups, args.sentences, args.room_latency, args.speech_latency)
+    for name, value in results.items():
+        print(f"{name:<40} {value:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
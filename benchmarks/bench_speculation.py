@@ -0,0 +1,84 @@
+"""
+Measures speculative generation against the local stub server. Each turn
+replays an utterance as word-by-word partial transcripts, waits out the
+silence timeout and then resolves the final transcript, with and without a
+SpeculativeGenerator. Reports the time from the final transcript to the first
+sentence of the reply, the hit rate and the tokens wasted on misses.
+
+    python benchmarks/bench_speculation.py --turns 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_openai_server import start_stub_server
+
+# (what the partials show, the final transcript); the last pair is a late correction
+UTTERANCES = [
+    ("What are your opening hours on Saturday", "What are your opening hours on Saturday?"),
+    ("I'd like to book an appointment for tomorrow morning", "I'd like to book an appointment for tomorrow morning."),
+    ("Can I speak to someone about my bill", "Can I speak to someone about my bill?"),
+    ("Do you have parking for four cars", "Do you have parking for five cars?"),
+]
+
+
+def run_turn(generator, speculator, partial, final, words_per_second, hangover):
+    words = partial.split()
+    for i in range(1, len(words) + 1):
+        if speculator is not None:
+            speculator.on_partial(" ".join(words[:i]))
+        time.sleep(1 / words_per_second)
+    # The recorder only ends the utterance after `hangover` seconds of silence
+    time.sleep(hangover)
+    start = time.perf_counter()
+    tokens = speculator.resolve(final) if speculator is not None else None
+    first_sentence = None
+    for _sentence in generator.stream_sentences(final, tokens=tokens):
+        if first_sentence is None:
+            first_sentence = time.perf_counter() - start
+    return first_sentence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=5, help="passes over the sample utterances")
+    parser.add_argument("--first-token-latency", type=float, default=0.4)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--words-per-second", type=float, default=3.0)
+    parser.add_argument("--hangover", type=float, default=0.8, help="silence timeout of the recorder, seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(first_token_latency=args.first_token_latency,
+                                         token_latency=args.token_latency)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from services.Speculation import SpeculativeGenerator
+    from services.TextGen import TextGenerator
+
+    results = {}
+    for name in ("plain", "speculative"):
+        generator = TextGenerator()
+        speculator = SpeculativeGenerator(generator) if name == "speculative" else None
+        latencies = []
+        for _ in range(args.turns):
+            generator.clear_conversation()
+            for partial, final in UTTERANCES:
+                latencies.append(run_turn(generator, speculator, partial, final,
+                                          args.words_per_second, args.hangover))
+        results[name] = (latencies, speculator)
+
+    server.shutdown()
+    for name, (latencies, speculator) in results.items():
+        print(f"{name:12s} first sentence after final transcript   "
+              f"mean {statistics.mean(latencies) * 1000:7.1f} ms   p50 {statistics.median(latencies) * 1000:7.1f} ms")
+        if speculator is not None:
+            print(f"{'':12s} hit rate {speculator.hit_rate:.0%}   {speculator.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compares blocking and streaming TextGenerator responses against the local
+stub server, reporting time-to-first-token and time-to-first-sentence.
+
+    python benchmarks/bench_textgen_stream.py --turns 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_openai_server import start_stub_server
+
+
+def _summary(values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+    return f"mean {statistics.mean(values) * 1000:7.1f} ms   p50 {statistics.median(values) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(first_token_latency=args.first_token_latency,
+                                         token_latency=args.token_latency)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from services.TextGen import TextGenerator
+
+    generator = TextGenerator()
+    blocking = []
+    for _ in range(args.turns):
+        generator.clear_conversation()
+        start = time.perf_counter()
+        generator.generate_response("What are your opening hours?")
+        blocking.append(time.perf_counter() - start)
+
+    first_token, first_sentence, total = [], [], []
+    for _ in range(args.turns):
+        generator.clear_conversation()
+        for _chunk in generator.stream_sentences("What are your opening hours?"):
+            pass
+        first_token.append(generator.last_metrics["time_to_first_token"])
+        first_sentence.append(generator.last_metrics["time_to_first_sentence"])
+        total.append(generator.last_metrics["total_time"])
+
+    server.shutdown()
+    print(f"blocking full reply      {_summary(blocking)}")
+    print(f"streaming first token    {_summary(first_token)}")
+    print(f"streaming first sentence {_summary(first_sentence)}")
+    print(f"streaming full reply     {_summary(total)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Measures what preprocessing recorded speech saves on the transcription
+upload. recording.wav is recorded the way the agent records a caller
+(with the silence before it and the silence the recorder waits for after
+it) and transcribed against the stub OpenAI server over a slow uplink,
+once as plain WAV and once trimmed and compressed by UploadPreprocessor.
+
+    python benchmarks/bench_upload.py --bandwidth 32000 --runs 5
+    python benchmarks/bench_upload.py --sample-rate 8000 --normalize
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import caller_audio
+from benchmarks.stub_openai_server import start_stub_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(runs=5, wav=os.path.join(ROOT, "recording.wav"), bandwidth=32000, transcription_latency=0.3,
+            sample_rate=None, normalize=False):
+    """Transcribe one recorded utterance `runs` times each way and return sizes and median timings"""
+    server, base_url = start_stub_server(transcription_latency=transcription_latency, upload_bandwidth=bandwidth)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from services.AudioStream import ArraySource
+    from services.STT import SpeechToText
+    from services.UploadPreprocessor import UploadPreprocessor
+
+    audio, rate = caller_audio(wav, turns=1, gap=1.5, peak=16000)
+    try:
+        # The services' own logging would drown the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            recorded = SpeechToText(preprocess=False).record_audio(source=ArraySource(audio, sample_rate=rate))
+            results = {}
+            for name, preprocess in (("raw", False), ("preprocessed", UploadPreprocessor(
+                    normalize=normalize, sample_rate=sample_rate))):
+                stt = SpeechToText(preprocess=preprocess)
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    if stt.transcribe_audio(recorded) is None:
+                        raise RuntimeError("transcription failed")
+                    timings.append(time.perf_counter() - start)
+                results[f"{name}.bytes"] = stt.metrics["upload_bytes"] / runs
+                results[f"{name}.request_ms"] = statistics.median(timings) * 1000
+                if preprocess:
+                    results["preprocess_ms"] = preprocess.metrics["seconds"] / runs * 1000
+                    results["trimmed_s"] = preprocess.metrics["trimmed_seconds"] / runs
+        results["bytes_saved_pct"] = 100 * (1 - results["preprocessed.bytes"] / results["raw.bytes"])
+        return results
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--wav", default=os.path.join(ROOT, "recording.wav"))
+    parser.add_argument("--bandwidth", type=float, default=32000, help="uplink bytes per second, 0 for no limit")
+    parser.add_argument("--transcription-latency", type=float, default=0.3)
+    parser.add_argument("--sample-rate", type=int, default=None, help="resample uploads to this rate")
+    parser.add_argument("--normalize", action="store_true", help="normalize the peak of uploads")
+    args = parser.parse_args()
+
+    results = measure(args.runs, args.wav, args.bandwidth, args.transcription_latency, args.sample_rate,
+                      args.normalize)
+    for name, value in results.items():
+        print(f"{name:<28} {value:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Load test for async_server.py (or the Flask web_server.py with --server
+web): many concurrent sessions, each sending a few turns to
+/api/generate-response, with the OpenAI API replaced by the local stub
+server. Reports request latency percentiles and throughput.
+
+    python benchmarks/load_test_server.py --sessions 200 --turns 3
+    python benchmarks/load_test_server.py --server web --sessions 20
+
+Pass --url to load test an already running server instead.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import subprocess
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+QUESTIONS = [
+    "Hi, what are your opening hours?",
+    "Can I book an appointment with Dr. Smith for Monday?",
+    "Please call me back at 555-123-4567.",
+    "Thanks, that's all.",
+]
+
+
+def _summary(values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+    return f"mean {statistics.mean(values) * 1000:7.1f} ms   p50 {statistics.median(values) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def start_local_server(first_token_latency, token_latency, speech_latency, server="async"):
+    """
+    Start the stub backend and async_server.py (or web_server.py), each in
+    its own process so the load generator doesn't compete with them for the
+    GIL. Returns (server URL, processes).
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    stub_port, server_port = _free_port(), _free_port()
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(root, "benchmarks", "stub_openai_server.py"), "--port", str(stub_port),
+        "--first-token-latency", str(first_token_latency), "--token-latency", str(token_latency),
+        "--speech-latency", str(speech_latency)], stdout=subprocess.DEVNULL)
+    env = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1/",
+               TTS_CACHE_DIR=tempfile.mkdtemp(prefix="tts_cache_"))
+    if server == "web":
+        # Without the debug reloader web_server.py's __main__ would start
+        command = [sys.executable, "-c",
+                   f"import web_server; web_server.app.run(port={server_port}, threaded=True)"]
+    else:
+        command = [sys.executable, os.path.join(root, "async_server.py"), "--port", str(server_port)]
+    process = subprocess.Popen(command, env=env, cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{server_port}"
+    try:
+        _wait_until_up(url + "/")
+    except Exception:
+        stub.terminate()
+        process.terminate()
+        raise
+    return url, [stub, process]
+
+
+async def run_session(client, turns, latencies, errors):
+    session_id = None
+    for turn in range(turns):
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/generate-response", json={
+                "text": QUESTIONS[turn % len(QUESTIONS)], "session_id": session_id})
+            response.raise_for_status()
+            session_id = response.json().get("session_id")
+        except Exception as e:
+            errors.append(repr(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_load(url, sessions, turns):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=sessions, max_keepalive_connections=sessions)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(client, turns, latencies, errors) for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+        # Only async_server.py has a stats endpoint
+        response = await client.get("/api/stats")
+        stats = response.json() if response.status_code == 200 else None
+    return latencies, errors, elapsed, stats
+
+
+def measure(server="async", sessions=50, turns=3, first_token_latency=0.3, token_latency=0.0, speech_latency=0.2):
+    """Load test a locally started server; returns throughput and latency percentiles in ms"""
+    url, processes = start_local_server(first_token_latency, token_latency, speech_latency, server)
+    try:
+        latencies, errors, elapsed, _ = asyncio.run(run_load(url, sessions, turns))
+    finally:
+        for process in processes:
+            process.terminate()
+    latencies.sort()
+    return {
+        "requests_per_s": len(latencies) / elapsed,
+        "latency.p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "latency.p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000 if latencies else None,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load test a running server instead of starting one")
+    parser.add_argument("--server", choices=["async", "web"], default="async", help="which server to start")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--speech-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    processes = []
+    url = args.url
+    if url is None:
+        url, processes = start_local_server(args.first_token_latency, args.token_latency, args.speech_latency,
+                                            args.server)
+    try:
+        latencies, errors, elapsed, stats = asyncio.run(run_load(url, args.sessions, args.turns))
+    finally:
+        for process in processes:
+            process.terminate()
+
+    requests = args.sessions * args.turns
+    print(f"{args.sessions} sessions x {args.turns} turns: {requests} requests in {elapsed:.2f}s "
+          f"({requests / elapsed:.1f} req/s), {len(errors)} errors")
+    if latencies:
+        print(f"request latency          {_summary(latencies)}")
+    if stats is not None:
+        print(f"active sessions          {stats['sessions']}")
+        print(f"tts cache hit rate       {stats['tts_cache_hit_rate']:.2f}")
+        for endpoint, summary in stats["openai"].items():
+            print(f"openai {endpoint:<18}calls {summary['calls']}, errors {summary['errors']}, "
+                  f"p50 {summary['p50'] * 1000:.1f} ms, p95 {summary['p95'] * 1000:.1f} ms")
+    if errors:
+        print(f"first error: {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
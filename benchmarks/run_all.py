@@ -0,0 +1,173 @@
+"""
+Runs the offline benchmark suite and compares it with a baseline, so a
+latency regression shows up before it reaches callers. Everything runs
+against local stand-ins: the stub OpenAI and Simli servers, recording.wav
+as the caller and a NullSink as the speaker.
+
+    python benchmarks/run_all.py                    # compare with benchmarks/baseline.json
+    python benchmarks/run_all.py --update-baseline  # record a new baseline on this machine
+    python benchmarks/run_all.py --suite pipeline --suite load_async
+
+Metrics ending in _ms regress when they grow, _per_s ones when they shrink,
+each by more than --tolerance (and _ms ones by more than --min-delta-ms).
+Exits with status 1 if anything regressed. Baselines depend on the machine;
+record one on the machine that checks against it.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def _pipeline():
+    from benchmarks.bench_pipeline import run_turns
+    return run_turns(turns=3)
+
+
+def _extractor(backend):
+    from benchmarks.bench_extractor import measure
+    return measure(turns=20000, backend=backend)
+
+
+def _calls():
+    from benchmarks.bench_calls import run_calls
+    return run_calls(calls=10, turns=2)
+
+
+def _simli():
+    from benchmarks.bench_simli import measure
+    return measure(lookups=50, sentences=3)
+
+
+def _upload():
+    from benchmarks.bench_upload import measure
+    return measure(runs=3)
+
+
+def _load(server, sessions):
+    from benchmarks.load_test_server import measure
+    return measure(server, sessions=sessions, turns=3)
+
+
+# name -> (run, reason to skip or None)
+SUITES = {
+    "pipeline": (_pipeline, None),
+    "extractor_jsonl": (lambda: _extractor("jsonl"), None),
+    "extractor_sqlite": (lambda: _extractor("sqlite"), None),
+    "load_async": (lambda: _load("async", 50), None),
+    "calls": (_calls, None),
+    "simli": (_simli, None),
+    "upload": (_upload, None),
+    "load_web": (lambda: _load("web", 20),
+                 None if importlib.util.find_spec("flask") else "flask is not installed"),
+}
+
+
+def run_suite(name):
+    """Run one suite in a fresh interpreter, so suites can't share clients, singletons or stub servers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.json")
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--emit", name, path],
+                                   capture_output=True, text=True)
+        if completed.returncode != 0 or not os.path.exists(path):
+            lines = (completed.stderr or completed.stdout).strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"exit status {completed.returncode}")
+        with open(path) as f:
+            return json.load(f)
+
+
+def compare(name, value, baseline, tolerance, min_delta_ms):
+    """Return "regressed", "improved", "ok" or "new" (nothing to compare with) for one metric"""
+    if baseline is None or value is None:
+        return "new"
+    if name.endswith("_ms"):
+        if value > baseline * (1 + tolerance) and value - baseline > min_delta_ms:
+            return "regressed"
+        if value < baseline * (1 - tolerance) and baseline - value > min_delta_ms:
+            return "improved"
+    elif name.endswith("_per_s"):
+        if value < baseline * (1 - tolerance):
+            return "regressed"
+        if value > baseline * (1 + tolerance):
+            return "improved"
+    elif name.endswith("errors") and value > baseline:
+        return "regressed"
+    return "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", action="append", choices=list(SUITES), help="run only these suites")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative change allowed before flagging")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore latency changes smaller than this")
+    parser.add_argument("--emit", nargs=2, metavar=("SUITE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.emit:
+        name, path = args.emit
+        results = SUITES[name][0]()
+        with open(path, "w") as f:
+            json.dump(results, f)
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+
+    metrics = {}
+    regressions = []
+    for name in args.suite or list(SUITES):
+        run, skip = SUITES[name]
+        if skip:
+            print(f"{name}: skipped, {skip}")
+            continue
+        start = time.perf_counter()
+        try:
+            results = run_suite(name)
+        except Exception as e:
+            print(f"{name}: failed, {e}")
+            regressions.append(name)
+            continue
+        print(f"{name} ({time.perf_counter() - start:.0f}s)")
+        for metric, value in results.items():
+            key = f"{name}.{metric}"
+            metrics[key] = value
+            status = compare(key, value, baseline.get(key), args.tolerance, args.min_delta_ms)
+            if status == "regressed":
+                regressions.append(key)
+            before = baseline.get(key)
+            change = f"{(value - before) / before:+7.1%}" if before and value is not None else ""
+            shown = "-" if value is None else f"{value:12.2f}"
+            print(f"  {metric:<40} {shown:>12}   baseline {'-' if before is None else f'{before:10.2f}':>10} "
+                  f"{change:>8}  {status}")
+
+    if args.update_baseline:
+        recorded = {**baseline, **metrics}
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                                "cpus": os.cpu_count(), "recorded": time.strftime("%Y-%m-%d")},
+                "metrics": {key: round(value, 3) if isinstance(value, float) else value
+                            for key, value in sorted(recorded.items())},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
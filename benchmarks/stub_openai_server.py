@@ -0,0 +1,205 @@
+"""
+Local stand-in for the OpenAI API, used to benchmark the services offline.
+
+Serves OpenAI-compatible chat completions (streaming and non-streaming),
+speech and transcription endpoints with configurable latency. Point the
+services at it with:
+
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8765/v1/
+
+Run standalone with `python benchmarks/stub_openai_server.py --port 8765`.
+"""
+import argparse
+import json
+import struct
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Thanks for calling, I'd be happy to help with that. "
+    "We are open from nine in the morning until six in the evening, Monday to Friday. "
+    "Would you like me to book an appointment for you?"
+)
+
+DEFAULT_CONFIG = {
+    "reply": DEFAULT_REPLY,
+    "first_token_latency": 0.3,  # seconds before the first token
+    "token_latency": 0.02,  # seconds between streamed tokens
+    "speech_latency": 0.2,  # seconds before synthesized speech is returned
+    "transcript": "What are your opening hours?",
+    "transcription_latency": 0.3,  # seconds before a transcript is returned
+    "upload_bandwidth": 0,  # bytes per second the audio uploads at, as over a slow uplink; 0 for no limit
+}
+
+
+def _tokenize(text):
+    """Split text into word-sized deltas that keep their leading whitespace"""
+    words = text.split(" ")
+    return [words[0]] + [" " + word for word in words[1:]]
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        # Transcription requests are multipart uploads; only JSON bodies are parsed
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(body or b"{}")
+        return {}
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = self._read_body()
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._chat_completions(request)
+        elif self.path.rstrip("/").endswith("/audio/speech"):
+            self._speech(request)
+        elif self.path.rstrip("/").endswith("/audio/transcriptions"):
+            self._transcription()
+        else:
+            self._send_json({"error": {"message": f"Unknown endpoint {self.path}"}}, status=404)
+
+    def _chat_completions(self, request):
+        reply = self.config["reply"]
+        model = request.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        time.sleep(self.config["first_token_latency"])
+
+        if not request.get("stream"):
+            time.sleep(self.config["token_latency"] * len(_tokenize(reply)))
+            self._send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": reply},
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(_tokenize(reply)):
+            if i:
+                time.sleep(self.config["token_latency"])
+            self._send_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": None, "delta": {"content": token}}],
+            })
+        self._send_event({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}],
+        })
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _speech(self, request):
+        time.sleep(self.config["speech_latency"])
+        text = request.get("input", "").encode()
+        fmt = request.get("response_format", "mp3")
+        if fmt in ("pcm", "wav"):
+            # Silence as long as the text would take to say, at the API's 24 kHz
+            body = bytes(2 * int(24000 * max(0.5, len(text) / 15)))
+            if fmt == "wav":
+                body = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(body), b"WAVE", b"fmt ", 16, 1, 1,
+                                   24000, 48000, 2, 16, b"data", len(body)) + body
+        else:
+            # Not playable audio, just an mp3-sized payload that depends on the input
+            body = b"ID3" + text * max(1, 16000 // max(1, len(text)))
+        self.send_response(200)
+        self.send_header("Content-Type", {"pcm": "audio/L16", "wav": "audio/wav"}.get(fmt, "audio/mpeg"))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _transcription(self):
+        if self.config["upload_bandwidth"]:
+            time.sleep(int(self.headers.get("Content-Length") or 0) / self.config["upload_bandwidth"])
+        time.sleep(self.config["transcription_latency"])
+        self._send_json({"text": self.config["transcript"]})
+
+    def _send_event(self, payload):
+        self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    # A deep listen backlog so load tests with hundreds of clients don't see refused connections
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading a stream early (cancelled generations) are expected
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_stub_server(host="127.0.0.1", port=0, **config):
+    """Start the stub server on a background thread and return (server, base_url)"""
+    server = StubOpenAIServer((host, port), StubOpenAIHandler)
+    server.config = {**DEFAULT_CONFIG, **config}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-latency", type=float, default=DEFAULT_CONFIG["first_token_latency"])
+    parser.add_argument("--token-latency", type=float, default=DEFAULT_CONFIG["token_latency"])
+    parser.add_argument("--speech-latency", type=float, default=DEFAULT_CONFIG["speech_latency"])
+    parser.add_argument("--transcription-latency", type=float, default=DEFAULT_CONFIG["transcription_latency"])
+    parser.add_argument("--upload-bandwidth", type=float, default=DEFAULT_CONFIG["upload_bandwidth"],
+                        help="bytes per second transcription uploads take, 0 for no limit")
+    parser.add_argument("--transcript", default=DEFAULT_CONFIG["transcript"])
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port,
+                                         first_token_latency=args.first_token_latency,
+                                         token_latency=args.token_latency,
+                                         speech_latency=args.speech_latency,
+                                         transcription_latency=args.transcription_latency,
+                                         upload_bandwidth=args.upload_bandwidth,
+                                         transcript=args.transcript)
+    print(f"Stub OpenAI server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
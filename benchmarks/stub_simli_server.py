@@ -0,0 +1,89 @@
+"""
+Local stand-in for the Simli API, used to exercise services/simli.py
+offline. Serves GET /session/<session id>/<token> with a room URL after a
+configurable latency and counts the lookups it served. Point the service at
+it with:
+
+    SIMLI_API_BASE=http://127.0.0.1:8766
+
+Run standalone with `python benchmarks/stub_simli_server.py --port 8766`.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONFIG = {
+    "room_url": "https://stub.daily.co/simli-room",
+    "room_latency": 0.2,  # seconds before a room URL is returned
+}
+
+
+class StubSimliHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "session":
+            self._send_json({"detail": f"Unknown endpoint {self.path}"}, status=404)
+            return
+        with self.server.lock:
+            self.server.room_requests += 1
+        time.sleep(self.config["room_latency"])
+        if not parts[1] or parts[1] == "None" or not parts[2] or parts[2] == "None":
+            self._send_json({"detail": "Invalid session"}, status=401)
+            return
+        self._send_json({"roomUrl": self.config["room_url"]})
+
+
+class StubSimliServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_stub_server(host="127.0.0.1", port=0, **config):
+    """Start the stub server on a background thread and return (server, base_url)"""
+    server = StubSimliServer((host, port), StubSimliHandler)
+    server.config = {**DEFAULT_CONFIG, **config}
+    server.room_requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--room-url", default=DEFAULT_CONFIG["room_url"])
+    parser.add_argument("--room-latency", type=float, default=DEFAULT_CONFIG["room_latency"])
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, room_url=args.room_url,
+                                         room_latency=args.room_latency)
+    print(f"Stub Simli server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,122 @@
+"""
+Run many voice agent calls in one process. Every call has its own agent:
+conversation memory, transcripts, audio input and output. The OpenAI
+client with its connection pool, the TTS and response caches and the
+conversation store are shared by all of them, and upstream requests are
+shared out fairly with per-call caps.
+
+Each WAV file is replayed in real time as one caller (16-bit mono, like
+recording.wav), who can barge in on the agent as it speaks; the agent's
+speech is discarded, or written per call with --output. Ctrl+C stops taking calls and gives the running ones
+--drain-timeout seconds to finish.
+
+    python multi_call.py caller1.wav caller2.wav --output calls/
+    python multi_call.py recording.wav --repeat 20 --max-calls 10 --per-call-requests 2
+"""
+import argparse
+import datetime
+import os
+import time
+
+from app import AIVoiceAgentPipeline
+from services.AudioPlayback import FileSink, NullSink, PlaybackEngine
+from services.AudioStream import PacedSource, WavFileSource
+from services.CallScheduler import CallClient, CallScheduler, FairLimiter
+from services.ConversationExtractor import ConversationExtractor
+from services.ConversationStore import SQLiteConversationStore, migrate_json_store, open_store
+from services.OpenAIClient import OpenAIService, set_service
+from services.ResponseCache import ResponseCache
+from services.SearchIndex import InvertedIndex, SQLiteSearchIndex
+from services.Telemetry import get_telemetry
+
+
+class SharedServices:
+    """
+    The services every call in the process shares. `agent(call)` builds a
+    call's agent on top of them and is the factory for CallScheduler.
+    `max_upstream` requests to OpenAI run at a time across all calls and
+    `per_call_upstream` for any one call; a streamed reply counts until it
+    has been read, so a call needs one slot for it and more for speech.
+    """
+
+    def __init__(self, max_upstream=24, per_call_upstream=3, storage_file="conversation_data.jsonl",
+                 legacy_file="conversation_data.json", full_duplex=False):
+        # Sized so only the fair limiter decides what waits, not the client's own limit or pool
+        self.openai = OpenAIService(max_connections=max_upstream, max_keepalive_connections=max_upstream,
+                                    max_concurrency=max_upstream)
+        set_service(self.openai)
+        self.limiter = FairLimiter(capacity=max_upstream, per_call=per_call_upstream)
+        self.response_cache = ResponseCache()
+        self.store = open_store(storage_file)
+        # Migrated once here, rather than raced over by every call's extractor
+        if legacy_file and os.path.exists(legacy_file) and self.store.is_empty():
+            migrate_json_store(legacy_file, self.store)
+        # One search index over the shared store; each call only brings its session id
+        self.index = (SQLiteSearchIndex(self.store.path) if isinstance(self.store, SQLiteConversationStore)
+                      else InvertedIndex())
+        self.full_duplex = full_duplex
+        self.started = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def agent(self, call):
+        return AIVoiceAgentPipeline(
+            full_duplex=self.full_duplex,
+            source=call.source,
+            player=PlaybackEngine(call.sink if call.sink is not None else NullSink(realtime=True)),
+            client=CallClient(self.openai, self.limiter, call.call_id),
+            response_cache=self.response_cache,
+            extractor=ConversationExtractor(store=self.store, legacy_file=None, index=self.index,
+                                            session_id=f"{self.started}_{call.call_id}"),
+        )
+
+    def close(self):
+        self.store.close()
+        self.openai.close()
+        if hasattr(self.index, "close"):
+            self.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wavs", nargs="+", help="WAV files, one caller each")
+    parser.add_argument("--repeat", type=int, default=1, help="callers per WAV file")
+    parser.add_argument("--max-calls", type=int, default=8, help="calls running at once; the rest wait")
+    parser.add_argument("--max-upstream", type=int, default=24, help="OpenAI requests at once, across all calls")
+    parser.add_argument("--per-call-requests", type=int, default=3, help="OpenAI requests at once for one call")
+    parser.add_argument("--half-duplex", action="store_true",
+                        help="ignore callers while the agent speaks instead of letting them barge in")
+    parser.add_argument("--output", help="write each call's speech to OUTPUT/<call id>/")
+    parser.add_argument("--drain-timeout", type=float, default=30.0,
+                        help="seconds running calls get to finish after Ctrl+C")
+    args = parser.parse_args()
+
+    services = SharedServices(args.max_upstream, args.per_call_requests, full_duplex=not args.half_duplex)
+    scheduler = CallScheduler(services.agent, max_calls=args.max_calls)
+    calls = []
+    for _ in range(args.repeat):
+        for wav in args.wavs:
+            call_id = f"call-{len(calls) + 1}"
+            sink = FileSink(os.path.join(args.output, call_id)) if args.output else None
+            calls.append(scheduler.submit(PacedSource(WavFileSource(wav)), sink, call_id=call_id))
+
+    try:
+        while scheduler.active or scheduler.waiting:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print(f"\nDraining: running calls get {args.drain_timeout:.0f}s to finish")
+    try:
+        scheduler.drain(timeout=args.drain_timeout)
+    finally:
+        services.close()
+        get_telemetry().close()
+
+    print(f"\n{len(calls)} calls: {scheduler.metrics}")
+    for call in calls:
+        if call.started is not None and call.ended is not None:
+            print(f"  {call.call_id:<10} waited {call.queued_seconds:6.1f}s   ran {call.ended - call.started:6.1f}s")
+    limiter = services.limiter.metrics
+    print(f"OpenAI requests: {limiter['requests']}, {limiter['waited']} waited for a slot "
+          f"({limiter['wait_seconds']:.1f}s in total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import struct
+
+from services.AudioStream import SAMPLE_RATE
+
+# Content types of the formats the OpenAI speech API can return; its "pcm" is 24 kHz 16-bit mono
+MIME_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "audio/L16",
+}
+
+
+class AudioBuffer:
+    """
+    Audio passed between stages in memory.
+
+    With fmt "pcm" `data` holds int16 samples (interleaved when there are
+    several channels) and `samples` views them as a NumPy array without
+    copying; `convert()` resamples and remixes them in one vectorized pass.
+    Any other fmt ("mp3", "wav", ...) is encoded audio that is passed on
+    untouched; WAV is read as PCM, again without copying, when its samples
+    are needed. Audio is only encoded at I/O boundaries, by `encode()`.
+    """
+
+    def __init__(self, data, fmt="pcm", sample_rate=SAMPLE_RATE, channels=1):
+        self.data = data
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    @classmethod
+    def from_samples(cls, samples, sample_rate=SAMPLE_RATE):
+        """Wrap int16 samples, shaped (frames,) or (frames, channels), without copying them"""
+        import numpy as np
+
+        samples = np.ascontiguousarray(samples, dtype=np.int16)
+        channels = samples.shape[1] if samples.ndim == 2 else 1
+        return cls(memoryview(samples).cast("B"), "pcm", sample_rate, channels)
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+    @property
+    def duration(self):
+        """Length in seconds, None for compressed formats"""
+        if self.fmt not in ("pcm", "wav"):
+            return None
+        pcm = self.pcm()
+        return len(pcm.data) / (2 * pcm.channels * pcm.sample_rate)
+
+    @property
+    def samples(self):
+        """int16 samples shaped (frames,) for mono or (frames, channels), sharing this buffer's memory"""
+        import numpy as np
+
+        pcm = self.pcm()
+        samples = np.frombuffer(pcm.data, dtype=np.int16)
+        return samples if pcm.channels == 1 else samples.reshape(-1, pcm.channels)
+
+    def pcm(self):
+        """This audio as PCM; WAV data is referenced, not copied"""
+        if self.fmt == "pcm":
+            return self
+        if self.fmt == "wav":
+            return _parse_wav(self.data)
+        raise ValueError(f"Can't decode {self.fmt} audio; request pcm or wav from the source instead")
+
+    def convert(self, sample_rate=None, channels=None):
+        """PCM at `sample_rate` with `channels` channels; self when nothing changes"""
+        import numpy as np
+
+        pcm = self.pcm()
+        sample_rate = sample_rate or pcm.sample_rate
+        channels = channels or pcm.channels
+        if sample_rate == pcm.sample_rate and channels == pcm.channels:
+            return pcm
+        samples = pcm.samples.reshape(-1, pcm.channels).astype(np.float32)
+        if channels != pcm.channels:
+            mono = samples.mean(axis=1, keepdims=True)
+            samples = np.repeat(mono, channels, axis=1) if channels > 1 else mono
+        if sample_rate != pcm.sample_rate:
+            samples = _resample(samples, pcm.sample_rate, sample_rate)
+        samples = np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+        return AudioBuffer.from_samples(samples if channels > 1 else samples[:, 0], sample_rate)
+
+    def encode(self, fmt):
+        """
+        The audio as bytes in `fmt`. PCM can be encoded as "pcm", "wav" or,
+        with the optional soundfile package, "flac" (ImportError without
+        it); anything else only as itself.
+        """
+        if fmt == self.fmt:
+            return bytes(self.data)
+        pcm = self.pcm()
+        if fmt == "pcm":
+            return bytes(pcm.data)
+        if fmt == "wav":
+            return _wav_header(len(pcm.data), pcm.sample_rate, pcm.channels) + pcm.data
+        if fmt == "flac":
+            import io
+            import soundfile
+            out = io.BytesIO()
+            soundfile.write(out, pcm.samples, pcm.sample_rate, format="FLAC", subtype="PCM_16")
+            return out.getvalue()
+        raise ValueError(f"Can't encode {self.fmt} audio as {fmt}")
+
+
+def _resample(samples, source_rate, target_rate, taps=32):
+    """Linear interpolation of (frames, channels) float samples, low-pass filtered first when downsampling"""
+    import numpy as np
+
+    if target_rate < source_rate:
+        # Windowed-sinc filter below the new Nyquist frequency, so high frequencies don't alias
+        cutoff = target_rate / source_rate / 2
+        n = np.arange(-taps, taps + 1)
+        kernel = np.sinc(2 * cutoff * n) * np.hamming(len(n))
+        kernel /= kernel.sum()
+        samples = np.stack([np.convolve(channel, kernel, mode="same") for channel in samples.T], axis=1)
+    frames = len(samples)
+    count = int(round(frames * target_rate / source_rate))
+    positions = np.arange(count) * (source_rate / target_rate)
+    return np.stack([np.interp(positions, np.arange(frames), channel) for channel in samples.T], axis=1)
+
+
+def _wav_header(size, sample_rate, channels):
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + size, b"WAVE", b"fmt ", 16, 1, channels,
+                       sample_rate, sample_rate * channels * 2, channels * 2, 16, b"data", size)
+
+
+def _parse_wav(data):
+    view = memoryview(data).cast("B")
+    if bytes(view[:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Not a WAV file")
+    position = 12
+    channels = sample_rate = None
+    while position + 8 <= len(view):
+        chunk_id, size = struct.unpack_from("<4sI", view, position)
+        body = position + 8
+        if chunk_id == b"fmt ":
+            encoding, channels, sample_rate = struct.unpack_from("<HHI", view, body)
+            bits = struct.unpack_from("<H", view, body + 14)[0]
+            if encoding != 1 or bits != 16:
+                raise ValueError("Only 16-bit PCM WAV files are supported")
+        elif chunk_id == b"data":
+            if sample_rate is None:
+                raise ValueError("WAV data before its format")
+            # Streamed WAVs may leave the size unset; the data then runs to the end
+            end = min(body + size, len(view)) if size else len(view)
+            end -= (end - body) % (2 * channels)
+            return AudioBuffer(view[body:end], "pcm", sample_rate, channels)
+        position = body + size + (size & 1)
+    raise ValueError("WAV file without data")
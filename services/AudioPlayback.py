@@ -0,0 +1,306 @@
+import io
+import os
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import Future
+
+from services.Telemetry import get_telemetry, in_context
+
+
+class AudioChunk:
+    """One piece of audio: encoded bytes (fmt "mp3", "wav", ...) or raw int16 mono PCM (fmt "pcm")"""
+
+    def __init__(self, data, fmt="mp3", sample_rate=24000):
+        self.data = data
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self):
+        """Length in seconds for PCM, None when it can't be known without decoding"""
+        if self.fmt == "pcm":
+            return len(self.data) / (2 * self.sample_rate)
+        return None
+
+
+class PygameSink:
+    """Plays chunks through the pygame mixer, started lazily on first use"""
+
+    def __init__(self):
+        self._pygame = None
+        self._channel = None
+
+    def _mixer(self, sample_rate=None):
+        if self._pygame is None:
+            import pygame
+            self._pygame = pygame
+        pygame = self._pygame
+        current = pygame.mixer.get_init()
+        if sample_rate is not None and current and current[0] != sample_rate:
+            # PCM is handed over as-is, so the mixer has to run at its rate
+            pygame.mixer.quit()
+            current = None
+        if not current:
+            pygame.init()
+            if sample_rate is None:
+                pygame.mixer.init()
+            else:
+                pygame.mixer.init(frequency=sample_rate, size=-16, channels=1)
+        return pygame
+
+    def open(self, sample_rate=None):
+        """Start the mixer ahead of the first clip, at the rate PCM will be played at if known"""
+        self._mixer(sample_rate)
+
+    def start(self, chunk):
+        if chunk.fmt == "pcm":
+            pygame = self._mixer(chunk.sample_rate)
+            self._channel = pygame.mixer.Sound(buffer=chunk.data).play()
+        else:
+            pygame = self._mixer()
+            pygame.mixer.music.load(io.BytesIO(chunk.data), chunk.fmt)
+            pygame.mixer.music.play()
+
+    def is_playing(self):
+        if self._pygame is None:
+            return False
+        if self._channel is not None and self._channel.get_busy():
+            return True
+        return bool(self._pygame.mixer.get_init()) and self._pygame.mixer.music.get_busy()
+
+    def stop(self):
+        if self._pygame is None or not self._pygame.mixer.get_init():
+            return
+        self._pygame.mixer.music.stop()
+        if self._channel is not None:
+            self._channel.stop()
+            self._channel = None
+
+    def close(self):
+        self.stop()
+
+
+class NullSink:
+    """
+    Discards audio, keeping the chunks it was given in `played`. With
+    `realtime=True` each chunk "plays" for its duration (PCM) or for an
+    estimate from `bitrate` (encoded audio), which makes timing testable
+    without an audio device.
+    """
+
+    def __init__(self, realtime=False, bitrate=128000):
+        self.realtime = realtime
+        self.bitrate = bitrate
+        self.played = []
+        self._ends_at = 0.0
+
+    def start(self, chunk):
+        self.played.append(chunk)
+        if self.realtime:
+            duration = chunk.duration
+            if duration is None:
+                duration = len(chunk.data) * 8 / self.bitrate
+            self._ends_at = time.monotonic() + duration
+
+    def is_playing(self):
+        return time.monotonic() < self._ends_at
+
+    def stop(self):
+        self._ends_at = 0.0
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """Writes every chunk to `directory` as 00000.mp3, 00001.wav, ... (PCM is wrapped in WAV)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = []
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, chunk):
+        ext = "wav" if chunk.fmt == "pcm" else chunk.fmt
+        path = os.path.join(self.directory, f"{len(self.paths):05d}.{ext}")
+        if chunk.fmt == "pcm":
+            with wave.open(path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(chunk.sample_rate)
+                wf.writeframes(chunk.data)
+        else:
+            with open(path, "wb") as f:
+                f.write(chunk.data)
+        self.paths.append(path)
+
+    def is_playing(self):
+        return False
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Clip:
+    def __init__(self, fmt, sample_rate):
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.chunks = deque()
+        self.ended = False
+        self.started = False
+        self.future = Future()
+
+
+class PlaybackEngine:
+    """
+    Plays audio on a dedicated thread so callers never block on playback.
+
+    `play()` queues a whole clip and `play_stream()` a clip that arrives as
+    chunks; both return a Future that resolves to True once the clip has
+    finished playing or False if it was stopped. Streamed clips go through a
+    small jitter buffer: playback starts once `prebuffer` chunks are queued
+    (or the stream has ended), so a late chunk doesn't cause a gap. `stop()`
+    silences the current clip and drops everything queued, for barge-in.
+    """
+
+    def __init__(self, sink=None, prebuffer=2, poll_interval=0.01):
+        self.sink = sink if sink is not None else PygameSink()
+        self.prebuffer = prebuffer
+        self.poll_interval = poll_interval
+        self.metrics = {"clips": 0, "chunks": 0, "stopped": 0, "underruns": 0}
+        self._clips = deque()
+        self._generation = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=in_context(self._run), daemon=True)
+        self._thread.start()
+
+    def open(self, sample_rate=None):
+        """Open the output device now rather than when the first clip starts, if the sink has one"""
+        opener = getattr(self.sink, "open", None)
+        if opener is not None:
+            opener(sample_rate)
+
+    @property
+    def playing(self):
+        """True while a clip is playing or queued"""
+        return not self._idle.is_set()
+
+    def play(self, audio, fmt="mp3", sample_rate=24000):
+        """Queue a complete clip and return its completion Future"""
+        clip = _Clip(fmt, sample_rate)
+        clip.chunks.append(AudioChunk(audio, fmt, sample_rate))
+        clip.ended = True
+        return self._enqueue(clip)
+
+    def play_stream(self, chunks, fmt="pcm", sample_rate=24000):
+        """
+        Queue a clip whose chunks are produced by the iterable `chunks`,
+        which is consumed on its own thread as playback proceeds.
+        """
+        clip = _Clip(fmt, sample_rate)
+        future = self._enqueue(clip)
+        generation = self._generation
+        threading.Thread(target=in_context(self._feed), args=(clip, chunks, generation), daemon=True).start()
+        return future
+
+    def stop(self):
+        """Stop the current clip immediately and drop all queued ones"""
+        with self._cond:
+            self._generation += 1
+            dropped = list(self._clips)
+            self._clips.clear()
+            self.sink.stop()
+            self._idle.set()
+            self._cond.notify_all()
+        for clip in dropped:
+            self.metrics["stopped"] += 1
+            clip.future.set_result(False)
+
+    def wait(self, timeout=None):
+        """Block until everything queued has played (or was stopped); returns False on timeout"""
+        return self._idle.wait(timeout)
+
+    def close(self):
+        self.stop()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1)
+        self.sink.close()
+
+    def _enqueue(self, clip):
+        with self._cond:
+            self._clips.append(clip)
+            self._idle.clear()
+            self.metrics["clips"] += 1
+            self._cond.notify_all()
+        return clip.future
+
+    def _feed(self, clip, chunks, generation):
+        try:
+            for data in chunks:
+                with self._cond:
+                    if self._generation != generation:
+                        return
+                    clip.chunks.append(AudioChunk(data, clip.fmt, clip.sample_rate))
+                    self._cond.notify_all()
+        except Exception as e:
+            print(f"Error streaming audio: {e}")
+        finally:
+            with self._cond:
+                clip.ended = True
+                self._cond.notify_all()
+
+    def _next_chunk(self):
+        """Wait for the next chunk to play; returns (chunk, generation), or (None, None) once closed"""
+        with self._cond:
+            underrun = False
+            while not self._closed:
+                if self._clips:
+                    clip = self._clips[0]
+                    buffered = len(clip.chunks)
+                    # Jitter buffer: hold a streamed clip until enough of it has arrived
+                    if buffered and (clip.started or clip.ended or buffered >= self.prebuffer):
+                        clip.started = True
+                        return clip.chunks.popleft(), self._generation
+                    if clip.ended and not buffered:
+                        self._clips.popleft()
+                        clip.future.set_result(True)
+                        if not self._clips:
+                            self._idle.set()
+                        continue
+                    if clip.started and not underrun:
+                        underrun = True
+                        self.metrics["underruns"] += 1
+                self._cond.wait()
+            return None, None
+
+    def _run(self):
+        while True:
+            chunk, generation = self._next_chunk()
+            if chunk is None:
+                return
+            with self._cond:
+                # A stop() may have come in since the chunk was taken
+                if self._generation != generation:
+                    continue
+                try:
+                    self.sink.start(chunk)
+                    self.metrics["chunks"] += 1
+                    get_telemetry().mark("playback_start")
+                except Exception as e:
+                    print(f"Error playing audio: {e}")
+                    continue
+            while self.sink.is_playing():
+                with self._cond:
+                    if self._generation != generation or self._closed:
+                        break
+                    self._cond.wait(self.poll_interval)
@@ -0,0 +1,636 @@
+import threading
+import time
+import wave
+from services.Registry import registry
+from services.Telemetry import get_telemetry
+
+# numpy is imported inside the functions that use it, so importing the
+# audio services stays cheap and the import overlaps with device startup
+
+SAMPLE_RATE = 16000
+FRAME_SIZE = 480  # 30 ms at 16 kHz, a common VAD frame length
+SAMPLE_WIDTH = 2  # int16
+
+
+class RingBuffer:
+    """
+    Fixed-capacity int16 sample buffer backed by a single preallocated array.
+    Once full, the oldest samples are overwritten.
+    """
+
+    def __init__(self, capacity):
+        import numpy as np
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=np.int16)
+        self._write = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def write(self, frame):
+        """Append a frame of samples, overwriting the oldest data if needed"""
+        import numpy as np
+        frame = np.asarray(frame, dtype=np.int16)
+        n = len(frame)
+        if n >= self.capacity:
+            self._data[:] = frame[-self.capacity:]
+            self._write = 0
+            self._size = self.capacity
+            return
+        end = self._write + n
+        if end <= self.capacity:
+            self._data[self._write:end] = frame
+        else:
+            split = self.capacity - self._write
+            self._data[self._write:] = frame[:split]
+            self._data[:n - split] = frame[split:]
+        self._write = end % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def read(self, count=None):
+        """Return the newest `count` samples (all by default) in order, as a copy"""
+        import numpy as np
+        count = self._size if count is None else min(int(count), self._size)
+        start = (self._write - count) % self.capacity
+        if start + count <= self.capacity:
+            return self._data[start:start + count].copy()
+        return np.concatenate((self._data[start:], self._data[:self._write]))
+
+    def clear(self):
+        self._write = 0
+        self._size = 0
+
+
+class FrameRing:
+    """
+    Ring of the most recent fixed-size frames for one writer and any number
+    of readers, without locks. Frames are numbered in write order; a reader
+    keeps its own position and gets every frame from there on, except those
+    already overwritten. The writer never waits for readers.
+    """
+
+    def __init__(self, capacity, frame_size=FRAME_SIZE):
+        import numpy as np
+        self.capacity = int(capacity)
+        self.frame_size = frame_size
+        self._frames = np.zeros((self.capacity, frame_size), dtype=np.int16)
+        self._lengths = np.zeros(self.capacity, dtype=np.int64)
+        # Number of frames written so far; only the writer changes it, after the frame is in place
+        self.written = 0
+
+    def write(self, frame):
+        import numpy as np
+        frame = np.asarray(frame, dtype=np.int16)[:self.frame_size]
+        slot = self.written % self.capacity
+        self._frames[slot, :len(frame)] = frame
+        self._lengths[slot] = len(frame)
+        self.written += 1
+
+    def read(self, position):
+        """
+        Return (frames, next position, frames lost) for the frames from
+        number `position` to the newest, as copies.
+        """
+        written = self.written
+        start = max(position, written - self.capacity)
+        frames = [self._frames[i % self.capacity, :self._lengths[i % self.capacity]].copy()
+                  for i in range(start, written)]
+        # Frames the writer may have overwritten while they were copied are dropped
+        oldest = self.written - self.capacity + 1
+        if start < oldest:
+            frames = frames[oldest - start:]
+            start = oldest
+        return frames, written, start - position
+
+
+class ArraySource:
+    """Frame source over an in-memory array of int16 samples"""
+
+    def __init__(self, samples, frame_size=FRAME_SIZE, sample_rate=SAMPLE_RATE):
+        import numpy as np
+        self.samples = np.asarray(samples, dtype=np.int16)
+        self.frame_size = frame_size
+        self.sample_rate = sample_rate
+
+    def __iter__(self):
+        import numpy as np
+        for start in range(0, len(self.samples), self.frame_size):
+            frame = self.samples[start:start + self.frame_size]
+            if len(frame) < self.frame_size:
+                frame = np.pad(frame, (0, self.frame_size - len(frame)))
+            yield frame
+
+    def close(self):
+        pass
+
+
+class WavFileSource(ArraySource):
+    """Frame source reading a mono 16-bit WAV file such as recording.wav"""
+
+    def __init__(self, path, frame_size=FRAME_SIZE):
+        import numpy as np
+        with wave.open(path, "rb") as wf:
+            if wf.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"Expected 16-bit audio in {path}")
+            raw = wf.readframes(wf.getnframes())
+            channels = wf.getnchannels()
+            rate = wf.getframerate()
+        samples = np.frombuffer(raw, dtype=np.int16)
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+        super().__init__(samples, frame_size=frame_size, sample_rate=rate)
+
+
+class MicrophoneSource:
+    """Frame source reading from the default input device through PyAudio"""
+
+    def __init__(self, frame_size=FRAME_SIZE, sample_rate=SAMPLE_RATE):
+        self.frame_size = frame_size
+        self.sample_rate = sample_rate
+        self._pyaudio = None
+        self._stream = None
+        self._on_end = None
+
+    def __iter__(self):
+        import numpy as np
+        import pyaudio
+
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(format=pyaudio.paInt16,
+                                          channels=1,
+                                          rate=self.sample_rate,
+                                          input=True,
+                                          frames_per_buffer=self.frame_size)
+        try:
+            while True:
+                data = self._stream.read(self.frame_size, exception_on_overflow=False)
+                yield np.frombuffer(data, dtype=np.int16)
+        finally:
+            self.close()
+
+    def start(self, on_frame, on_end=None):
+        """
+        Capture in callback mode instead of iterating: PortAudio calls
+        `on_frame` with each frame from its own thread until close().
+        """
+        import numpy as np
+        import pyaudio
+
+        def callback(in_data, frame_count, time_info, status):
+            on_frame(np.frombuffer(in_data, dtype=np.int16).copy())
+            return None, pyaudio.paContinue
+
+        self._on_end = on_end
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(format=pyaudio.paInt16,
+                                          channels=1,
+                                          rate=self.sample_rate,
+                                          input=True,
+                                          frames_per_buffer=self.frame_size,
+                                          stream_callback=callback)
+        self._stream.start_stream()
+
+    def close(self):
+        on_end, self._on_end = self._on_end, None
+        if on_end is not None:
+            on_end()
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+
+
+class PacedSource:
+    """
+    Wraps a frame source so frames arrive at their real-time rate, like a
+    microphone. Lets prerecorded WAV files drive timing-dependent code.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.sample_rate = getattr(source, "sample_rate", SAMPLE_RATE)
+
+    def __iter__(self):
+        next_at = time.monotonic()
+        for frame in self.source:
+            next_at += len(frame) / self.sample_rate
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield frame
+
+    def close(self):
+        self.source.close()
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing-rate voice activity detector with onset debounce
+    and hangover.
+
+    A frame is voiced when its mean absolute amplitude reaches
+    `energy_threshold`, or unvoiced speech (fricatives) when it reaches half
+    the threshold with a zero-crossing rate above `zcr_threshold`. Speech
+    starts after `onset_frames` consecutive speech frames and ends after
+    `hangover_frames` consecutive non-speech frames.
+    """
+
+    def __init__(self, energy_threshold=500, zcr_threshold=0.25, onset_frames=2, hangover_frames=25):
+        self.energy_threshold = energy_threshold
+        self.zcr_threshold = zcr_threshold
+        self.onset_frames = onset_frames
+        self.hangover_frames = hangover_frames
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+
+    def is_speech(self, frame):
+        """Classify a single frame without updating detector state"""
+        import numpy as np
+        samples = np.asarray(frame, dtype=np.int32)
+        energy = np.abs(samples).mean()
+        if energy >= self.energy_threshold:
+            return True
+        if energy >= self.energy_threshold / 2:
+            signs = np.signbit(samples)
+            zcr = np.count_nonzero(signs[1:] != signs[:-1]) / max(len(samples) - 1, 1)
+            return zcr >= self.zcr_threshold
+        return False
+
+    def speech_frames(self, samples, frame_size=FRAME_SIZE):
+        """`is_speech()` for every whole frame of `samples` at once, as a boolean array"""
+        import numpy as np
+        count = len(samples) // frame_size
+        frames = np.asarray(samples[:count * frame_size], dtype=np.int32).reshape(count, frame_size)
+        energy = np.abs(frames).mean(axis=1)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(frame_size - 1, 1)
+        return (energy >= self.energy_threshold) | ((energy >= self.energy_threshold / 2) & (zcr >= self.zcr_threshold))
+
+    def update(self, frame):
+        """
+        Feed one frame and return "start", "end" or None when the speech
+        state changes.
+        """
+        if self.is_speech(frame):
+            self._speech_run += 1
+            self._silence_run = 0
+        else:
+            self._speech_run = 0
+            self._silence_run += 1
+
+        if not self.in_speech and self._speech_run >= self.onset_frames:
+            self.in_speech = True
+            return "start"
+        if self.in_speech and self._silence_run >= self.hangover_frames:
+            self.in_speech = False
+            return "end"
+        return None
+
+
+class StreamingRecorder:
+    """
+    Captures one utterance from a frame source using a VoiceActivityDetector.
+
+    Frames are kept in a preallocated ring buffer; a short pre-roll before the
+    detected onset is retained so the first syllable is not clipped. While the
+    optional `hold()` returns True (e.g. while the assistant is still talking)
+    frames are read and discarded, so the source can be opened early without
+    the assistant's own voice being taken for speech.
+    """
+
+    def __init__(self, source, vad=None, max_record_time=15, pre_roll=0.3, max_wait_time=None, hold=None):
+        self.source = source
+        self.hold = hold
+        self.vad = vad or VoiceActivityDetector()
+        self.sample_rate = getattr(source, "sample_rate", SAMPLE_RATE)
+        self.max_record_time = max_record_time
+        self.max_wait_time = max_record_time if max_wait_time is None else max_wait_time
+        self.pre_roll_samples = int(pre_roll * self.sample_rate)
+        self.buffer = RingBuffer(int(max_record_time * self.sample_rate) + self.pre_roll_samples)
+
+    def stream(self):
+        """
+        Yield frames belonging to the utterance as they arrive, starting with
+        the pre-roll once speech is detected. Stops at end of speech, when
+        `max_record_time` is reached, or if no speech starts in `max_wait_time`.
+        """
+        self.vad.reset()
+        self.buffer.clear()
+        pre_roll = RingBuffer(max(self.pre_roll_samples, 1))
+        waited = 0
+        recorded = 0
+        max_wait = int(self.max_wait_time * self.sample_rate)
+        max_record = int(self.max_record_time * self.sample_rate)
+
+        for frame in self.source:
+            if self.hold is not None and self.hold():
+                continue
+            event = self.vad.update(frame)
+            if not self.vad.in_speech and event != "end":
+                pre_roll.write(frame)
+                waited += len(frame)
+                if waited >= max_wait:
+                    print("[STT] No speech detected, stopping recording.")
+                    return
+                continue
+
+            if event == "start":
+                pre_roll.write(frame)
+                head = pre_roll.read()
+                self.buffer.write(head)
+                recorded += len(head)
+                yield head
+                continue
+
+            self.buffer.write(frame)
+            recorded += len(frame)
+            yield frame
+
+            if event == "end":
+                print("[STT] Silence detected, stopping recording.")
+                # The caller stopped talking a hangover ago
+                get_telemetry().begin_turn(offset=self.vad.hangover_frames * len(frame) / self.sample_rate)
+                get_telemetry().mark("vad_end")
+                return
+            if recorded >= max_record:
+                print("[STT] Max record time reached, stopping recording.")
+                get_telemetry().begin_turn()
+                return
+
+    def record(self):
+        """Capture a whole utterance and return it as an int16 array, or None if nothing was said"""
+        for _ in self.stream():
+            pass
+        if not len(self.buffer):
+            return None
+        return self.buffer.read()
+
+
+class CaptureService:
+    """
+    Long-lived audio capture: opens `source` (the microphone by default)
+    once and keeps it running for the whole process, so no turn pays for
+    opening the device or loses the first frames while it starts.
+
+    Frames go into a FrameRing holding the last `history` seconds, from the
+    device's callback (sources with a `start(on_frame, on_end)` method, like
+    MicrophoneSource) or from a capture thread iterating any other frame
+    source, such as a PacedSource over a WAV file. `listen()` hands out a
+    frame source that starts `pre_roll` seconds in the past, so speech that
+    began just before the recorder asked for it is not clipped. Taps added
+    with `add_tap()` see every frame, with its number in the ring, just
+    before it is written.
+    """
+
+    def __init__(self, source=None, history=10.0, pre_roll=0.3):
+        self.source = source if source is not None else MicrophoneSource()
+        self.sample_rate = getattr(self.source, "sample_rate", SAMPLE_RATE)
+        self.frame_size = getattr(self.source, "frame_size", FRAME_SIZE)
+        self.pre_roll = pre_roll
+        self.ring = FrameRing(int(history * self.sample_rate / self.frame_size) + 1, self.frame_size)
+        self.metrics = {"listeners": 0, "lost_frames": 0}
+        self._taps = ()
+        self._ended = False
+        self._started = False
+        self._cond = threading.Condition()
+
+    @property
+    def ended(self):
+        """True once the source has run out of frames or the service was closed"""
+        return self._ended
+
+    def start(self):
+        """Open the source and start capturing; listen() does this on first use"""
+        with self._cond:
+            if self._started:
+                return self
+            self._started = True
+        try:
+            if hasattr(self.source, "start"):
+                self.source.start(self._on_frame, on_end=self._on_end)
+            else:
+                threading.Thread(target=self._capture, daemon=True).start()
+        except Exception:
+            # Let the next listen() try again
+            with self._cond:
+                self._started = False
+            raise
+        return self
+
+    def add_tap(self, tap):
+        """Call `tap(number, frame)` for every captured frame, from the capture thread or device callback"""
+        with self._cond:
+            self._taps = self._taps + (tap,)
+
+    def remove_tap(self, tap):
+        with self._cond:
+            self._taps = tuple(t for t in self._taps if t is not tap)
+
+    def listen(self, pre_roll=None):
+        """Frame source over the captured audio, from `pre_roll` seconds ago (the default pre-roll if None)"""
+        self.start()
+        pre_roll = self.pre_roll if pre_roll is None else pre_roll
+        self.metrics["listeners"] += 1
+        position = max(0, self.ring.written - int(pre_roll * self.sample_rate / self.frame_size))
+        return _RingListener(self, position)
+
+    def record(self, vad=None, max_record_time=15, hold=None):
+        """Capture the next utterance with a StreamingRecorder; returns int16 samples or None"""
+        listener = self.listen()
+        try:
+            return StreamingRecorder(listener, vad=vad, max_record_time=max_record_time, hold=hold).record()
+        finally:
+            listener.close()
+
+    def close(self):
+        self.source.close()
+        self._on_end()
+
+    def _capture(self):
+        try:
+            for frame in self.source:
+                if self._ended:
+                    # Closed; sources without a callback only stop when asked like this
+                    break
+                self._on_frame(frame)
+        except Exception as e:
+            print(f"[STT] Audio capture stopped: {e}")
+        finally:
+            self._on_end()
+
+    def _on_frame(self, frame):
+        for tap in self._taps:
+            tap(self.ring.written, frame)
+        self.ring.write(frame)
+        with self._cond:
+            self._cond.notify_all()
+
+    def _on_end(self):
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+
+class _RingListener:
+    """One listen() session on a CaptureService, iterable like any frame source"""
+
+    def __init__(self, capture, position):
+        self.capture = capture
+        self.sample_rate = capture.sample_rate
+        self.position = position
+        self._closed = False
+
+    def __iter__(self):
+        capture = self.capture
+        while not self._closed:
+            frames = self._read()
+            if frames:
+                yield from frames
+                continue
+            with capture._cond:
+                if capture.ring.written == self.position:
+                    if capture.ended:
+                        return
+                    capture._cond.wait(0.1)
+
+    def _read(self):
+        frames, self.position, lost = self.capture.ring.read(self.position)
+        if lost:
+            self.capture.metrics["lost_frames"] += lost
+        return frames
+
+    def close(self):
+        # Only this listener stops; the device stays open for the next one
+        self._closed = True
+
+
+class DuplexCapture:
+    """
+    Barge-in detection on a CaptureService, so the caller can be heard
+    while the assistant talks.
+
+    While `armed()` returns True (the assistant is responding or speaking)
+    every captured frame is run through `vad` and withheld from listeners,
+    and when speech starts `on_barge_in()` is called once, from the capture
+    thread. The frames from `pre_roll` seconds before that onset are then
+    read from the capture's ring by the current or next `listen()` source,
+    so the interrupting utterance is recorded from its first syllable.
+
+    There is no echo cancellation: the assistant's own voice must not reach
+    the input at speech level (use a headset, or raise the VAD threshold).
+    """
+
+    def __init__(self, capture, armed, on_barge_in, vad=None, pre_roll=0.3):
+        import numpy as np
+        self.capture = capture
+        self.sample_rate = capture.sample_rate
+        self.armed = armed
+        self.on_barge_in = on_barge_in
+        self.vad = vad or VoiceActivityDetector(energy_threshold=800, onset_frames=5)
+        self.pre_roll = pre_roll
+        self.barge_ins = 0
+        # Per ring slot: whether the frame there was withheld from listeners
+        self._withheld = np.zeros(capture.ring.capacity, dtype=bool)
+        self._barged = False
+        self._barge_from = None
+        self._pending_from = None
+        self._listener = None
+        self._lock = threading.Lock()
+        capture.add_tap(self._on_frame)
+        capture.start()
+
+    @property
+    def ended(self):
+        """True once the capture has run out of frames"""
+        return self.capture.ended
+
+    def listen(self):
+        """Frame source for the next utterance, starting with a barge-in's opening frames"""
+        with self._lock:
+            position, self._pending_from = self._pending_from, None
+            if position is None:
+                position = self.capture.ring.written
+            listener = self._listener = _DuplexListener(self, position)
+        self.capture.metrics["listeners"] += 1
+        return listener
+
+    def close(self):
+        """Stop detecting barge-ins; the capture itself belongs to its owner"""
+        self.capture.remove_tap(self._on_frame)
+
+    def _on_frame(self, number, frame):
+        capacity = len(self._withheld)
+        with self._lock:
+            if not self.armed():
+                self.vad.reset()
+                self._barged = False
+                self._withheld[number % capacity] = False
+                return
+            if self._barged:
+                self._withheld[number % capacity] = False
+                return
+            self._withheld[number % capacity] = True
+            if self.vad.update(frame) != "start":
+                return
+            self._barged = True
+            self.barge_ins += 1
+            # Start from the onset run plus the pre-roll before it
+            start = number - self.vad.onset_frames + 1 - int(self.pre_roll * self.sample_rate / len(frame))
+            start = max(start, 0, number - capacity + 1)
+            for n in range(start, number + 1):
+                self._withheld[n % capacity] = False
+            self._barge_from = (self.barge_ins, start)
+            if self._listener is None:
+                self._pending_from = start
+        self.on_barge_in()
+
+
+class _DuplexListener(_RingListener):
+    """A listen() session on a DuplexCapture: skips withheld frames and rewinds to a barge-in's onset"""
+
+    def __init__(self, duplex, position):
+        super().__init__(duplex.capture, position)
+        self.duplex = duplex
+        self._barges = duplex.barge_ins
+        # One past the last frame handed out; a rewind never goes back before it
+        self._delivered = None
+
+    def _read(self):
+        duplex = self.duplex
+        with duplex._lock:
+            if duplex._barge_from is not None and duplex._barge_from[0] > self._barges:
+                # Frames of the interruption this listener already skipped are read again
+                self._barges, start = duplex._barge_from
+                if self._delivered is not None:
+                    start = max(start, self._delivered)
+                self.position = min(self.position, start)
+        frames = super()._read()
+        withheld = duplex._withheld
+        kept = []
+        for n, frame in enumerate(frames, self.position - len(frames)):
+            if not withheld[n % len(withheld)]:
+                kept.append(frame)
+                self._delivered = n + 1
+        return kept
+
+    def close(self):
+        super().close()
+        with self.duplex._lock:
+            if self.duplex._listener is self:
+                self.duplex._listener = None
+
+
+registry.register("capture", CaptureService)
+
+
+def default_capture():
+    """Microphone capture shared by everything that records without being given a source"""
+    return registry.get("capture")
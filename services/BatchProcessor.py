@@ -0,0 +1,256 @@
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from services.ExtractionEngine import DEFAULT_KEYWORDS, DEFAULT_PATTERNS, ExtractionEngine
+
+# Engine of the current worker process, built once by _init_worker
+_worker_engine = None
+
+
+def _init_worker(patterns, keywords):
+    global _worker_engine
+    _worker_engine = ExtractionEngine(patterns, keywords)
+
+
+def _extract_chunk(records):
+    turns = [(entry["user_text"], entry["assistant_text"]) for _, entry in records]
+    infos = _worker_engine.extract_batch(turns)
+    return [
+        {"session_id": session_id, **entry, "extracted_info": info}
+        for (session_id, entry), info in zip(records, infos)
+    ]
+
+
+def iter_transcripts(path):
+    """
+    Stream (session_id, entry) pairs from external transcripts.
+
+    Accepts JSON Lines with one turn per line (session_id, user_text,
+    assistant_text and optionally timestamp), or the legacy
+    conversation_data.json document.
+    """
+    with open(path, "r") as f:
+        first = f.read(1)
+        f.seek(0)
+        if path.endswith(".json") and first == "{":
+            for session_id, entries in json.load(f).get("sessions", {}).items():
+                for entry in entries:
+                    yield session_id, entry
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record.pop("session_id", "imported"), {
+                "timestamp": record.get("timestamp", ""),
+                "user_text": record.get("user_text", ""),
+                "assistant_text": record.get("assistant_text", ""),
+            }
+
+
+def iter_store(store):
+    """Stream (session_id, entry) pairs from a ConversationStore"""
+    for _, session_id, entry in store.iter_entries():
+        yield session_id, entry
+
+
+class _SessionSummary:
+    """
+    A session's extracted information merged turn by turn, like
+    summarize_extracted over all of its turns but without re-merging the
+    summary so far each time
+    """
+
+    def __init__(self):
+        self.summary = {}
+        self._seen = {}
+
+    def add(self, extracted_info):
+        for info_type, items in extracted_info.items():
+            values = self.summary.setdefault(info_type, [])
+            seen = self._seen.setdefault(info_type, set())
+            for item in items:
+                # Group matches reloaded from JSON are lists
+                key = tuple(item) if isinstance(item, list) else item
+                if key not in seen:
+                    seen.add(key)
+                    values.append(item)
+
+
+def _summary_line(session_id, summary):
+    return json.dumps({"session_id": session_id, "summary": summary}, ensure_ascii=False) + "\n"
+
+
+def _write_atomic(path, lines):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for line in lines:
+            f.write(line)
+    os.replace(tmp_path, path)
+
+
+class BatchProcessor:
+    """
+    Re-runs information extraction and session summaries over stored or
+    imported conversation history.
+
+    Input is read as a stream and cut into chunks that are processed across a
+    pool of worker processes. Each finished chunk is written to its own
+    `part-NNNNN.jsonl` file and recorded in `checkpoint.json`, so an
+    interrupted run resumes where it stopped. Session summaries are written
+    to `summaries.jsonl` once all chunks are done.
+    """
+
+    # Sessions summarized at once; the one idle longest is written out to make room
+    max_open_sessions = 10000
+
+    def __init__(self, output_dir, patterns=None, keywords=None, workers=None, chunk_size=5000):
+        self.output_dir = output_dir
+        self.patterns = dict(DEFAULT_PATTERNS if patterns is None else patterns)
+        self.keywords = list(DEFAULT_KEYWORDS if keywords is None else keywords)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.checkpoint_path = os.path.join(output_dir, "checkpoint.json")
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("chunk_size") != self.chunk_size:
+            raise ValueError("Checkpoint was written with a different chunk size; use a new output directory")
+        return set(checkpoint["completed_chunks"])
+
+    def _save_checkpoint(self, completed):
+        _write_atomic(self.checkpoint_path, [json.dumps({
+            "chunk_size": self.chunk_size,
+            "completed_chunks": sorted(completed),
+        })])
+
+    def _clear_output(self):
+        """Remove an earlier run's parts, checkpoint and summaries, so none of them are read back"""
+        for name in os.listdir(self.output_dir):
+            if ((name.startswith("part-") and name.endswith((".jsonl", ".jsonl.tmp")))
+                    or name in ("checkpoint.json", "summaries.jsonl")):
+                os.remove(os.path.join(self.output_dir, name))
+
+    def _part_path(self, chunk_index):
+        return os.path.join(self.output_dir, f"part-{chunk_index:05d}.jsonl")
+
+    def _chunks(self, records, completed):
+        records = iter(records)
+        chunk_index = 0
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return
+            if chunk_index not in completed:
+                yield chunk_index, chunk
+            chunk_index += 1
+
+    def run(self, records, resume=True):
+        """
+        Process a stream of (session_id, entry) pairs.
+
+        Returns:
+            dict: Counts of processed chunks and turns and of summarized sessions
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not resume:
+            self._clear_output()
+        completed = self._load_checkpoint()
+        skipped = len(completed)
+        turns = 0
+        max_pending = self.workers * 2
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.patterns, self.keywords)) as pool:
+            pending = {}
+            for chunk_index, chunk in self._chunks(records, completed):
+                pending[pool.submit(_extract_chunk, chunk)] = chunk_index
+                # Bound the work in flight so memory stays flat on huge inputs
+                if len(pending) >= max_pending:
+                    turns += self._collect(pending, completed, wait(pending, return_when=FIRST_COMPLETED).done)
+            turns += self._collect(pending, completed, list(pending))
+
+        sessions = self.write_summaries()
+        print(f"[Batch] Processed {turns} turns in {len(completed) - skipped} chunks "
+              f"({skipped} already done), summarized {sessions} sessions")
+        return {"chunks": len(completed) - skipped, "skipped_chunks": skipped,
+                "turns": turns, "sessions": sessions}
+
+    def _collect(self, pending, completed, done):
+        turns = 0
+        for future in done:
+            chunk_index = pending.pop(future)
+            results = future.result()
+            _write_atomic(self._part_path(chunk_index),
+                          (json.dumps(result, ensure_ascii=False) + "\n" for result in results))
+            completed.add(chunk_index)
+            self._save_checkpoint(completed)
+            turns += len(results)
+        return turns
+
+    def iter_results(self):
+        """Stream processed turns back from the part files, in input order"""
+        parts = sorted(name for name in os.listdir(self.output_dir)
+                       if name.startswith("part-") and name.endswith(".jsonl"))
+        for name in parts:
+            with open(os.path.join(self.output_dir, name), "r") as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def write_summaries(self):
+        """
+        Write one get_session_summary-style record per session; returns the
+        session count. Each turn is merged into its session's running
+        summary, and a session is written out once `max_open_sessions`
+        others have been seen since its last turn, so memory stays flat
+        however many sessions there are. A session that turns up again after
+        that is merged with its earlier record at the end.
+        """
+        path = os.path.join(self.output_dir, "summaries.jsonl")
+        tmp_path = path + ".tmp"
+        open_sessions = OrderedDict()  # session_id -> _SessionSummary, least recently seen first
+        written = set()
+        reopened = set()
+        with open(tmp_path, "w") as f:
+            for result in self.iter_results():
+                session_id = result["session_id"]
+                session = open_sessions.get(session_id)
+                if session is None:
+                    if session_id in written:
+                        reopened.add(session_id)
+                    session = open_sessions[session_id] = _SessionSummary()
+                    if len(open_sessions) > self.max_open_sessions:
+                        idle_id, idle = open_sessions.popitem(last=False)
+                        f.write(_summary_line(idle_id, idle.summary))
+                        written.add(idle_id)
+                else:
+                    open_sessions.move_to_end(session_id)
+                session.add(result["extracted_info"])
+            for session_id, session in open_sessions.items():
+                f.write(_summary_line(session_id, session.summary))
+                written.add(session_id)
+        if reopened:
+            self._merge_reopened(tmp_path, reopened)
+        os.replace(tmp_path, path)
+        return len(written)
+
+    @staticmethod
+    def _merge_reopened(path, reopened):
+        """Merge the several records of each session in `reopened` into one"""
+        merged = {session_id: _SessionSummary() for session_id in reopened}
+        with open(path, "r") as f, open(path + ".merge", "w") as out:
+            for line in f:
+                record = json.loads(line)
+                if record["session_id"] in merged:
+                    merged[record["session_id"]].add(record["summary"])
+                else:
+                    out.write(line)
+            for session_id, session in merged.items():
+                out.write(_summary_line(session_id, session.summary))
+        os.replace(path + ".merge", path)
@@ -0,0 +1,246 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from contextlib import contextmanager
+
+from services.OpenAIClient import hold_slot
+from services.Telemetry import get_telemetry
+
+
+class FairLimiter:
+    """
+    Shares `capacity` upstream request slots between calls, at most
+    `per_call` at a time for any one call. When requests have to wait,
+    freed slots go to the waiting calls in turn (round robin), not to
+    whichever thread wakes up first, so a busy call can't starve the
+    others.
+    """
+
+    def __init__(self, capacity=16, per_call=2):
+        self.capacity = capacity
+        self.per_call = per_call
+        self.metrics = {"requests": 0, "waited": 0, "wait_seconds": 0.0}
+        self._active = 0
+        self._held = {}  # call id -> slots held
+        self._waiting = OrderedDict()  # call id -> its waiting requests, calls in turn order
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, call_id):
+        self.acquire(call_id)
+        try:
+            yield
+        finally:
+            self.release(call_id)
+
+    def acquire(self, call_id):
+        with self._cond:
+            self.metrics["requests"] += 1
+            if not self._waiting and self._available(call_id):
+                self._grant(call_id)
+                return
+            ticket = object()
+            self._waiting.setdefault(call_id, deque()).append(ticket)
+            start = time.perf_counter()
+            while self._next() is not ticket:
+                self._cond.wait()
+            tickets = self._waiting[call_id]
+            tickets.popleft()
+            if tickets:
+                # The call's next request waits for its next turn
+                self._waiting.move_to_end(call_id)
+            else:
+                del self._waiting[call_id]
+            self._grant(call_id)
+            self.metrics["waited"] += 1
+            self.metrics["wait_seconds"] += time.perf_counter() - start
+            # Another waiting call may be able to go too
+            self._cond.notify_all()
+
+    def release(self, call_id):
+        with self._cond:
+            self._active -= 1
+            self._held[call_id] -= 1
+            if not self._held[call_id]:
+                del self._held[call_id]
+            self._cond.notify_all()
+
+    def _available(self, call_id):
+        return self._active < self.capacity and self._held.get(call_id, 0) < self.per_call
+
+    def _next(self):
+        """The waiting request to serve next, if a slot is free for it"""
+        for call_id, tickets in self._waiting.items():
+            if self._available(call_id):
+                return tickets[0]
+        return None
+
+    def _grant(self, call_id):
+        self._active += 1
+        self._held[call_id] = self._held.get(call_id, 0) + 1
+
+
+class CallClient:
+    """
+    One call's view of the shared OpenAIService: the same client,
+    connection pool, retries and metrics, with every request taking a
+    FairLimiter slot first. Pass it to the services as their `client`.
+    """
+
+    def __init__(self, service, limiter, call_id):
+        self.service = service
+        self.limiter = limiter
+        self.call_id = call_id
+
+    @property
+    def client(self):
+        return self.service.client
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        # A streamed reply keeps its slot until it has been read or closed
+        self.limiter.acquire(self.call_id)
+        try:
+            result = self.service.call(endpoint, fn, *args, **kwargs)
+        except BaseException:
+            self.limiter.release(self.call_id)
+            raise
+        return hold_slot(result, lambda: self.limiter.release(self.call_id), kwargs.get("stream"))
+
+    def chat(self, **kwargs):
+        return self.call("chat.completions", self.client.chat.completions.create, **kwargs)
+
+    def speech(self, **kwargs):
+        return self.call("audio.speech", self.client.audio.speech.create, **kwargs)
+
+    def transcription(self, **kwargs):
+        return self.call("audio.transcriptions", self.client.audio.transcriptions.create, **kwargs)
+
+
+class Call:
+    """A call handed to a CallScheduler: where its audio comes from and goes to, and how it went"""
+
+    def __init__(self, call_id, source, sink=None):
+        self.call_id = call_id
+        self.source = source
+        self.sink = sink
+        self.agent = None
+        self.future = None
+        self.hung_up = False
+        self.submitted = time.monotonic()
+        self.started = None
+        self.ended = None
+
+    @property
+    def queued_seconds(self):
+        """How long the call waited for a free worker"""
+        return None if self.started is None else self.started - self.submitted
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class CallScheduler:
+    """
+    Runs many calls in one process on a pool of `max_calls` workers; calls
+    beyond that wait for a free worker in the order they came in.
+
+    `factory(call)` builds the agent for a call, from the services shared
+    by all calls and the call's own source and sink; the agent must have
+    `start_conversation()`, `hang_up()` and `close()`. `drain()` stops
+    taking calls and lets the ones already accepted finish.
+    """
+
+    def __init__(self, factory, max_calls=8):
+        self.factory = factory
+        self.max_calls = max_calls
+        self.metrics = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "hung_up": 0}
+        self._calls = {}  # call id -> Call, waiting or running
+        self._ids = itertools.count(1)
+        self._draining = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_calls, thread_name_prefix="call")
+
+    @property
+    def active(self):
+        with self._lock:
+            return sum(1 for call in self._calls.values() if call.started is not None)
+
+    @property
+    def waiting(self):
+        with self._lock:
+            return sum(1 for call in self._calls.values() if call.started is None)
+
+    def submit(self, source, sink=None, call_id=None):
+        """Accept a call; returns its Call, whose result() is available once it has ended"""
+        with self._lock:
+            if self._draining:
+                self.metrics["rejected"] += 1
+                raise RuntimeError("The scheduler is draining and takes no new calls")
+            call = Call(call_id or f"call-{next(self._ids)}", source, sink)
+            self._calls[call.call_id] = call
+            self.metrics["submitted"] += 1
+            call.future = self._pool.submit(self._run, call)
+        return call
+
+    def hang_up(self, call):
+        """End a call at its next turn boundary, or before it starts if it is still waiting"""
+        with self._lock:
+            call.hung_up = True
+            agent = call.agent
+            self.metrics["hung_up"] += 1
+        if agent is not None:
+            agent.hang_up()
+
+    def drain(self, timeout=None):
+        """
+        Stop taking calls and wait for the accepted ones to end; those still
+        going after `timeout` seconds are hung up. Returns True if every
+        call ended on its own.
+        """
+        with self._lock:
+            self._draining = True
+            calls = list(self._calls.values())
+        _, pending = wait_futures([call.future for call in calls], timeout=timeout)
+        for call in calls:
+            if not call.future.done():
+                print(f"[Calls] Hanging up {call.call_id}")
+                self.hang_up(call)
+        self._pool.shutdown(wait=True)
+        return not pending
+
+    def _run(self, call):
+        with self._lock:
+            if call.hung_up:
+                del self._calls[call.call_id]
+                return call
+            call.started = time.monotonic()
+        # The agent and the threads it starts time the call's own turns
+        with get_telemetry().turn_scope():
+            return self._converse(call)
+
+    def _converse(self, call):
+        agent = None
+        try:
+            agent = self.factory(call)
+            with self._lock:
+                call.agent = agent
+                hung_up = call.hung_up
+            if not hung_up:
+                agent.start_conversation()
+            with self._lock:
+                self.metrics["completed"] += 1
+            return call
+        except Exception as e:
+            print(f"[Calls] {call.call_id} failed: {e}")
+            with self._lock:
+                self.metrics["failed"] += 1
+            raise
+        finally:
+            if agent is not None:
+                agent.close()
+            call.ended = time.monotonic()
+            with self._lock:
+                del self._calls[call.call_id]
@@ -1,8 +1,40 @@
-import re
-import json
 import os
 import datetime
 from collections import defaultdict
+from services.ConversationStore import SQLiteConversationStore, migrate_json_store, open_store
+from services.SearchIndex import InvertedIndex, SQLiteSearchIndex
+from services.ExtractionEngine import DEFAULT_KEYWORDS, DEFAULT_PATTERNS, ExtractionEngine
+
+def summarize_extracted(extracted_infos):
+    """
+    Merge extracted-information dicts into one, removing duplicates while
+    preserving order.
+    
+    Args:
+        extracted_infos (iterable): Dictionaries of extracted information
+        
+    Returns:
+        dict: Merged information
+    """
+    # Aggregate all extracted information
+    summary = defaultdict(list)
+    for extracted_info in extracted_infos:
+        for info_type, items in extracted_info.items():
+            summary[info_type].extend(items)
+    
+    # Remove duplicates while preserving order; group matches reloaded from
+    # storage are lists, so compare them as tuples
+    for info_type in summary:
+        seen = set()
+        unique = []
+        for item in summary[info_type]:
+            key = tuple(item) if isinstance(item, list) else item
+            if key not in seen:
+                seen.add(key)
+                unique.append(item)
+        summary[info_type] = unique
+    
+    return dict(summary)
 
 class ConversationExtractor:
     """
@@ -11,48 +43,46 @@ class ConversationExtractor:
     and other structured information from conversation text.
     """
     
-    def __init__(self, storage_file="conversation_data.json"):
+    def __init__(self, storage_file="conversation_data.jsonl", store=None,
+                 legacy_file="conversation_data.json", index=None, session_id=None):
         """
         Initialize the ConversationExtractor.
         
         Args:
-            storage_file (str): Filepath to store extracted information
+            storage_file (str): Filepath to store extracted information; a
+                .db/.sqlite file selects the SQLite backend, anything else
+                the append-only JSONL log
+            store (ConversationStore, optional): Storage backend to use
+                instead of opening `storage_file`
+            legacy_file (str, optional): Old single-document JSON file that is
+                migrated into an empty store once
+            index (optional): Search index to use; defaults to an FTS5 index
+                for SQLite stores and an in-memory inverted index otherwise
+            session_id (str, optional): Session to record the turns under;
+                defaults to the current time, which calls sharing a store
+                may have in common
         """
         self.storage_file = storage_file
-        self.current_session_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.extracted_data = self._load_existing_data()
+        self.current_session_id = session_id or datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.store = store if store is not None else open_store(storage_file)
+        if legacy_file and os.path.exists(legacy_file) and self.store.is_empty():
+            migrate_json_store(legacy_file, self.store)
+        if index is None and isinstance(self.store, SQLiteConversationStore):
+            index = SQLiteSearchIndex(self.store.path)
+        self.index = index if index is not None else InvertedIndex()
+        # The index catches up with the store before every search, including
+        # turns other writers added. A persistent index is caught up now; an
+        # in-memory one is built on first search.
+        if isinstance(self.index, SQLiteSearchIndex):
+            self.index.update(self.store)
         
         # Initialize patterns for information extraction
-        self.patterns = {
-            "email": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            "phone": r'\b(\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b',
-            "date": r'\b(0?[1-9]|1[0-2])[\/\-](0?[1-9]|[12]\d|3[01])[\/\-](19|20)?\d{2}\b',
-            "time": r'\b([01]?[0-9]|2[0-3]):([0-5][0-9])(:[0-5][0-9])?\s*(am|pm|AM|PM)?\b',
-            "url": r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[/\w\.-]*\??[/\w\.-=&%]*',
-            "name": r'(?:Mr\.|Mrs\.|Ms\.|Dr\.|Prof\.)\s[A-Z][a-z]+(?:\s[A-Z][a-z]+)*'
-        }
+        self.patterns = dict(DEFAULT_PATTERNS)
         
         # Define keywords for important information
-        self.important_keywords = [
-            "appointment", "schedule", "meeting", "remember", "important", 
-            "deadline", "contact", "follow up", "call back", "priority",
-            "urgent", "critical", "key point", "action item"
-        ]
-    
-    def _load_existing_data(self):
-        """Load existing data from storage file if it exists"""
-        if os.path.exists(self.storage_file):
-            try:
-                with open(self.storage_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return {"sessions": {}}
-        return {"sessions": {}}
-    
-    def _save_data(self):
-        """Save extracted data to storage file"""
-        with open(self.storage_file, 'w') as f:
-            json.dump(self.extracted_data, f, indent=2)
+        self.important_keywords = list(DEFAULT_KEYWORDS)
+        self._engine = None
+        self._engine_config = None
     
     def extract_information(self, user_text, assistant_text):
         """
@@ -65,41 +95,41 @@ class ConversationExtractor:
         Returns:
             dict: Dictionary of extracted information
         """
-        # Combine texts for analysis
-        combined_text = f"User: {user_text}\nAssistant: {assistant_text}"
-        
-        # Initialize extracted info
-        extracted_info = defaultdict(list)
-        
-        # Extract structured information using patterns
-        for info_type, pattern in self.patterns.items():
-            matches = re.findall(pattern, combined_text)
-            if matches:
-                extracted_info[info_type].extend(matches)
-        
-        # Look for sentences containing important keywords
-        sentences = re.split(r'(?<=[.!?])\s+', combined_text)
-        for sentence in sentences:
-            if any(keyword in sentence.lower() for keyword in self.important_keywords):
-                extracted_info["important_points"].append(sentence.strip())
+        extracted_info = self._get_engine().extract(user_text, assistant_text)
         
         # Store information with timestamp
         timestamp = datetime.datetime.now().isoformat()
         
-        if not self.current_session_id in self.extracted_data["sessions"]:
-            self.extracted_data["sessions"][self.current_session_id] = []
-        
         conversation_entry = {
             "timestamp": timestamp,
             "user_text": user_text,
             "assistant_text": assistant_text,
-            "extracted_info": dict(extracted_info)
+            "extracted_info": extracted_info
         }
         
-        self.extracted_data["sessions"][self.current_session_id].append(conversation_entry)
-        self._save_data()
+        self.store.append(self.current_session_id, conversation_entry)
         
-        return dict(extracted_info)
+        return extracted_info
+    
+    def extract_batch(self, turns):
+        """
+        Extract information from many turns at once without storing them.
+        
+        Args:
+            turns (list): (user_text, assistant_text) pairs
+            
+        Returns:
+            list: Dictionary of extracted information for each turn
+        """
+        return self._get_engine().extract_batch(turns)
+    
+    def _get_engine(self):
+        """Return the compiled engine, rebuilding it if patterns or keywords changed"""
+        config = (tuple(self.patterns.items()), tuple(self.important_keywords))
+        if self._engine is None or self._engine_config != config:
+            self._engine = ExtractionEngine(self.patterns, self.important_keywords)
+            self._engine_config = config
+        return self._engine
     
     def get_session_summary(self, session_id=None):
         """
@@ -113,47 +143,44 @@ class ConversationExtractor:
         """
         session_id = session_id or self.current_session_id
         
-        if session_id not in self.extracted_data["sessions"]:
+        session_data = self.store.get_session(session_id)
+        if session_data is None:
             return {"error": "Session not found"}
         
-        session_data = self.extracted_data["sessions"][session_id]
-        
-        # Aggregate all extracted information
-        summary = defaultdict(list)
-        for entry in session_data:
-            for info_type, items in entry["extracted_info"].items():
-                summary[info_type].extend(items)
-        
-        # Remove duplicates while preserving order
-        for info_type in summary:
-            seen = set()
-            summary[info_type] = [x for x in summary[info_type] 
-                                 if not (x in seen or seen.add(x))]
-        
-        return dict(summary)
+        return summarize_extracted(entry["extracted_info"] for entry in session_data)
     
-    def search_conversations(self, query):
+    def search_conversations(self, query, session_id=None, start_date=None, end_date=None,
+                             entity_type=None, limit=None, offset=0):
         """
-        Search for conversations containing the query.
+        Search for conversations matching the query, best matches first.
         
         Args:
-            query (str): Search query
+            query (str): Search terms; turns matching more of them rank higher
+            session_id (str, optional): Only search this session
+            start_date (str, optional): Earliest date to include, e.g. "2025-05-28"
+            end_date (str, optional): Latest date to include
+            entity_type (str, optional): Only turns with this kind of extracted
+                information, e.g. "phone"
+            limit (int, optional): Page size. Defaults to all matches.
+            offset (int): Number of matches to skip
             
         Returns:
             list: List of matching conversation entries
         """
+        self.index.update(self.store)
+        matches, _ = self.index.search(query, session_id=session_id, start_date=start_date,
+                                       end_date=end_date, entity_type=entity_type,
+                                       limit=limit, offset=offset)
         results = []
-        
-        for session_id, entries in self.extracted_data["sessions"].items():
-            for entry in entries:
-                if (query.lower() in entry["user_text"].lower() or 
-                    query.lower() in entry["assistant_text"].lower()):
-                    results.append({
-                        "session_id": session_id,
-                        "timestamp": entry["timestamp"],
-                        "conversation": f"User: {entry['user_text']}\nAssistant: {entry['assistant_text']}",
-                        "extracted_info": entry["extracted_info"]
-                    })
+        for entry_id, score in matches:
+            entry_session, entry = self.store.get_entry(entry_id)
+            results.append({
+                "session_id": entry_session,
+                "timestamp": entry["timestamp"],
+                "conversation": f"User: {entry['user_text']}\nAssistant: {entry['assistant_text']}",
+                "extracted_info": entry["extracted_info"],
+                "score": score
+            })
         
         return results
     
@@ -0,0 +1,165 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency, fall back to an estimate
+    tiktoken = None
+
+# Approximate per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD = 4
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates
+    them at roughly four characters per token.
+    """
+
+    def __init__(self, model="gpt-4.1-mini"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return (len(text) + 3) // 4
+
+    def count_message(self, message):
+        return self.count(message["content"]) + MESSAGE_OVERHEAD
+
+
+def compact_summary(previous_summary, evicted_messages, counter, max_tokens):
+    """
+    Default summarizer: keeps the first sentence of every evicted message as a
+    one-line note and drops the oldest notes once `max_tokens` is exceeded.
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+    for message in evicted_messages:
+        first_sentence = re.split(r'(?<=[.!?])\s+', message["content"].strip(), maxsplit=1)[0]
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        lines.append(f"{speaker}: {first_sentence}")
+    while len(lines) > 1 and counter.count("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """
+    Token-budgeted conversation history for the chat completion payload.
+
+    Recent turns are kept verbatim in a sliding window. When the payload
+    exceeds `max_tokens`, the oldest turns are evicted until it drops below
+    `low_water` of the budget, and folded into a running summary that lives in
+    the system message together with any pinned facts. The payload list is
+    memoized: between evictions new messages are only appended to it.
+    """
+
+    def __init__(self, system_prompt, max_tokens=2000, low_water=0.75, summary_max_tokens=200,
+                 pin_max_tokens=150, summarizer=None, counter=None):
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.low_water = low_water
+        self.summary_max_tokens = summary_max_tokens
+        self.pin_max_tokens = pin_max_tokens
+        self.counter = counter or TokenCounter()
+        # Callable (previous_summary, evicted_messages, counter, max_tokens) -> summary
+        self.summarizer = summarizer or compact_summary
+        self.summary = ""
+        self.pinned_facts = ""
+        self.history = []
+        self._history_tokens = []
+        self._payload = None
+        self._system_tokens = 0
+        self.evictions = 0
+
+    @property
+    def messages(self):
+        """The full message list to send, rebuilt only after evictions or pin changes"""
+        if self._payload is None:
+            system = {"role": "system", "content": self._system_content()}
+            self._system_tokens = self.counter.count_message(system)
+            self._payload = [system, *self.history]
+        return self._payload
+
+    @property
+    def token_count(self):
+        """Token size of the current payload"""
+        self.messages  # Refreshes the system message size if it was invalidated
+        return self._system_tokens + sum(self._history_tokens)
+
+    def add(self, role, content):
+        """Append a message, evicting old turns if the budget is exceeded"""
+        message = {"role": role, "content": content}
+        self.history.append(message)
+        self._history_tokens.append(self.counter.count_message(message))
+        if self._payload is not None:
+            self._payload.append(message)
+        if self.token_count > self.max_tokens:
+            self._evict()
+
+    def pin_facts(self, facts):
+        """
+        Pin extracted details (e.g. ConversationExtractor.get_session_summary())
+        into the system message so they survive eviction.
+        """
+        lines = []
+        for info_type, items in facts.items():
+            if info_type in ("error", "important_points"):
+                continue
+            values = []
+            for item in items:
+                if isinstance(item, (list, tuple)):
+                    item = " ".join(part for part in item if part)
+                if item and item not in values:
+                    values.append(item)
+            if values:
+                lines.append(f"{info_type}: {', '.join(values)}")
+        while lines and self.counter.count("\n".join(lines)) > self.pin_max_tokens:
+            lines.pop(0)
+        pinned = "\n".join(lines)
+        if pinned != self.pinned_facts:
+            self.pinned_facts = pinned
+            self._payload = None
+
+    def clear(self):
+        self.summary = ""
+        self.pinned_facts = ""
+        self.history = []
+        self._history_tokens = []
+        self._payload = None
+
+    def _system_content(self):
+        content = self.system_prompt
+        if self.pinned_facts:
+            content += f"\n\nKnown details about the client:\n{self.pinned_facts}"
+        if self.summary:
+            content += f"\n\nSummary of the earlier conversation:\n{self.summary}"
+        return content
+
+    def _evict(self):
+        target = int(self.max_tokens * self.low_water)
+        total = self.token_count
+        count = 0
+        # Always keep the newest message so the model sees the current turn
+        while count < len(self.history) - 1 and total > target:
+            total -= self._history_tokens[count]
+            count += 1
+        # Evict whole exchanges where possible: a user message and every reply to it. A turn
+        # may have no reply (or several), so exchanges end at the next user message.
+        while count < len(self.history) - 1 and self.history[count]["role"] != "user":
+            total -= self._history_tokens[count]
+            count += 1
+        if not count:
+            return
+        evicted = self.history[:count]
+        del self.history[:count]
+        del self._history_tokens[:count]
+        self.summary = self.summarizer(self.summary, evicted, self.counter, self.summary_max_tokens)
+        self._payload = None
+        self.evictions += 1
@@ -0,0 +1,331 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from array import array
+
+
+class ConversationStore:
+    """
+    Base class for append-only conversation storage backends.
+
+    Entries are appended per session and buffered; buffered entries are
+    written in batches, either once `batch_size` entries are pending or by a
+    background flusher every `flush_interval` seconds. Each entry gets an
+    integer id that can later be used to fetch it directly. A batch that
+    can't be written is moved to `<path>.failed` (JSON Lines) rather than
+    retried on every later flush.
+    """
+
+    def __init__(self, batch_size=16, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        if flush_interval:
+            threading.Thread(target=self._flush_periodically, daemon=True).start()
+        atexit.register(self.close)
+
+    def append(self, session_id, entry):
+        """Queue an entry for writing and return its id, or None if the backend assigns it on write"""
+        with self._lock:
+            entry_id, record = self._prepare(session_id, entry)
+            self._pending.append((session_id, entry, record))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            return entry_id
+
+    def flush(self):
+        """Write all pending entries to durable storage"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                self._write_batch([record for _, _, record in pending])
+            except Exception as e:
+                print(f"Error writing {len(pending)} conversation entries, moving them to {self.path}.failed: {e}")
+                self._write_failed(pending)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self.flush()
+        self._closed.set()
+
+    def has_session(self, session_id):
+        return self.get_session(session_id) is not None
+
+    def get_session(self, session_id):
+        """Return the entries of a session in order, or None if it is unknown"""
+        raise NotImplementedError
+
+    def get_entry(self, entry_id):
+        """Return (session_id, entry) for an entry id"""
+        raise NotImplementedError
+
+    def iter_entries(self, after=None):
+        """Stream (entry_id, session_id, entry) for every stored entry, or those written after entry `after`"""
+        raise NotImplementedError
+
+    def is_empty(self):
+        raise NotImplementedError
+
+    def _prepare(self, session_id, entry):
+        """Assign an id to a new entry and encode it; returns (entry_id, record)"""
+        raise NotImplementedError
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+    def _write_failed(self, pending):
+        try:
+            with open(self.path + ".failed", "ab") as f:
+                f.write(b"".join(_encode(session_id, entry) for session_id, entry, _ in pending))
+        except Exception as e:
+            print(f"Error saving failed conversation entries, {len(pending)} lost: {e}")
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing conversation store: {e}")
+
+
+class JSONLConversationStore(ConversationStore):
+    """
+    Append-only JSON Lines log; one self-contained record per line, with the
+    byte offset of a line used as its entry id. A partially written last line
+    left behind by a crash is truncated on open.
+    """
+
+    def __init__(self, path, fsync=True, **kwargs):
+        self.path = path
+        self.fsync = fsync
+        self._recover()
+        self._size = os.path.getsize(path)
+        self._file = open(path, "ab")
+        # session_id -> [offsets]; built lazily on the first lookup of an old session
+        self._session_offsets = None
+        # session_id -> offsets of the entries this process wrote; only offsets, so a long run doesn't hold every turn
+        self._recent = {}
+        super().__init__(**kwargs)
+
+    def _recover(self):
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if not size:
+                return
+            # Walk back to the last complete line
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                f.seek(position - step)
+                block = f.read(step)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+            if position != size:
+                f.truncate(position)
+
+    def is_empty(self):
+        with self._lock:
+            return self._size == 0 and not self._pending
+
+    def _prepare(self, session_id, entry):
+        line = _encode(session_id, entry)
+        entry_id = self._size
+        self._size += len(line)
+        self._recent.setdefault(session_id, array("q")).append(entry_id)
+        if self._session_offsets is not None:
+            self._session_offsets.setdefault(session_id, []).append(entry_id)
+        return entry_id, line
+
+    def _write_batch(self, records):
+        data = b"".join(records)
+        written = self._size - len(data)
+        try:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except Exception:
+            # Offsets were handed out for the lost lines; cut any partial write and forget them
+            self._file.truncate(written)
+            self._size = written
+            self._session_offsets = None
+            self._recent = {}
+            raise
+
+    @staticmethod
+    def _decode(line):
+        record = json.loads(line)
+        return record.pop("session_id"), record
+
+    def iter_entries(self, after=None):
+        self.flush()
+        with open(self.path, "rb") as f:
+            offset = 0
+            if after is not None:
+                f.seek(after)
+                offset = after + len(f.readline())
+            for line in f:
+                if line.endswith(b"\n"):
+                    session_id, entry = self._decode(line)
+                    yield offset, session_id, entry
+                offset += len(line)
+
+    def get_entry(self, entry_id):
+        return self._read([entry_id])[0]
+
+    def get_session(self, session_id):
+        with self._lock:
+            if self._session_offsets is None and session_id in self._recent:
+                # Sessions written by this process are found without scanning the file
+                offsets = list(self._recent[session_id])
+            else:
+                if self._session_offsets is None:
+                    self._session_offsets = {}
+                    for offset, sid, _ in self.iter_entries():
+                        self._session_offsets.setdefault(sid, []).append(offset)
+                offsets = self._session_offsets.get(session_id)
+        if offsets is None:
+            return None
+        return [entry for _, entry in self._read(offsets)]
+
+    def _read(self, offsets):
+        """(session_id, entry) for each of `offsets`"""
+        self.flush()
+        with open(self.path, "rb") as f:
+            records = []
+            for offset in offsets:
+                f.seek(offset)
+                records.append(self._decode(f.readline()))
+            return records
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversation storage in an SQLite database using write-ahead logging"""
+
+    def __init__(self, path, **kwargs):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                timestamp TEXT,
+                user_text TEXT,
+                assistant_text TEXT,
+                extracted_info TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id)")
+        self._conn.commit()
+        super().__init__(**kwargs)
+
+    def is_empty(self):
+        with self._lock:
+            return not self._pending and self._conn.execute("SELECT 1 FROM turns LIMIT 1").fetchone() is None
+
+    def _prepare(self, session_id, entry):
+        # SQLite numbers the rows as they are written, so other writers on the same database can't collide
+        return None, (session_id, entry["timestamp"], entry["user_text"], entry["assistant_text"],
+                      json.dumps(entry["extracted_info"]))
+
+    def _write_batch(self, records):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO turns (session_id, timestamp, user_text, assistant_text, extracted_info) "
+                "VALUES (?, ?, ?, ?, ?)", records
+            )
+
+    @staticmethod
+    def _row_to_entry(row):
+        return {
+            "timestamp": row[0],
+            "user_text": row[1],
+            "assistant_text": row[2],
+            "extracted_info": json.loads(row[3]),
+        }
+
+    def iter_entries(self, after=None):
+        self.flush()
+        # A separate connection lets WAL readers stream without blocking writers
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute("SELECT id, session_id, timestamp, user_text, assistant_text, extracted_info "
+                                  "FROM turns WHERE id > ? ORDER BY id", (-1 if after is None else after,))
+            for row in cursor:
+                yield row[0], row[1], self._row_to_entry(row[2:])
+        finally:
+            conn.close()
+
+    def get_entry(self, entry_id):
+        with self._lock:
+            self.flush()
+            row = self._conn.execute(
+                "SELECT session_id, timestamp, user_text, assistant_text, extracted_info FROM turns WHERE id = ?",
+                (entry_id,)).fetchone()
+        return row[0], self._row_to_entry(row[1:])
+
+    def get_session(self, session_id):
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT timestamp, user_text, assistant_text, extracted_info FROM turns "
+                "WHERE session_id = ? ORDER BY id", (session_id,)).fetchall()
+        return [self._row_to_entry(row) for row in rows] or None
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        super().close()
+        self._conn.close()
+
+
+def _encode(session_id, entry):
+    record = {"session_id": session_id, **entry}
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def open_store(path, **kwargs):
+    """Open the backend matching the file extension (.db/.sqlite for SQLite, JSONL otherwise)"""
+    if os.path.splitext(path)[1] in (".db", ".sqlite", ".sqlite3"):
+        return SQLiteConversationStore(path, **kwargs)
+    return JSONLConversationStore(path, **kwargs)
+
+
+def migrate_json_store(json_path, store):
+    """
+    One-time import of the legacy single-document JSON format into `store`.
+    The legacy file is renamed to `<name>.migrated` afterwards.
+
+    Returns:
+        int: Number of entries migrated
+    """
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    count = 0
+    for session_id, entries in data.get("sessions", {}).items():
+        for entry in entries:
+            store.append(session_id, entry)
+            count += 1
+    store.flush()
+    os.replace(json_path, json_path + ".migrated")
+    print(f"Migrated {count} conversation entries from {json_path}")
+    return count
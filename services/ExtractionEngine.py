@@ -0,0 +1,149 @@
+import re
+from bisect import bisect_right
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+DEFAULT_PATTERNS = {
+    "email": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+    "phone": r'\b(\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b',
+    "date": r'\b(0?[1-9]|1[0-2])[\/\-](0?[1-9]|[12]\d|3[01])[\/\-](19|20)?\d{2}\b',
+    "time": r'\b([01]?[0-9]|2[0-3]):([0-5][0-9])(:[0-5][0-9])?\s*(am|pm|AM|PM)?\b',
+    "url": r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+[/\w\.-]*\??[/\w\.-=&%]*',
+    "name": r'(?:Mr\.|Mrs\.|Ms\.|Dr\.|Prof\.)\s[A-Z][a-z]+(?:\s[A-Z][a-z]+)*'
+}
+
+DEFAULT_KEYWORDS = [
+    "appointment", "schedule", "meeting", "remember", "important",
+    "deadline", "contact", "follow up", "call back", "priority",
+    "urgent", "critical", "key point", "action item"
+]
+
+# Cheap necessary conditions for the default patterns: a pattern can only
+# match where its trigger occurs, so a pass is skipped when the trigger is
+# absent. Keyed on the pattern itself so a customized pattern always runs.
+PATTERN_TRIGGERS = {
+    DEFAULT_PATTERNS["email"]: re.compile(r'@'),
+    DEFAULT_PATTERNS["phone"]: re.compile(r'\d{3}[\s.-]?\d{4}'),
+    DEFAULT_PATTERNS["date"]: re.compile(r'\d[\/\-]\d'),
+    DEFAULT_PATTERNS["time"]: re.compile(r'\d:\d'),
+    DEFAULT_PATTERNS["url"]: re.compile(r'https?://'),
+    DEFAULT_PATTERNS["name"]: re.compile(r'(?:Mr|Mrs|Ms|Dr|Prof)\.\s[A-Z]'),
+}
+
+# Separates turns in batch mode. Only the triggers and the keyword matcher scan
+# the joined text, and none of them can match across it; patterns run per turn.
+TURN_SEPARATOR = "\x00"
+
+
+class ExtractionEngine:
+    """
+    Precompiled extraction of patterns and keyword sentences from conversation
+    turns, returning exactly what ConversationExtractor's original per-pattern
+    `re.findall` and per-sentence keyword loop produced.
+
+    Each default pattern has a cheap trigger that must occur for it to match,
+    so most turns skip most pattern passes. Keywords are matched in one pass
+    with a compiled alternation over the lowercased text and mapped back to
+    their sentences, instead of testing every keyword against every sentence.
+    """
+
+    def __init__(self, patterns, keywords):
+        self.patterns = {info_type: re.compile(pattern) for info_type, pattern in patterns.items()}
+        self.triggers = {info_type: PATTERN_TRIGGERS.get(pattern) for info_type, pattern in patterns.items()}
+        self.keywords = list(keywords)
+        ordered = sorted(set(self.keywords), key=len, reverse=True)
+        self.keyword_pattern = re.compile("|".join(re.escape(k) for k in ordered)) if ordered else None
+        # Keywords containing sentence punctuation or edge whitespace could
+        # straddle a sentence boundary, so those need the per-sentence check
+        self._per_sentence = any(re.search(r'[.!?]|^\s|\s$', k) for k in self.keywords)
+
+    @staticmethod
+    def combine(user_text, assistant_text):
+        return f"User: {user_text}\nAssistant: {assistant_text}"
+
+    def extract(self, user_text, assistant_text):
+        """Extract information from a single conversation turn"""
+        return self.extract_text(self.combine(user_text, assistant_text))
+
+    def extract_text(self, text):
+        extracted_info = {}
+        for info_type, pattern in self.patterns.items():
+            trigger = self.triggers[info_type]
+            if trigger is not None and not trigger.search(text):
+                continue
+            matches = pattern.findall(text)
+            if matches:
+                extracted_info[info_type] = matches
+        points = self._keyword_sentences(text)
+        if points:
+            extracted_info["important_points"] = points
+        return extracted_info
+
+    def extract_batch(self, turns):
+        """
+        Extract information from many (user_text, assistant_text) turns at
+        once. Triggers and the keyword matcher each scan all turns in a single
+        pass, and patterns only run on the turns their trigger selected; a
+        pattern without a trigger runs on every turn.
+
+        Returns:
+            list: One extracted-info dict per turn, in order
+        """
+        texts = [self.combine(user_text, assistant_text) for user_text, assistant_text in turns]
+        if not texts:
+            return []
+        joined = TURN_SEPARATOR.join(texts)
+        lowered = joined.lower()
+        if joined.count(TURN_SEPARATOR) != len(texts) - 1 or len(lowered) != len(joined):
+            return [self.extract_text(text) for text in texts]
+
+        starts = []
+        position = 0
+        for text in texts:
+            starts.append(position)
+            position += len(text) + 1
+        results = [{} for _ in texts]
+
+        for info_type, pattern in self.patterns.items():
+            trigger = self.triggers[info_type]
+            if trigger is None:
+                # A customized pattern could match across turns in the joined text
+                candidates = range(len(texts))
+            else:
+                # Only run the pattern on turns where its trigger occurs
+                candidates = sorted({bisect_right(starts, m.start()) - 1 for m in trigger.finditer(joined)})
+            for turn in candidates:
+                matches = pattern.findall(texts[turn])
+                if matches:
+                    results[turn][info_type] = matches
+
+        if self.keyword_pattern is not None:
+            hit_turns = {}
+            for match in self.keyword_pattern.finditer(lowered):
+                turn = bisect_right(starts, match.start()) - 1
+                hit_turns.setdefault(turn, []).append(match.start() - starts[turn])
+            for turn, positions in hit_turns.items():
+                points = self._keyword_sentences(texts[turn], positions)
+                if points:
+                    results[turn]["important_points"] = points
+        return results
+
+    def _keyword_sentences(self, text, positions=None):
+        """Sentences of `text` that contain any keyword, stripped, in order"""
+        if self.keyword_pattern is None:
+            return []
+        sentences = SENTENCE_SPLIT.split(text)
+        if self._per_sentence:
+            return [s.strip() for s in sentences
+                    if any(keyword in s.lower() for keyword in self.keywords)]
+        if positions is None:
+            lowered = text.lower()
+            if len(lowered) != len(text):
+                return [s.strip() for s in sentences
+                        if any(keyword in s.lower() for keyword in self.keywords)]
+            positions = [m.start() for m in self.keyword_pattern.finditer(lowered)]
+        if not positions:
+            return []
+        sentence_starts = [0] + [m.end() for m in SENTENCE_SPLIT.finditer(text)]
+        hits = sorted({bisect_right(sentence_starts, p) - 1 for p in positions})
+        return [sentences[i].strip() for i in hits]
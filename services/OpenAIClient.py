@@ -0,0 +1,325 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from services.Registry import registry
+from services.Telemetry import get_telemetry
+
+_retryable_errors = None
+
+
+def retryable_errors():
+    """
+    Errors worth retrying: network trouble, timeouts, rate limits and 5xx
+    responses. openai is imported only once a service needs it, since the
+    import alone takes a good part of a second.
+    """
+    global _retryable_errors
+    if _retryable_errors is None:
+        import openai
+        _retryable_errors = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+    return _retryable_errors
+
+
+class LatencyStats:
+    """Call count, error count and recent latencies for one endpoint"""
+
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.samples = deque(maxlen=window)
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class _HeldResponse:
+    """The HTTP response of a HeldStream; closing it releases the stream's slot"""
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+
+    def close(self):
+        try:
+            self._response.close()
+        finally:
+            self._release()
+
+    async def aclose(self):
+        try:
+            await self._response.aclose()
+        finally:
+            self._release()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class HeldStream:
+    """
+    A streamed response that keeps its concurrency slot until it has been
+    read to the end or closed (by `close()` or `response.close()`), rather
+    than only until its headers arrived. `release` is called once.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self.release()
+
+    async def __aiter__(self):
+        try:
+            async for item in self._stream:
+                yield item
+        finally:
+            self.release()
+
+    @property
+    def response(self):
+        return _HeldResponse(self._stream.response, self.release)
+
+    def close(self):
+        self.response.close()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __del__(self):
+        # A stream dropped without being closed must not keep its slot forever
+        self.release()
+
+
+def hold_slot(result, release, stream):
+    """`result` of a request holding a concurrency slot: released now, or once a stream has been read or closed"""
+    if stream:
+        return HeldStream(result, release)
+    release()
+    return result
+
+
+class OpenAIService:
+    """
+    Shared, injectable OpenAI client for all services.
+
+    Wraps one OpenAI client on top of a keep-alive httpx connection pool, so
+    TLS handshakes are paid once per connection instead of once per turn.
+    Calls go through `call()`, which applies a concurrency limit, retries
+    transient failures with jittered exponential backoff and records
+    per-endpoint latency.
+    """
+
+    # Names in the openai and httpx packages
+    client_class = "OpenAI"
+    http_client_class = "Client"
+
+    def __init__(self, api_key=None, base_url=None, timeout=30.0, connect_timeout=5.0,
+                 max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0,
+                 max_retries=3, backoff_base=0.25, backoff_max=4.0, max_concurrency=16):
+        import httpx
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.api_key = api_key
+        self.base_url = base_url
+        self.http_client = getattr(httpx, self.http_client_class)(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive_connections,
+                                keepalive_expiry=keepalive_expiry),
+        )
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._semaphore = self._make_semaphore(max_concurrency)
+        self._metrics_lock = threading.Lock()
+        self.metrics = {}
+
+    @staticmethod
+    def _make_semaphore(max_concurrency):
+        return threading.BoundedSemaphore(max_concurrency)
+
+    @property
+    def client(self):
+        """The underlying OpenAI client, created on first use so a missing key only fails actual calls"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import openai
+                    self._client = getattr(openai, self.client_class)(
+                        api_key=self.api_key or os.getenv("OPENAI_API_KEY"),
+                        base_url=self.base_url or os.getenv("OPENAI_BASE_URL"),
+                        http_client=self.http_client,
+                        max_retries=0,  # Retries are handled by call()
+                    )
+        return self._client
+
+    def _stats(self, endpoint):
+        with self._metrics_lock:
+            if endpoint not in self.metrics:
+                self.metrics[endpoint] = LatencyStats()
+            return self.metrics[endpoint]
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        """
+        Call `fn(*args, **kwargs)` with the concurrency limit, retries and
+        latency tracking. For streaming requests the recorded latency is the
+        time until the response headers arrive, and the returned HeldStream
+        counts against the limit until it is read to the end or closed.
+        """
+        stats = self._stats(endpoint)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                self._semaphore.acquire()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    self._semaphore.release()
+                    raise
+            except retryable_errors() as e:
+                retry = attempt < self.max_retries
+                self._record(stats, error=True, retry=retry)
+                if not retry:
+                    raise
+                attempt += 1
+                delay = self._backoff(attempt)
+                print(f"[OpenAI] {endpoint} failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except Exception:
+                self._record(stats, error=True)
+                raise
+            latency = time.perf_counter() - start
+            self._record(stats, latency=latency)
+            get_telemetry().observe("openai." + endpoint, latency)
+            return hold_slot(result, self._semaphore.release, kwargs.get("stream"))
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(self, stats, latency=None, error=False, retry=False):
+        with self._metrics_lock:
+            stats.calls += 1
+            stats.errors += error
+            stats.retries += retry
+            if latency is not None:
+                stats.samples.append(latency)
+
+    def chat(self, **kwargs):
+        return self.call("chat.completions", self.client.chat.completions.create, **kwargs)
+
+    def speech(self, **kwargs):
+        return self.call("audio.speech", self.client.audio.speech.create, **kwargs)
+
+    def transcription(self, **kwargs):
+        return self.call("audio.transcriptions", self.client.audio.transcriptions.create, **kwargs)
+
+    def latency_summary(self):
+        """Per-endpoint call counts and latency percentiles, in seconds"""
+        with self._metrics_lock:
+            return {endpoint: stats.summary() for endpoint, stats in self.metrics.items()}
+
+    def close(self):
+        self.http_client.close()
+
+
+class AsyncOpenAIService(OpenAIService):
+    """
+    asyncio counterpart of OpenAIService for the async server. Requests are
+    awaited on the event loop, so slow completions never hold a worker
+    thread, and the concurrency limit is an asyncio semaphore.
+    """
+
+    client_class = "AsyncOpenAI"
+    http_client_class = "AsyncClient"
+
+    @staticmethod
+    def _make_semaphore(max_concurrency):
+        import asyncio
+        return asyncio.Semaphore(max_concurrency)
+
+    async def call(self, endpoint, fn, *args, **kwargs):
+        import asyncio
+        stats = self._stats(endpoint)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                await self._semaphore.acquire()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException:
+                    self._semaphore.release()
+                    raise
+            except retryable_errors() as e:
+                retry = attempt < self.max_retries
+                self._record(stats, error=True, retry=retry)
+                if not retry:
+                    raise
+                attempt += 1
+                delay = self._backoff(attempt)
+                print(f"[OpenAI] {endpoint} failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                self._record(stats, error=True)
+                raise
+            latency = time.perf_counter() - start
+            self._record(stats, latency=latency)
+            get_telemetry().observe("openai." + endpoint, latency)
+            return hold_slot(result, self._semaphore.release, kwargs.get("stream"))
+
+    async def close(self):
+        await self.http_client.aclose()
+
+
+registry.register("openai", OpenAIService)
+registry.register("openai_async", lambda: AsyncOpenAIService(max_connections=200, max_keepalive_connections=100,
+                                                             max_concurrency=200))
+
+
+def get_service():
+    """Return the process-wide OpenAIService, creating it on first use"""
+    return registry.get("openai")
+
+
+def get_async_service():
+    """Return the process-wide AsyncOpenAIService, creating it on first use"""
+    return registry.get("openai_async")
+
+
+def set_service(service):
+    """Replace the process-wide OpenAIService, e.g. with a differently configured one"""
+    registry.set("openai", service)
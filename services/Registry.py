@@ -0,0 +1,54 @@
+import threading
+import time
+
+
+class ServiceRegistry:
+    """
+    Process-wide services by name, each built by its registered factory on
+    first use and shared from then on. How long each took to build is kept
+    in `init_times`, in seconds.
+    """
+
+    def __init__(self):
+        self.init_times = {}
+        self._factories = {}
+        self._services = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        """Build `name` with `factory()` when it is first needed"""
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """Return the shared `name` service, building it on first use"""
+        service = self._services.get(name)
+        if service is not None:
+            return service
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        # One lock per service, so services being built on different threads don't wait for each other
+        with lock:
+            service = self._services.get(name)
+            if service is None:
+                start = time.perf_counter()
+                service = self._factories[name]()
+                self.init_times[name] = time.perf_counter() - start
+                self._services[name] = service
+        return service
+
+    def set(self, name, service):
+        """Replace the shared `name` service; None rebuilds it on next use"""
+        with self._lock:
+            if service is None:
+                self._services.pop(name, None)
+            else:
+                self._services[name] = service
+
+    def created(self, name):
+        return name in self._services
+
+
+registry = ServiceRegistry()
@@ -0,0 +1,184 @@
+import asyncio
+import base64
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.TextGen import SentenceSegmenter
+from services.TTS import PCM_SAMPLE_RATE
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _audio_event(index, sentence, audio, response_format):
+    data = {
+        "index": index,
+        "text": sentence,
+        "format": response_format,
+        "audio": base64.b64encode(audio).decode("ascii") if audio else None,
+    }
+    if response_format == "pcm":
+        data["sample_rate"] = PCM_SAMPLE_RATE
+    return ("audio", data)
+
+
+def iter_reply_events(text_generator, tts, user_text, voice="alloy", executor=None, response_format="mp3"):
+    """
+    Stream a reply as (event, data) pairs: a "text" event for every delta
+    the model produces, an "audio" event with the base64 speech of every
+    sentence in reply order (mp3 unless `response_format` says otherwise),
+    and a final "done" event with the full text. With `response_format`
+    None nothing is synthesized and every sentence comes as a "sentence"
+    event instead, for clients that have it spoken elsewhere.
+
+    Each sentence is synthesized on `executor` as soon as it is complete,
+    so speech for the first sentence is sent while the rest of the reply is
+    still being generated. Closing the iterator early stops generation and
+    returns once the partial reply is in the conversation history.
+    """
+    events = queue.Queue()
+    speech = queue.Queue()
+    stopped = threading.Event()
+    committed = threading.Event()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=4)
+
+    def speak():
+        # Hand audio to the response in reply order
+        index = 0
+        while True:
+            item = speech.get()
+            if item is None:
+                return
+            sentence, future = item
+            if stopped.is_set():
+                # Nobody is listening; don't wait for speech that won't be sent
+                if future is not None:
+                    future.cancel()
+                continue
+            if future is None:
+                events.put(("sentence", {"index": index, "text": sentence}))
+                index += 1
+                continue
+            try:
+                audio = future.result()
+            except Exception as e:
+                print(f"Error generating speech: {e}")
+                audio = None
+            events.put(_audio_event(index, sentence, audio, response_format))
+            index += 1
+
+    def synthesize(sentence):
+        if response_format is None:
+            return None
+        return executor.submit(tts.synthesize, sentence, voice=voice, response_format=response_format)
+
+    def generate():
+        segmenter = SentenceSegmenter()
+        parts = []
+        speaker = threading.Thread(target=speak, daemon=True)
+        speaker.start()
+        replies = text_generator.stream_response(user_text)
+        try:
+            for delta in replies:
+                if stopped.is_set():
+                    break
+                parts.append(delta)
+                events.put(("text", {"delta": delta}))
+                for sentence in segmenter.feed(delta):
+                    speech.put((sentence, synthesize(sentence)))
+            if not stopped.is_set():
+                for sentence in segmenter.flush():
+                    speech.put((sentence, synthesize(sentence)))
+        finally:
+            # Closes the upstream stream and commits the turn to the history now, in this thread
+            replies.close()
+            committed.set()
+            speech.put(None)
+            speaker.join()
+            if own_executor:
+                executor.shutdown(wait=False)
+            events.put(("done", {"text": "".join(parts).strip()}))
+
+    threading.Thread(target=generate, daemon=True).start()
+    try:
+        while True:
+            event = events.get()
+            yield event
+            if event[0] == "done":
+                break
+    finally:
+        # The client went away; stop generating once the current delta is in.
+        # Waiting for the turn to be committed keeps it ahead of whatever the
+        # caller does next with the conversation, such as the session's next request;
+        # speech still being synthesized is not waited for.
+        stopped.set()
+        committed.wait()
+
+
+async def aiter_reply_events(text_generator, tts, user_text, voice="alloy", response_format="mp3"):
+    """Async counterpart of iter_reply_events, with synthesis running as tasks"""
+    events = asyncio.Queue()
+    speech = asyncio.Queue()
+
+    async def speak():
+        index = 0
+        while True:
+            item = await speech.get()
+            if item is None:
+                return
+            sentence, task = item
+            if task is None:
+                await events.put(("sentence", {"index": index, "text": sentence}))
+                index += 1
+                continue
+            try:
+                audio = await task
+            except Exception as e:
+                print(f"Error generating speech: {e}")
+                audio = None
+            await events.put(_audio_event(index, sentence, audio, response_format))
+            index += 1
+
+    def synthesize(sentence):
+        if response_format is None:
+            return None
+        return asyncio.create_task(tts.synthesize_async(sentence, voice=voice, response_format=response_format))
+
+    async def generate():
+        segmenter = SentenceSegmenter()
+        parts = []
+        speaker = asyncio.create_task(speak())
+        try:
+            async for delta in text_generator.stream_response_async(user_text):
+                parts.append(delta)
+                await events.put(("text", {"delta": delta}))
+                for sentence in segmenter.feed(delta):
+                    await speech.put((sentence, synthesize(sentence)))
+            for sentence in segmenter.flush():
+                await speech.put((sentence, synthesize(sentence)))
+        finally:
+            speech.put_nowait(None)
+            await speaker
+            events.put_nowait(("done", {"text": "".join(parts).strip()}))
+
+    generator = asyncio.create_task(generate())
+    try:
+        while True:
+            event = await events.get()
+            yield event
+            if event[0] == "done":
+                break
+    finally:
+        if not generator.done():
+            generator.cancel()
+            # Let the partial turn reach the history before the caller moves on
+            try:
+                await generator
+            except asyncio.CancelledError:
+                pass
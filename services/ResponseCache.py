@@ -0,0 +1,208 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+
+class NgramEmbedder:
+    """
+    Hashed character n-gram vectors, L2-normalized: a dependency-free
+    stand-in for a sentence embedding model. Any callable mapping text to a
+    fixed-size vector can be used instead.
+    """
+
+    def __init__(self, n=3, dims=1024):
+        self.n = n
+        self.dims = dims
+
+    def __call__(self, text):
+        import numpy as np
+        padded = f" {text} "
+        grams = [padded[i:i + self.n] for i in range(max(1, len(padded) - self.n + 1))]
+        buckets = np.fromiter((zlib.crc32(gram.encode("utf-8")) % self.dims for gram in grams), dtype=np.int64)
+        vector = np.bincount(buckets, minlength=self.dims).astype(np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class ResponseCache:
+    """
+    Cache of assistant replies to frequent questions ("what are your opening
+    hours?"), shared by all conversations.
+
+    Entries are keyed on the normalized user input plus a context
+    fingerprint (see TextGenerator), so a reply is only reused where the
+    conversation state it depended on is the same. The exact tier matches
+    the normalized input; the optional semantic tier returns the reply of
+    the most similar cached input in the same context, if its cosine
+    similarity reaches `similarity_threshold`, using one vectorized NumPy
+    product over all entries. Character n-grams can't tell "cancel" from
+    "not cancel" or "Smith" from "Smyth", so a near match must also have
+    the same numbers, negations and content words; only phrasing (articles,
+    pronouns, word order, plurals) may differ. The semantic tier is off
+    by default.
+
+    Entries expire after `ttl` seconds, the least recently used is evicted
+    beyond `max_items`, and everything is dropped when the system prompt
+    changes.
+    """
+
+    def __init__(self, max_items=1000, ttl=24 * 3600, semantic=False, similarity_threshold=0.9, embedder=None):
+        import numpy as np
+        self.max_items = max_items
+        self.ttl = ttl
+        self.semantic = semantic
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder or NgramEmbedder()
+        self.metrics = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0,
+                        "invalidations": 0}
+        self._entries = OrderedDict()  # (context, normalized text) -> slot
+        self._keys = [None] * max_items
+        self._replies = [None] * max_items
+        self._guards = [None] * max_items
+        self._vectors = None
+        self._contexts = np.zeros(max_items, dtype=np.int64)
+        self._expires = np.zeros(max_items, dtype=np.float64)  # 0 marks a free slot
+        self._free = list(range(max_items - 1, -1, -1))
+        self._prompt = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(text):
+        """Lower-case, NFKC-normalized words without punctuation"""
+        text = unicodedata.normalize("NFKC", text or "").lower()
+        return " ".join(re.findall(r"[\w']+", text))
+
+    @staticmethod
+    def fingerprint(*parts):
+        """Compact, stable fingerprint of the conversation state a reply depends on"""
+        return hashlib.sha1("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def hit_rate(self):
+        hits = self.metrics["exact_hits"] + self.metrics["semantic_hits"]
+        total = hits + self.metrics["misses"]
+        return hits / total if total else 0.0
+
+    def get(self, text, context="", system_prompt=None):
+        """Return the cached reply for `text` in `context`, or None"""
+        normalized = self.normalize(text)
+        now = time.monotonic()
+        with self._lock:
+            self._check_prompt(system_prompt)
+            slot = self._entries.get((context, normalized))
+            if slot is not None:
+                if self._expires[slot] > now:
+                    self._entries.move_to_end((context, normalized))
+                    self.metrics["exact_hits"] += 1
+                    return self._replies[slot]
+                self._drop(slot)
+                self.metrics["expired"] += 1
+            if self.semantic and self._entries:
+                slot = self._nearest(normalized, context, now)
+                if slot is not None:
+                    self._entries.move_to_end(self._keys[slot])
+                    self.metrics["semantic_hits"] += 1
+                    return self._replies[slot]
+            self.metrics["misses"] += 1
+            return None
+
+    def put(self, text, reply, context="", system_prompt=None):
+        """Cache `reply` as the answer to `text` in `context`"""
+        import numpy as np
+        if not reply:
+            return
+        normalized = self.normalize(text)
+        vector = self.embedder(normalized) if self.semantic else None
+        with self._lock:
+            self._check_prompt(system_prompt)
+            key = (context, normalized)
+            slot = self._entries.get(key)
+            if slot is None:
+                if not self._free:
+                    self._drop(next(iter(self._entries.values())))
+                    self.metrics["evictions"] += 1
+                slot = self._free.pop()
+            self._entries[key] = slot
+            self._entries.move_to_end(key)
+            self._keys[slot] = key
+            self._replies[slot] = reply
+            self._guards[slot] = _guard(normalized)
+            self._contexts[slot] = _context_id(context)
+            self._expires[slot] = time.monotonic() + self.ttl
+            if vector is not None:
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_items, len(vector)), dtype=np.float32)
+                self._vectors[slot] = vector
+
+    def invalidate(self):
+        """Drop every entry"""
+        with self._lock:
+            self._clear()
+
+    def _check_prompt(self, system_prompt):
+        if system_prompt is None or system_prompt == self._prompt:
+            return
+        if self._prompt is not None:
+            # Replies written under another prompt may no longer fit
+            self._clear()
+        self._prompt = system_prompt
+
+    def _clear(self):
+        if self._entries:
+            self.metrics["invalidations"] += 1
+        for slot in list(self._entries.values()):
+            self._drop(slot)
+
+    def _drop(self, slot):
+        del self._entries[self._keys[slot]]
+        self._keys[slot] = self._replies[slot] = self._guards[slot] = None
+        self._expires[slot] = 0.0
+        self._free.append(slot)
+
+    def _nearest(self, normalized, context, now):
+        import numpy as np
+        if self._vectors is None:
+            return None
+        scores = self._vectors @ self.embedder(normalized)
+        candidates = (self._contexts == _context_id(context)) & (self._expires > now)
+        scores = np.where(candidates, scores, -1.0)
+        guard = _guard(normalized)
+        # Best first; only a handful can pass the threshold
+        for slot in np.argsort(scores)[::-1][:8]:
+            if scores[slot] < self.similarity_threshold:
+                break
+            if self._guards[slot] == guard:
+                return int(slot)
+        return None
+
+
+# Words that change a question's phrasing but not what it asks
+_STOPWORDS = frozenset("""
+a an the i me my we our you your it its is are was were be been am do does did can could would will shall
+should may might must have has had to of for in on at by with from about please tell what when where which
+who how that this these those there here some any and or so just like
+""".split())
+_NEGATIONS = frozenset(["no", "not", "never", "nor", "none", "nothing", "nobody", "nowhere", "without", "cannot"])
+
+
+def _guard(normalized):
+    """What a near match must share with the input: its numbers, negations and content words"""
+    negations, words = set(), set()
+    for word in normalized.split():
+        if word in _NEGATIONS or word.endswith("n't"):
+            negations.add(word)
+        elif word not in _STOPWORDS:
+            # Plurals and possessives ask the same thing
+            word = word.removesuffix("'s")
+            words.add(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+    return tuple(re.findall(r"\d+", normalized)), frozenset(negations), frozenset(words)
+
+
+def _context_id(context):
+    return zlib.crc32(context.encode("utf-8"))
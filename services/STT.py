@@ -1,29 +1,61 @@
+import itertools
 import os
-import openai
-from dotenv import load_dotenv
-import numpy as np
-import pyaudio
-import wave
 import time
+from services.AudioBuffer import AudioBuffer
+from services.OpenAIClient import get_service
+from services.AudioStream import (
+    FRAME_SIZE, SAMPLE_RATE, StreamingRecorder, VoiceActivityDetector,
+    default_capture,
+)
+from services.StreamingSTT import OpenAIBackend, StreamingTranscriber
+from services.UploadPreprocessor import UploadPreprocessor
 
 class SpeechToText:
-    def __init__(self):
-        load_dotenv()
-        openai.api_key = os.getenv("OPENAI_API_KEY")
+    def __init__(self, client=None, capture=None, preprocess=None):
+        self._api = client
+        # CaptureService recorded from when no source is given; the shared microphone by default
+        self._capture = capture
+        # Trims and compresses recorded audio before upload; False sends it as it is
+        self.preprocess = UploadPreprocessor() if preprocess is None else preprocess
+        self.metrics = {"uploads": 0, "upload_bytes": 0, "upload_seconds": 0.0}
         print("[STT] Initialized SpeechToText class.")
 
-    def transcribe_audio(self, audio_file_path):
-        """Transcribes audio file to text using OpenAI's Whisper model"""
-        print(f"[STT] Starting transcription for: {audio_file_path}")
+    @property
+    def api(self):
+        if self._api is None:
+            self._api = get_service()
+        return self._api
+
+    @property
+    def capture(self):
+        # Opened on first use and kept open, so a turn never waits for the device
+        if self._capture is None:
+            self._capture = default_capture()
+        return self._capture
+
+    def transcribe_audio(self, audio):
+        """
+        Transcribes audio to text using OpenAI's transcription model.
+        `audio` may be an AudioBuffer such as the one returned by
+        `record_audio`, a file path, raw WAV bytes or a file-like object.
+        Recorded PCM and WAV audio is trimmed and compressed by the
+        preprocessor first, or sent as WAV without one.
+        """
+        print(f"[STT] Starting transcription for: {audio if isinstance(audio, str) else '<in-memory audio>'}")
         try:
-            with open(audio_file_path, "rb") as audio_file:
-                print("[STT] Audio file opened, sending to OpenAI Whisper API...")
-                # transcript = openai.Audio.transcribe("whisper-1", audio_file)
-                transcript = openai.audio.transcriptions.create(
-                    model="gpt-4o-transcribe",
-                    file=audio_file,
-                )
-                print(f"[STT] Raw transcript response: {transcript}")
+            if isinstance(audio, AudioBuffer) and self.preprocess and audio.fmt in ("pcm", "wav"):
+                transcript = self._transcribe_bytes(*self.preprocess(audio))
+            elif isinstance(audio, AudioBuffer):
+                fmt = "wav" if audio.fmt == "pcm" else audio.fmt
+                transcript = self._transcribe_bytes(f"recording.{fmt}", audio.encode(fmt))
+            elif isinstance(audio, (bytes, bytearray)):
+                transcript = self._transcribe_bytes("recording.wav", audio)
+            elif isinstance(audio, str):
+                with open(audio, "rb") as audio_file:
+                    transcript = self._transcribe(audio_file)
+            else:
+                audio.seek(0)
+                transcript = self._transcribe(audio)
             # Always use .text for the result
             if hasattr(transcript, "text"):
                 print("[STT] Transcription successful.")
@@ -35,60 +67,90 @@ class SpeechToText:
             print(f"[STT] Error transcribing audio: {e}")
             return None
 
-    def record_audio(self, filename="recording.wav", silence_threshold=500, silence_duration=1.0, max_record_time=15):
+    def _transcribe(self, audio_file):
+        # Read the payload up front so a retried request can send it again
+        name = os.path.basename(getattr(audio_file, "name", None) or "recording.wav")
+        return self._transcribe_bytes(name, audio_file.read())
+
+    def _transcribe_bytes(self, name, data):
+        print(f"[STT] Sending {len(data) / 1024:.0f} KB of audio to OpenAI transcription API...")
+        start = time.perf_counter()
+        transcript = self.api.transcription(
+            model="gpt-4o-transcribe",
+            file=(name, data),
+        )
+        self.metrics["uploads"] += 1
+        self.metrics["upload_bytes"] += len(data)
+        self.metrics["upload_seconds"] += time.perf_counter() - start
+        print(f"[STT] Raw transcript response: {transcript}")
+        return transcript
+
+    def record_audio(self, filename=None, silence_threshold=500, silence_duration=1.0, max_record_time=15, source=None,
+                     hold=None):
         """
-        Records audio from the microphone until silence is detected.
-        Stops recording if silence is detected for `silence_duration` seconds,
-        or if `max_record_time` is reached.
+        Records a single utterance using voice activity detection.
+        Recording starts at detected speech onset and stops once
+        `silence_duration` seconds of non-speech follow it, or when
+        `max_record_time` is reached.
+
+        Returns the utterance as an AudioBuffer of PCM samples (or None if no
+        speech was detected). When `filename` is given it is also written to
+        disk as a WAV file.
+        Any iterable of int16 frames can be passed as `source`; by default
+        the utterance comes from the long-lived capture service, which keeps
+        the microphone open between turns. While `hold()` returns True the
+        source is read but its frames are ignored.
         """
         print("[STT] Starting voice-activated audio recording...")
-        CHUNK = 1024
-        FORMAT = pyaudio.paInt16
-        CHANNELS = 1
-        RATE = 16000
-
-        p = pyaudio.PyAudio()
-        stream = p.open(format=FORMAT,
-                        channels=CHANNELS,
-                        rate=RATE,
-                        input=True,
-                        frames_per_buffer=CHUNK)
+        source = source if source is not None else self.capture.listen()
+        recorder = self._recorder(source, silence_threshold, silence_duration, max_record_time, hold)
 
         print("[STT] Recording... Speak now.")
-        frames = []
-        silent_chunks = 0
-        silence_chunk_limit = int(silence_duration * RATE / CHUNK)
-        start_time = time.time()
-
-        while True:
-            data = stream.read(CHUNK)
-            frames.append(data)
-            audio_data = np.frombuffer(data, dtype=np.int16)
-            volume = np.abs(audio_data).mean()
-
-            if volume < silence_threshold:
-                silent_chunks += 1
-            else:
-                silent_chunks = 0
+        try:
+            samples = recorder.record()
+        finally:
+            source.close()
+        if samples is None:
+            return None
 
-            # Stop if silence detected for required duration or max time reached
-            if silent_chunks > silence_chunk_limit:
-                print("[STT] Silence detected, stopping recording.")
-                break
-            if time.time() - start_time > max_record_time:
-                print("[STT] Max record time reached, stopping recording.")
-                break
+        audio = AudioBuffer.from_samples(samples, recorder.sample_rate)
+        if filename:
+            with open(filename, "wb") as f:
+                f.write(audio.encode("wav"))
+            print(f"[STT] Audio saved to {filename}")
+        print(f"[STT] Captured {len(samples) / recorder.sample_rate:.2f}s of audio")
+        return audio
 
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+    def stream_transcription(self, silence_threshold=500, silence_duration=1.0, max_record_time=15, source=None,
+                             hold=None, backend=None):
+        """
+        Records a single utterance like `record_audio`, transcribing it while
+        it is spoken. Yields partial Hypothesis objects as the transcript
+        grows, then a final one once the utterance has ended. Nothing is
+        yielded if no speech was detected.
 
-        wf = wave.open(filename, 'wb')
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(p.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(b''.join(frames))
-        wf.close()
+        `backend` is a TranscriptionBackend (see services/StreamingSTT.py);
+        by default the OpenAI API re-transcribes the last few seconds for
+        partials. It still uploads the whole utterance once it ends, so the
+        final transcript comes no sooner than from `record_audio`.
+        """
+        print("[STT] Starting streaming transcription...")
+        backend = backend or OpenAIBackend(self)
+        source = source if source is not None else self.capture.listen()
+        recorder = self._recorder(source, silence_threshold, silence_duration, max_record_time, hold)
+        try:
+            frames = recorder.stream()
+            first = next(frames, None)
+            if first is None:
+                return
+            frames = itertools.chain([first], frames)
+            yield from StreamingTranscriber(backend).transcribe(frames, recorder.sample_rate)
+        finally:
+            source.close()
 
-        print(f"[STT] Audio saved to {filename}")
-        return filename
\ No newline at end of file
+    @staticmethod
+    def _recorder(source, silence_threshold, silence_duration, max_record_time, hold):
+        frame_seconds = FRAME_SIZE / SAMPLE_RATE
+        vad = VoiceActivityDetector(energy_threshold=silence_threshold,
+                                    hangover_frames=max(1, int(silence_duration / frame_seconds)))
+        return StreamingRecorder(source, vad=vad, max_record_time=max_record_time, hold=hold)
@@ -0,0 +1,257 @@
+import math
+import re
+import sqlite3
+import threading
+from array import array
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def entity_text(extracted_info):
+    """Flatten extracted entity values into searchable text"""
+    parts = []
+    for items in extracted_info.values():
+        for item in items:
+            if isinstance(item, (list, tuple)):
+                parts.extend(part for part in item if part)
+            elif item:
+                parts.append(item)
+    return " ".join(parts)
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _date_key(value):
+    """Turn an ISO timestamp or date ('2025-05-28...') into an int like 20250528"""
+    if value is None:
+        return None
+    return int(str(value)[:10].replace("-", ""))
+
+
+class InvertedIndex:
+    """
+    In-memory BM25-ranked inverted index over conversation turns.
+
+    Postings and per-turn metadata are kept in compact typed arrays, so a
+    query only touches the postings of its own terms and is scored with
+    vectorized NumPy operations.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> (array of doc numbers, array of term frequencies)
+        self._entry_ids = array("q")
+        self._doc_lengths = array("I")
+        self._dates = array("I")
+        self._sessions = array("I")
+        self._session_numbers = {}
+        self._entity_docs = {}  # entity type -> array of the doc numbers that have it
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entry_ids)
+
+    @property
+    def last_entry_id(self):
+        """The id of the latest turn indexed, or None"""
+        with self._lock:
+            return self._entry_ids[-1] if self._entry_ids else None
+
+    def update(self, store, batch_size=10000):
+        """Index the turns `store` has written since the latest one indexed"""
+        with self._update_lock:
+            for batch in _batches(store.iter_entries(after=self.last_entry_id), batch_size):
+                for record in batch:
+                    self.add(*record)
+
+    def add(self, entry_id, session_id, entry):
+        """Index one conversation turn"""
+        info = entry.get("extracted_info", {})
+        terms = tokenize(f"{entry['user_text']} {entry['assistant_text']} {entity_text(info)}")
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        with self._lock:
+            doc = len(self._entry_ids)
+            for term, count in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("I"), array("H"))
+                postings[0].append(doc)
+                postings[1].append(min(count, 65535))
+            for info_type, items in info.items():
+                if items:
+                    self._entity_docs.setdefault(info_type, array("I")).append(doc)
+            self._entry_ids.append(entry_id)
+            self._doc_lengths.append(len(terms))
+            self._dates.append(_date_key(entry["timestamp"]) or 0)
+            self._sessions.append(self._session_numbers.setdefault(session_id, len(self._session_numbers)))
+            self._total_length += len(terms)
+
+    def search(self, query, session_id=None, start_date=None, end_date=None, entity_type=None,
+               limit=20, offset=0):
+        """
+        Rank turns matching any query term with BM25.
+
+        Returns:
+            tuple: (list of (entry_id, score) for the requested page, total number of matches)
+        """
+        import numpy as np
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._entry_ids)
+            if not terms or not count:
+                return [], 0
+            avg_length = self._total_length / count
+            docs, scores = [], []
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                # Copied so no NumPy view pins the array's buffer once the lock is released
+                term_docs = np.frombuffer(postings[0], dtype=np.uint32).copy()
+                tf = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float64)
+                lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)[term_docs]
+                idf = math.log(1 + (count - len(term_docs) + 0.5) / (len(term_docs) + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * lengths / avg_length)
+                docs.append(term_docs)
+                scores.append(idf * tf * (self.k1 + 1) / norm)
+            if not docs:
+                return [], 0
+            docs = np.concatenate(docs)
+            scores = np.concatenate(scores)
+            docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+
+            keep = np.ones(len(docs), dtype=bool)
+            if session_id is not None:
+                number = self._session_numbers.get(session_id)
+                if number is None:
+                    return [], 0
+                keep &= np.frombuffer(self._sessions, dtype=np.uint32)[docs] == number
+            if start_date is not None or end_date is not None:
+                dates = np.frombuffer(self._dates, dtype=np.uint32)[docs]
+                if start_date is not None:
+                    keep &= dates >= _date_key(start_date)
+                if end_date is not None:
+                    keep &= dates <= _date_key(end_date)
+            if entity_type is not None:
+                entity_docs = self._entity_docs.get(entity_type)
+                if entity_docs is None:
+                    return [], 0
+                # Both are sorted doc numbers
+                keep &= np.isin(docs, np.frombuffer(entity_docs, dtype=np.uint32), assume_unique=True)
+            docs, scores = docs[keep], scores[keep]
+            entry_ids = np.frombuffer(self._entry_ids, dtype=np.int64)[docs]
+
+        total = len(docs)
+        end = total if limit is None else min(total, offset + limit)
+        if end <= offset:
+            return [], total
+        # Highest score first, ties broken by insertion order
+        if end < total:
+            top = np.argpartition(-scores, end - 1)[:end]
+            top = top[np.lexsort((docs[top], -scores[top]))]
+        else:
+            top = np.lexsort((docs, -scores))
+        page = top[offset:end]
+        return [(int(entry_ids[i]), float(scores[i])) for i in page], total
+
+
+class SQLiteSearchIndex:
+    """Full-text index over conversation turns backed by SQLite FTS5"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+                user_text, assistant_text, entities,
+                session_id UNINDEXED, day UNINDEXED, entity_types UNINDEXED
+            )""")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM turns_fts").fetchone()[0]
+
+    @property
+    def last_entry_id(self):
+        """The id of the latest turn indexed, or None; rowids are entry ids, so the index itself records it"""
+        with self._lock:
+            return self._conn.execute("SELECT MAX(rowid) FROM turns_fts").fetchone()[0]
+
+    def update(self, store, batch_size=10000):
+        """Index the turns `store` has written since the latest one indexed"""
+        with self._update_lock:
+            for batch in _batches(store.iter_entries(after=self.last_entry_id), batch_size):
+                self.add_many(batch)
+
+    def add(self, entry_id, session_id, entry):
+        self.add_many([(entry_id, session_id, entry)])
+
+    def add_many(self, records):
+        """Index many (entry_id, session_id, entry) records in one transaction"""
+        rows = []
+        for entry_id, session_id, entry in records:
+            info = entry.get("extracted_info", {})
+            types = " ".join(info_type for info_type, items in info.items() if items)
+            rows.append((entry_id, entry["user_text"], entry["assistant_text"], entity_text(info),
+                         session_id, _date_key(entry["timestamp"]), f" {types} "))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO turns_fts (rowid, user_text, assistant_text, entities, "
+                "session_id, day, entity_types) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def search(self, query, session_id=None, start_date=None, end_date=None, entity_type=None,
+               limit=20, offset=0):
+        """Same contract as InvertedIndex.search"""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return [], 0
+        match = " OR ".join(f'"{term}"' for term in terms)
+        where = ["turns_fts MATCH ?"]
+        params = [match]
+        if session_id is not None:
+            where.append("session_id = ?")
+            params.append(session_id)
+        if start_date is not None:
+            where.append("day >= ?")
+            params.append(_date_key(start_date))
+        if end_date is not None:
+            where.append("day <= ?")
+            params.append(_date_key(end_date))
+        if entity_type is not None:
+            where.append("entity_types LIKE ?")
+            params.append(f"% {entity_type} %")
+        clause = " AND ".join(where)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM turns_fts WHERE {clause}", params).fetchone()[0]
+            # bm25() is lower for better matches
+            rows = self._conn.execute(
+                f"SELECT rowid, -bm25(turns_fts) FROM turns_fts WHERE {clause} "
+                f"ORDER BY bm25(turns_fts), rowid LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset]).fetchall()
+        return [(row[0], row[1]) for row in rows], total
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,76 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class SessionStore:
+    """
+    Per-session state for the servers, keyed by session id.
+
+    Sessions are created on first use by `factory()` and kept in least
+    recently used order. Sessions idle for longer than `ttl` seconds are
+    dropped, and once `max_sessions` is reached the least recently used
+    session is evicted to make room for a new one.
+    """
+
+    def __init__(self, factory, max_sessions=1000, ttl=1800):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.metrics = {"created": 0, "expired": 0, "evicted": 0}
+        self._sessions = OrderedDict()  # session_id -> (last_used, state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def get(self, session_id=None):
+        """
+        Return (session_id, state), creating the session if it is unknown or
+        expired. A new id is generated when `session_id` is None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if session_id is None:
+                session_id = self.new_id()
+            item = self._sessions.pop(session_id, None)
+            if item is None:
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.metrics["evicted"] += 1
+                state = self.factory()
+                self.metrics["created"] += 1
+            else:
+                state = item[1]
+            self._sessions[session_id] = (now, state)
+            return session_id, state
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, (None, None))[1]
+
+    def expire(self):
+        """Drop sessions idle for longer than the TTL; returns how many were dropped"""
+        with self._lock:
+            return self._expire(time.monotonic())
+
+    def _expire(self, now):
+        # Entries are in last-used order, so expired ones are at the front
+        dropped = 0
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._sessions[session_id]
+            dropped += 1
+        self.metrics["expired"] += dropped
+        return dropped
@@ -0,0 +1,196 @@
+import difflib
+import re
+import threading
+import time
+
+from services.Telemetry import get_telemetry, in_context
+from services.TextGen import ERROR_REPLY
+
+
+def transcript_words(text):
+    """Lower-cased words of a transcript, without punctuation"""
+    return re.findall(r"[a-z0-9']+", (text or "").lower())
+
+
+def transcript_similarity(a, b):
+    """Word-level similarity of two transcripts, from 0.0 to 1.0"""
+    a, b = transcript_words(a), transcript_words(b)
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+class _Speculation:
+    def __init__(self, user_text, messages):
+        self.user_text = user_text
+        self.messages = messages
+        self.deltas = []
+        self.done = False
+        self.failed = False
+        self.cancelled = False
+        self.wasted = False
+        self.cond = threading.Condition()
+
+
+class SpeculativeGenerator:
+    """
+    Starts generating a reply while the caller is still talking.
+
+    Partial transcripts go to `on_partial()`. Once one with at least
+    `min_words` words has not changed for `settle` seconds, a reply to it is
+    streamed in the background from the current conversation, without
+    touching the history. `resolve(final_text)` then returns the reply's
+    deltas: the speculative ones when the final transcript is at least
+    `min_similarity` similar to the speculated one, otherwise those of a
+    fresh TextGenerator.stream_response. A speculative turn is committed to
+    the history with the final transcript once its deltas are consumed, just
+    as stream_response would.
+
+    `metrics` counts speculations started, hits, misses, discarded ones
+    (superseded by a newer partial or never resolved) and the completion
+    tokens those misses and discards generated for nothing.
+    """
+
+    def __init__(self, text_generator, min_words=2, settle=0.4, min_similarity=0.9):
+        self.text_generator = text_generator
+        self.min_words = min_words
+        self.settle = settle
+        self.min_similarity = min_similarity
+        self.metrics = {"started": 0, "hits": 0, "misses": 0, "discarded": 0, "wasted_tokens": 0}
+        self._current = None
+        self._timer = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        with self._lock:
+            hits, misses = self.metrics["hits"], self.metrics["misses"]
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def matches(self, speculated, final):
+        return transcript_similarity(speculated, final) >= self.min_similarity
+
+    def on_partial(self, text):
+        """Speculate on `text` once it has settled, unless the running speculation already covers it"""
+        if len(transcript_words(text)) < self.min_words:
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            current = self._current
+            if current is not None and not current.failed and self.matches(current.user_text, text):
+                return
+            self._timer = threading.Timer(self.settle, in_context(self._start), args=(text, self._generation))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def resolve(self, final_text):
+        """Return the reply deltas for the final transcript, reusing the speculation when it matches"""
+        spec = self._take()
+        if spec is not None:
+            if (final_text and not spec.failed and self.matches(spec.user_text, final_text)
+                    and spec.messages == self.text_generator.draft_messages(spec.user_text)):
+                self._count("hits")
+                return self._replay(spec, final_text)
+            self._count("misses")
+            print(f"[Speculation] Miss: speculated on {spec.user_text!r}, heard {final_text!r}")
+            self._cancel(spec)
+        return self.text_generator.stream_response(final_text)
+
+    def discard(self):
+        """Drop any unresolved speculation, e.g. when the utterance was empty or ended the call"""
+        spec = self._take()
+        if spec is not None:
+            self._count("discarded")
+            self._cancel(spec)
+
+    def _take(self):
+        with self._lock:
+            # Invalidates a pending _start, even if its timer already fired
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            spec, self._current = self._current, None
+        return spec
+
+    def _start(self, text, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._timer = None
+            previous = self._current
+            spec = _Speculation(text, self.text_generator.draft_messages(text))
+            self._current = spec
+            self.metrics["started"] += 1
+        if previous is not None:
+            self._count("discarded")
+            self._cancel(previous)
+        threading.Thread(target=in_context(self._run), args=(spec,), daemon=True).start()
+
+    def _run(self, spec):
+        try:
+            for delta in self.text_generator.stream_draft(spec.messages):
+                with spec.cond:
+                    if spec.cancelled:
+                        break
+                    spec.deltas.append(delta)
+                    spec.cond.notify_all()
+        except Exception as e:
+            print(f"[Speculation] Error generating draft reply: {e}")
+            spec.failed = True
+        finally:
+            with spec.cond:
+                spec.done = True
+                wasted = spec.wasted
+                spec.cond.notify_all()
+            if wasted:
+                self._waste(spec)
+
+    def _cancel(self, spec, wasted=True):
+        """Stop generating `spec`; its tokens are counted as wasted once it has stopped"""
+        with spec.cond:
+            spec.cancelled = True
+            spec.wasted = wasted
+            finished = spec.done
+        if wasted and finished:
+            self._waste(spec)
+
+    def _waste(self, spec):
+        self._count("wasted_tokens", self.text_generator.memory.counter.count("".join(spec.deltas)))
+
+    def _count(self, name, amount=1):
+        # Metrics are updated from the caller's thread and the drafting threads alike
+        with self._lock:
+            self.metrics[name] += amount
+
+    def _replay(self, spec, final_text):
+        generator = self.text_generator
+        start = time.perf_counter()
+        generator.last_metrics = {"speculative": True}
+        parts = []
+        done = False
+        try:
+            while not done:
+                with spec.cond:
+                    while len(spec.deltas) == len(parts) and not spec.done:
+                        spec.cond.wait()
+                    new = spec.deltas[len(parts):]
+                    done = spec.done
+                for delta in new:
+                    if not parts:
+                        generator.last_metrics["time_to_first_token"] = time.perf_counter() - start
+                        get_telemetry().mark("first_token")
+                    parts.append(delta)
+                    yield delta
+            if spec.failed and not parts:
+                parts.append(ERROR_REPLY)
+                yield ERROR_REPLY
+        finally:
+            if not done:
+                # The consumer stopped early: stop generating, keep what was said
+                self._cancel(spec, wasted=False)
+            generator.last_metrics["total_time"] = time.perf_counter() - start
+            generator.commit_turn(final_text, "".join(parts).strip())
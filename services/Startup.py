@@ -0,0 +1,96 @@
+import importlib.util
+import sys
+import threading
+import time
+
+from services.Registry import registry
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time how long the module takes to load"""
+
+    def __init__(self, loader, name, profile):
+        self.loader = loader
+        self.name = name
+        self.profile = profile
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+    def create_module(self, spec):
+        start = time.perf_counter()
+        try:
+            return self.loader.create_module(spec)
+        finally:
+            self.profile._add_import(self.name, time.perf_counter() - start)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profile._add_import(self.name, time.perf_counter() - start)
+
+
+class StartupProfile:
+    """
+    Where a cold start spends its time. Once installed, an import hook
+    times every top-level module and every services module as it is first
+    imported (including the modules it imports in turn); `step(name)` notes
+    how long after the profile was created a startup step finished, from
+    any thread. `report()` adds the time each registry service took to
+    build; imports still running in the background when it is called are
+    left out.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = {}
+        self.steps = []
+        self._finding = set()
+        self._lock = threading.Lock()
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path=None, target=None):
+        if ("." in name and not name.startswith("services.")) or name in self._finding:
+            return None
+        # Let the other finders locate the module, then time its loader
+        self._finding.add(name)
+        try:
+            spec = importlib.util.find_spec(name)
+        except Exception:
+            return None
+        finally:
+            self._finding.discard(name)
+        if spec is None or spec.loader is None:
+            return None
+        spec.loader = _TimedLoader(spec.loader, name, self)
+        return spec
+
+    def step(self, name):
+        with self._lock:
+            self.steps.append((name, time.perf_counter() - self.start))
+
+    def report(self, max_imports=15):
+        """The profile as text: the slowest imports, service builds and the startup steps, in milliseconds"""
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:max_imports]
+            steps = sorted(self.steps, key=lambda item: item[1])
+        lines = ["Startup profile (ms)", "  imports, including what they import:"]
+        lines += [f"    {name:<36} {seconds * 1000:8.1f}" for name, seconds in imports]
+        lines.append("  services built:")
+        lines += [f"    {name:<36} {seconds * 1000:8.1f}" for name, seconds in sorted(registry.init_times.items())]
+        lines.append("  steps, since startup:")
+        lines += [f"    {name:<36} {seconds * 1000:8.1f}" for name, seconds in steps]
+        return "\n".join(lines)
+
+    def _add_import(self, name, seconds):
+        with self._lock:
+            self.imports[name] = self.imports.get(name, 0.0) + seconds
@@ -0,0 +1,228 @@
+import json
+import threading
+import time
+from services.AudioBuffer import AudioBuffer
+from services.AudioStream import SAMPLE_RATE
+from services.Telemetry import in_context
+
+
+class Hypothesis:
+    """A transcript of the audio heard so far; `is_final` once the utterance has ended"""
+
+    def __init__(self, text, is_final=False, audio_seconds=0.0):
+        self.text = text
+        self.is_final = is_final
+        self.audio_seconds = audio_seconds
+
+    def __repr__(self):
+        kind = "final" if self.is_final else "partial"
+        return f"Hypothesis({kind}, {self.text!r})"
+
+
+class TranscriptionBackend:
+    """
+    Pluggable speech recognizer for StreamingTranscriber.
+
+    `open(sample_rate)` returns a session for one utterance. The session's
+    `accept(frame)` takes int16 frames as they are captured and returns the
+    current partial transcript (or None when there is nothing new), and must
+    not block for long. `finish()` returns the final transcript.
+    """
+
+    def open(self, sample_rate=SAMPLE_RATE):
+        raise NotImplementedError
+
+
+class _BufferedSession:
+    """Keeps every frame of the utterance for backends that decode whole clips"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frames = []
+        self.samples = 0
+
+    def _append(self, frame):
+        import numpy as np
+        self.frames.append(np.asarray(frame, dtype=np.int16))
+        self.samples += len(frame)
+
+    def audio(self, seconds=None):
+        """The utterance so far, or only its last `seconds`"""
+        import numpy as np
+        frames = self.frames
+        if seconds is not None:
+            wanted = int(seconds * self.sample_rate)
+            count = total = 0
+            while count < len(frames) and total < wanted:
+                count += 1
+                total += len(frames[-count])
+            frames = frames[len(frames) - count:]
+        return np.concatenate(frames) if frames else np.zeros(0, dtype=np.int16)
+
+
+class OpenAIBackend(TranscriptionBackend):
+    """
+    Remote API backend. The API transcribes whole clips, so partials come
+    from re-transcribing the last `partial_window` seconds of audio every
+    `partial_interval` seconds on a background thread, with at most one
+    request in flight; a partial of a longer utterance only covers its end.
+    Set `partial_interval=None` to only transcribe once the utterance ends.
+
+    The final transcript is still one upload of the whole utterance after
+    it ends, so this backend does not shorten the gap between the end of
+    speech and the final transcript; its partials only let later stages
+    (such as speculative generation) start early. Use an incremental
+    backend like VoskBackend to shorten that gap.
+    """
+
+    def __init__(self, stt, partial_interval=1.0, partial_window=5.0):
+        self.stt = stt
+        self.partial_interval = partial_interval
+        self.partial_window = partial_window
+
+    def open(self, sample_rate=SAMPLE_RATE):
+        return _OpenAISession(self, sample_rate)
+
+
+class _OpenAISession(_BufferedSession):
+    def __init__(self, backend, sample_rate):
+        super().__init__(sample_rate)
+        self.backend = backend
+        self._next_partial = backend.partial_interval and int(backend.partial_interval * sample_rate)
+        self._in_flight = False
+        self._latest = None
+        self._reported = None
+        self._lock = threading.Lock()
+
+    def accept(self, frame):
+        self._append(frame)
+        start = False
+        with self._lock:
+            if self._next_partial and self.samples >= self._next_partial and not self._in_flight:
+                self._next_partial = self.samples + int(self.backend.partial_interval * self.sample_rate)
+                self._in_flight = start = True
+        if start:
+            # A bounded window keeps every upload the same size however long the utterance runs
+            threading.Thread(target=in_context(self._partial), args=(self.audio(self.backend.partial_window),),
+                             daemon=True).start()
+        with self._lock:
+            if self._latest is not None and self._latest != self._reported:
+                self._reported = self._latest
+                return self._latest
+        return None
+
+    def _partial(self, samples):
+        try:
+            text = self.backend.stt.transcribe_audio(AudioBuffer.from_samples(samples, self.sample_rate))
+            if text:
+                with self._lock:
+                    self._latest = text
+        finally:
+            with self._lock:
+                self._in_flight = False
+
+    def finish(self):
+        return self.backend.stt.transcribe_audio(AudioBuffer.from_samples(self.audio(), self.sample_rate))
+
+
+class ScriptedBackend(TranscriptionBackend):
+    """
+    Local stand-in that "recognizes" a known transcript: partials reveal
+    its words at `words_per_second` of audio, and the final transcript is
+    returned after `final_latency` seconds. For tests and benchmarks.
+    """
+
+    def __init__(self, transcript, words_per_second=2.5, final_latency=0.0):
+        self.transcript = transcript
+        self.words_per_second = words_per_second
+        self.final_latency = final_latency
+
+    def open(self, sample_rate=SAMPLE_RATE):
+        return _ScriptedSession(self, sample_rate)
+
+
+class _ScriptedSession:
+    def __init__(self, backend, sample_rate):
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.words = backend.transcript.split()
+        self.samples = 0
+        self._shown = 0
+
+    def accept(self, frame):
+        self.samples += len(frame)
+        shown = min(len(self.words), int(self.samples / self.sample_rate * self.backend.words_per_second))
+        if shown == self._shown:
+            return None
+        self._shown = shown
+        return " ".join(self.words[:shown])
+
+    def finish(self):
+        if self.backend.final_latency:
+            time.sleep(self.backend.final_latency)
+        return self.backend.transcript
+
+
+class VoskBackend(TranscriptionBackend):
+    """
+    Offline, natively incremental recognition with Vosk
+    (`pip install vosk` and a model from https://alphacephei.com/vosk/models).
+    """
+
+    def __init__(self, model_path):
+        try:
+            import vosk
+        except ImportError:
+            raise ImportError("VoskBackend needs the 'vosk' package: pip install vosk")
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def open(self, sample_rate=SAMPLE_RATE):
+        return _VoskSession(self._vosk.KaldiRecognizer(self.model, sample_rate))
+
+
+class _VoskSession:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments = []
+        self._reported = None
+
+    def accept(self, frame):
+        import numpy as np
+        data = np.asarray(frame, dtype=np.int16).tobytes()
+        if self.recognizer.AcceptWaveform(data):
+            self.segments.append(json.loads(self.recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        text = " ".join(part for part in self.segments + [partial] if part)
+        if text == self._reported:
+            return None
+        self._reported = text
+        return text
+
+    def finish(self):
+        self.segments.append(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        return " ".join(part for part in self.segments if part)
+
+
+class StreamingTranscriber:
+    """Runs a backend over a stream of frames, yielding partial hypotheses and then the final one"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def transcribe(self, frames, sample_rate=SAMPLE_RATE):
+        """
+        Yield a partial Hypothesis whenever the backend's transcript changes
+        while `frames` is still producing audio, then one final Hypothesis
+        (whose text may be None if recognition failed).
+        """
+        session = self.backend.open(sample_rate)
+        samples = 0
+        for frame in frames:
+            samples += len(frame)
+            text = session.accept(frame)
+            if text:
+                yield Hypothesis(text, audio_seconds=samples / sample_rate)
+        yield Hypothesis(session.finish(), is_final=True, audio_seconds=samples / sample_rate)
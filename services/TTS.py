@@ -1,42 +1,138 @@
 import os
-import openai
-from dotenv import load_dotenv
 import tempfile
-import pygame
+from services.AudioBuffer import AudioBuffer
+from services.AudioPlayback import PlaybackEngine
+from services.OpenAIClient import get_async_service, get_service
+from services.Registry import registry
+from services.Telemetry import get_telemetry
+from services.TTSCache import TTSCache
+
+# Raw PCM from the speech API is 24 kHz 16-bit mono
+PCM_SAMPLE_RATE = 24000
+
+registry.register("tts_cache", lambda: TTSCache(cache_dir=os.getenv("TTS_CACHE_DIR", ".tts_cache")))
+registry.register("player", PlaybackEngine)
+
+
+def default_cache():
+    """Cache shared by every TextToSpeech instance that isn't given its own"""
+    return registry.get("tts_cache")
+
+
+def default_player():
+    """Playback engine shared by every TextToSpeech instance that isn't given its own"""
+    return registry.get("player")
+
 
 class TextToSpeech:
-    def __init__(self):
-        load_dotenv()
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        pygame.init()
-        pygame.mixer.init()
+    def __init__(self, model="tts-1", cache=None, client=None, async_client=None, player=None):
+        self._api = client
+        self._async_api = async_client
+        self.model = model
+        self.cache = cache if cache is not None else default_cache()
+        self._player = player
 
-    def generate_speech(self, text, voice="alloy"):
-        try:
-            # Call OpenAI TTS API
-            response = openai.audio.speech.create(
-                model="tts-1",
+    @property
+    def api(self):
+        if self._api is None:
+            self._api = get_service()
+        return self._api
+
+    @property
+    def player(self):
+        # Created on first use, so servers that only synthesize never open an audio device
+        if self._player is None:
+            self._player = default_player()
+        return self._player
+
+    def synthesize(self, text, voice="alloy", response_format="mp3"):
+        """Returns synthesized audio bytes, served from the cache when possible"""
+        def call_api():
+            response = self.api.speech(
+                model=self.model,
                 voice=voice,  # Options: 'alloy', 'echo', 'fable', 'onyx', 'nova', 'shimmer'
-                input=text
+                input=text,
+                response_format=response_format
             )
+            return response.content
+
+        audio = self.cache.get_or_create(text, voice, self.model, response_format, call_api)
+        if audio:
+            get_telemetry().mark("first_audio")
+        return audio
+
+    def synthesize_audio(self, text, voice="alloy", fmt="pcm"):
+        """
+        Synthesize `text` as an AudioBuffer in `fmt`, or None. PCM plays and
+        converts without decoding, mp3 is a third of the size.
+        """
+        data = self.synthesize(text, voice=voice, response_format=fmt)
+        if not data:
+            return None
+        return AudioBuffer(data, fmt, PCM_SAMPLE_RATE)
+
+    async def synthesize_async(self, text, voice="alloy", response_format="mp3"):
+        """
+        Same as synthesize, awaiting the API call. Cache lookups and writes
+        touch the disk, so they run in a worker thread.
+        """
+        async def call_api():
+            if self._async_api is None:
+                self._async_api = get_async_service()
+            response = await self._async_api.speech(
+                model=self.model,
+                voice=voice,
+                input=text,
+                response_format=response_format
+            )
+            return response.content
+
+        return await self.cache.get_or_create_async(text, voice, self.model, response_format, call_api)
+
+    def prewarm(self, phrases, voice="alloy", response_format="mp3"):
+        """Synthesizes known phrases ahead of time so they play without an API call"""
+        for phrase in phrases:
+            try:
+                self.synthesize(phrase, voice=voice, response_format=response_format)
+            except Exception as e:
+                print(f"Error pre-warming speech for '{phrase}': {e}")
+
+    def generate_speech(self, text, voice="alloy"):
+        try:
+            audio = self.synthesize(text, voice=voice)
             # Save to a temporary file
             with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-                fp.write(response.content)
+                fp.write(audio)
                 temp_path = fp.name
             return temp_path
         except Exception as e:
             print(f"Error generating speech: {e}")
             return None
 
+    def play(self, audio, fmt="mp3"):
+        """
+        Queue audio bytes in `fmt`, or an AudioBuffer, for playback without
+        waiting; returns a Future that resolves when it is done
+        """
+        if isinstance(audio, AudioBuffer):
+            if audio.fmt == "pcm" and audio.channels != 1:
+                audio = audio.convert(channels=1)
+            return self.player.play(audio.data, fmt=audio.fmt, sample_rate=audio.sample_rate)
+        return self.player.play(audio, fmt=fmt)
+
+    def stop(self):
+        """Stop playback immediately, dropping anything queued"""
+        self.player.stop()
+
     def play_audio(self, file_path):
+        """Play an audio file to the end, then delete it"""
         try:
             if file_path and os.path.exists(file_path):
-                pygame.mixer.music.load(file_path)
-                pygame.mixer.music.play()
-                while pygame.mixer.music.get_busy():
-                    pygame.time.Clock().tick(10)
+                with open(file_path, "rb") as f:
+                    audio = f.read()
                 os.remove(file_path)
+                self.play(audio, fmt=os.path.splitext(file_path)[1].lstrip(".") or "mp3").result()
             else:
                 print(f"Error: Audio file '{file_path}' not found")
         except Exception as e:
-            print(f"Error playing audio: {e}")
\ No newline at end of file
+            print(f"Error playing audio: {e}")
@@ -0,0 +1,208 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Entries are keyed on the normalized text, voice, model and audio format.
+    A small in-memory LRU tier, capped in items and bytes, sits in front of
+    an on-disk tier whose total size is capped; the least recently used
+    files are evicted first. Files are read and written outside the lock,
+    so a slow disk never holds up other lookups, and concurrent misses for
+    the same key share one synthesis.
+    """
+
+    def __init__(self, cache_dir=".tts_cache", max_memory_items=64, max_disk_bytes=200 * 1024 * 1024,
+                 max_memory_bytes=32 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> size, least recently used first
+        self._disk_bytes = 0
+        self._inflight = {}  # key -> Future of the synthesis filling it
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def normalize_text(text):
+        """Normalize text so trivially different spellings share an entry"""
+        return re.sub(r'\s+', ' ', unicodedata.normalize("NFKC", text)).strip()
+
+    def key(self, text, voice, model, response_format):
+        raw = "\0".join((self.normalize_text(text), voice, model, response_format))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return cached audio bytes for `key`, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return self._memory[key]
+            on_disk = key in self._disk
+        if on_disk:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                data = None
+            with self._lock:
+                if data is None:
+                    self._drop_disk(key)
+                else:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._remember(key, data)
+                    self.metrics["disk_hits"] += 1
+                    return data
+        with self._lock:
+            self.metrics["misses"] += 1
+        return None
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+        if not self.cache_dir or len(data) > self.max_disk_bytes:
+            return
+        # Write atomically so a crash never leaves a truncated entry behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing speech to the cache: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        evicted = []
+        with self._lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.max_disk_bytes:
+                oldest = next(iter(self._disk))
+                self._drop_disk(oldest)
+                evicted.append(oldest)
+                self.metrics["evictions"] += 1
+        for oldest in evicted:
+            try:
+                os.remove(self._path(oldest))
+            except OSError:
+                pass
+
+    def get_or_create(self, text, voice, model, response_format, synthesize):
+        """Return cached audio, calling `synthesize()` to fill the cache on a miss"""
+        key = self.key(text, voice, model, response_format)
+        data = self.get(key)
+        if data is not None:
+            return data
+        future, leader = self._claim(key)
+        if future is None:
+            return self.get(key)
+        if not leader:
+            return future.result()
+        try:
+            data = synthesize()
+            if data:
+                self.put(key, data)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, data)
+        return data
+
+    async def get_or_create_async(self, text, voice, model, response_format, synthesize):
+        """get_or_create for a coroutine function `synthesize`; the disk is touched in a worker thread"""
+        import asyncio
+        key = self.key(text, voice, model, response_format)
+        data = await asyncio.to_thread(self.get, key)
+        if data is not None:
+            return data
+        future, leader = self._claim(key)
+        if future is None:
+            return await asyncio.to_thread(self.get, key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            data = await synthesize()
+            if data:
+                await asyncio.to_thread(self.put, key, data)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, data)
+        return data
+
+    def _claim(self, key):
+        """The future of the synthesis for `key`, and whether the caller must run it; no future if it just finished"""
+        with self._lock:
+            if key in self._memory or key in self._disk:
+                return None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.metrics["coalesced"] += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _settle(self, key, future, data=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(data)
+
+    @property
+    def hit_rate(self):
+        hits = self.metrics["memory_hits"] + self.metrics["disk_hits"]
+        total = hits + self.metrics["misses"]
+        return hits / total if total else 0.0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".audio")
+
+    def _remember(self, key, data):
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(data) > self.max_memory_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while len(self._memory) > self.max_memory_items or self._memory_bytes > self.max_memory_bytes:
+            self._memory_bytes -= len(self._memory.popitem(last=False)[1])
+
+    def _drop_disk(self, key):
+        self._disk_bytes -= self._disk.pop(key, 0)
+
+    def _scan_disk(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".audio"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(".audio")], stat.st_size))
+            elif entry.name.endswith(".tmp"):
+                # Left over from an interrupted write
+                os.remove(entry.path)
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
@@ -0,0 +1,363 @@
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Count, sum and a window of recent values of one metric"""
+
+    def __init__(self, window=1000):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class Span:
+    """
+    Times one unit of work. `output()` notes when it produced its first
+    output, for stages that stream several.
+    """
+
+    def __init__(self, telemetry, name, attrs):
+        self.telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+        self.first_output = None
+
+    def output(self):
+        if self.first_output is None:
+            self.first_output = time.perf_counter() - self._start
+
+    def __enter__(self):
+        self._wall_start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = exc_type.__name__
+        self.telemetry._end_span(self, self._wall_start, duration)
+        return False
+
+
+class _NoopSpan:
+    def output(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class TurnClock:
+    """The current turn of one conversation: its number, when it started and the events marked in it"""
+
+    def __init__(self):
+        self.turn = 0
+        self.start = None
+        self.marks = set()
+
+
+# The turn clock of the call running in this context; None for the process-wide one
+_turn_clock = contextvars.ContextVar("turn_clock", default=None)
+
+
+def in_context(target):
+    """
+    `target` bound to the current context, for threads started on behalf of
+    a call: threads don't inherit context, and turn marks made on them
+    would otherwise be credited to the process-wide turn.
+    """
+    return functools.partial(contextvars.copy_context().run, target)
+
+
+class Telemetry:
+    """
+    Latency instrumentation for the voice pipeline.
+
+    `span(name)` times a block of work and `observe(name, seconds)` records
+    a measurement; both feed a Histogram per name and are passed on to the
+    sinks as records. The turn marks measure what the caller experiences:
+    `begin_turn()` is called when the caller stops speaking, and each
+    `mark(event)` ("transcript", "first_token", "first_audio",
+    "playback_start", ...) records the time since then as
+    `turn.end_of_speech_to_<event>`, once per turn. Each call run under
+    `turn_scope()` has its own turn, so concurrent calls don't restart or
+    claim each other's; threads working for a call must be started with
+    `in_context`.
+
+    When disabled every method returns at once, so instrumented code pays
+    no more than a method call.
+    """
+
+    def __init__(self, sinks=None, enabled=True, window=1000):
+        self.sinks = list(sinks or [])
+        self.enabled = enabled
+        self.window = window
+        self.histograms = {}
+        self._turns = TurnClock()
+        self._lock = threading.Lock()
+
+    @property
+    def turn(self):
+        """The number of the current turn in this context"""
+        return self._clock().turn
+
+    @contextmanager
+    def turn_scope(self):
+        """Give the code run inside, and threads it starts with `in_context`, a turn clock of their own"""
+        token = _turn_clock.set(TurnClock())
+        try:
+            yield
+        finally:
+            _turn_clock.reset(token)
+
+    def _clock(self):
+        return _turn_clock.get() or self._turns
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def observe(self, name, value, **attrs):
+        if not self.enabled:
+            return
+        self._add(name, value)
+        self._emit({"type": "metric", "name": name, "time": time.time(), "value": value, "turn": self.turn,
+                    "attrs": attrs})
+
+    def begin_turn(self, offset=0.0):
+        """Start timing a turn; the caller stopped speaking `offset` seconds ago"""
+        if not self.enabled:
+            return
+        clock = self._clock()
+        with self._lock:
+            clock.turn += 1
+            clock.start = time.perf_counter() - offset
+            clock.marks = set()
+
+    def mark(self, event):
+        """Record the time from the end of speech to `event`, the first time it happens in this turn"""
+        if not self.enabled:
+            return
+        clock = self._clock()
+        with self._lock:
+            if clock.start is None or event in clock.marks:
+                return
+            clock.marks.add(event)
+            elapsed = time.perf_counter() - clock.start
+        self.observe(f"turn.end_of_speech_to_{event}", elapsed)
+
+    def summary(self):
+        """p50/p95/p99 (in seconds) and counts per metric"""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def prometheus(self, prefix="voice_agent"):
+        """The histograms in the Prometheus text exposition format, as summaries in seconds"""
+        lines = []
+        for name, stats in self.summary().items():
+            metric = prefix + "_" + re.sub(r"[^a-zA-Z0-9_]", "_", name) + "_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in (50, 95, 99):
+                if stats[f"p{q}"] is not None:
+                    lines.append(f'{metric}{{quantile="{q / 100}"}} {stats[f"p{q}"]:.6f}')
+            with self._lock:
+                total = self.histograms[name].sum
+            lines.append(f"{metric}_sum {total:.6f}")
+            lines.append(f"{metric}_count {stats['count']}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        for sink in self.sinks:
+            try:
+                sink.flush(self)
+            except Exception as e:
+                print(f"[Telemetry] Error flushing {sink.__class__.__name__}: {e}")
+
+    def close(self):
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+    def _add(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.window)
+            histogram.add(value)
+
+    def _end_span(self, span, wall_start, duration):
+        self._add(span.name, duration)
+        if span.first_output is not None:
+            self._add(span.name + ".first_output", span.first_output)
+            span.attrs["first_output"] = span.first_output
+        self._emit({"type": "span", "name": span.name, "time": wall_start, "duration": duration,
+                    "turn": self.turn, "attrs": span.attrs})
+
+    def _emit(self, record):
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                print(f"[Telemetry] Error exporting to {sink.__class__.__name__}: {e}")
+
+
+class JsonlSink:
+    """Appends every span and measurement to `path` as one JSON object per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self, telemetry):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink:
+    """
+    Writes the histograms to `path` in the Prometheus text format on every
+    flush, for node_exporter's textfile collector.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, record):
+        pass
+
+    def flush(self, telemetry):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(telemetry.prometheus())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        pass
+
+
+class OpenTelemetrySink:
+    """
+    Exports spans as OpenTelemetry spans and measurements as OpenTelemetry
+    histograms, through the globally configured providers unless a tracer
+    and meter are given (`pip install opentelemetry-api opentelemetry-sdk`).
+    """
+
+    def __init__(self, tracer=None, meter=None):
+        try:
+            from opentelemetry import metrics, trace
+        except ImportError:
+            raise ImportError("OpenTelemetrySink needs the 'opentelemetry-api' package: "
+                              "pip install opentelemetry-api opentelemetry-sdk")
+        self.tracer = tracer or trace.get_tracer("aivoiceagent")
+        self.meter = meter or metrics.get_meter("aivoiceagent")
+        self._histograms = {}
+
+    def emit(self, record):
+        attrs = {key: value if isinstance(value, (str, bool, int, float)) else str(value)
+                 for key, value in record["attrs"].items()}
+        attrs["turn"] = record["turn"]
+        if record["type"] == "span":
+            start = int(record["time"] * 1e9)
+            span = self.tracer.start_span(record["name"], start_time=start, attributes=attrs)
+            span.end(end_time=start + int(record["duration"] * 1e9))
+        else:
+            histogram = self._histograms.get(record["name"])
+            if histogram is None:
+                histogram = self._histograms[record["name"]] = self.meter.create_histogram(record["name"], unit="s")
+            histogram.record(record["value"], attributes=attrs)
+
+    def flush(self, telemetry):
+        pass
+
+    def close(self):
+        pass
+
+
+def sinks_from_spec(spec):
+    """
+    Build sinks from a comma-separated spec such as
+    "jsonl:telemetry.jsonl,prometheus:metrics.prom,otel"
+    """
+    sinks = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, arg = item.partition(":")
+        if kind == "jsonl":
+            sinks.append(JsonlSink(arg or "telemetry.jsonl"))
+        elif kind == "prometheus":
+            sinks.append(PrometheusSink(arg or "metrics.prom"))
+        elif kind == "otel":
+            sinks.append(OpenTelemetrySink())
+        elif kind != "memory":
+            raise ValueError(f"Unknown telemetry sink: {kind}")
+    return sinks
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry():
+    """
+    Return the process-wide Telemetry. It is disabled unless the TELEMETRY
+    environment variable names its sinks (see sinks_from_spec; "memory"
+    only keeps the histograms).
+    """
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                spec = os.getenv("TELEMETRY", "")
+                _telemetry = Telemetry(sinks_from_spec(spec), enabled=bool(spec))
+    return _telemetry
+
+
+def set_telemetry(telemetry):
+    """Replace the process-wide Telemetry, e.g. to enable it from code"""
+    global _telemetry
+    with _telemetry_lock:
+        _telemetry = telemetry
@@ -1,43 +1,318 @@
-import os
-import openai
-from dotenv import load_dotenv
+import re
+import time
+from services.OpenAIClient import get_async_service, get_service
+from services.ConversationMemory import ConversationMemory
+from services.ResponseCache import ResponseCache
+from services.Telemetry import get_telemetry
+
+SYSTEM_PROMPT = """
+                     You are a helpful, friendly, and conversational AI assistant and act as a resentionist. 
+                     Respond in a natural, engaging way as if you were talking to a client, 
+                     make it simple, and specific. do not talk in markdown and bullets, do it like a
+                     conversational, also if possible do not cross more then 3 short"""
+
+ERROR_REPLY = "I'm sorry, I encountered an error while processing your request."
+
+
+class SentenceSegmenter:
+    """
+    Groups streamed tokens into speakable chunks.
+
+    A chunk is emitted at a sentence end (. ! ? followed by whitespace) or, once
+    the pending text is longer than `min_clause_chars`, at a clause break
+    (, ; :). Common abbreviations such as "Dr." do not end a sentence.
+    """
+
+    SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s')
+    CLAUSE_END = re.compile(r'[,;:]\s')
+    ABBREVIATIONS = ("mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "e.g.", "i.e.", "etc.", "vs.")
+
+    def __init__(self, min_clause_chars=60):
+        self.min_clause_chars = min_clause_chars
+        self._pending = ""
+
+    def feed(self, token):
+        """Add a token and return the list of chunks it completed"""
+        self._pending += token
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunk, self._pending = self._pending[:cut].strip(), self._pending[cut:]
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        chunk, self._pending = self._pending.strip(), ""
+        return [chunk] if chunk else []
+
+    def _find_cut(self):
+        for match in self.SENTENCE_END.finditer(self._pending):
+            head = self._pending[:match.end()].rstrip()
+            last_word = head.rsplit(None, 1)[-1].lower() if head else ""
+            if last_word not in self.ABBREVIATIONS:
+                return match.end()
+        if len(self._pending) >= self.min_clause_chars:
+            match = None
+            for match in self.CLAUSE_END.finditer(self._pending):
+                pass
+            if match:
+                return match.end()
+        return None
+
 
 class TextGenerator:
-    def __init__(self):
-        load_dotenv()
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        self.conversation_history = []
-    
+    def __init__(self, model="gpt-4.1-mini", max_history_tokens=2000, client=None, async_client=None,
+                 response_cache=None):
+        # Injected client, or the shared OpenAI service looked up on first use
+        self._api = client
+        self._async_api = async_client
+        self.model = model
+        self.memory = ConversationMemory(SYSTEM_PROMPT, max_tokens=max_history_tokens)
+        # Optional ResponseCache, usually shared by many conversations
+        self.response_cache = response_cache
+        # Timings of the most recent streamed response, in seconds
+        self.last_metrics = {}
+
+    @property
+    def conversation_history(self):
+        """Turns currently kept verbatim; older ones are summarized by the memory"""
+        return self.memory.history
+
+    @property
+    def api(self):
+        if self._api is None:
+            self._api = get_service()
+        return self._api
+
+    def _build_messages(self):
+        return self.memory.messages
+
+    def _cache_context(self):
+        """Fingerprint of what a reply depends on besides the user input and the system prompt"""
+        memory = self.memory
+        last = memory.history[-1] if memory.history else None
+        last_reply = last["content"] if last and last["role"] == "assistant" else ""
+        return ResponseCache.fingerprint(self.model, memory.pinned_facts, memory.summary, last_reply)
+
+    def _cached_reply(self, user_input):
+        """Return (cached reply or None, cache context), looked up before the input joins the history"""
+        if self.response_cache is None:
+            return None, None
+        context = self._cache_context()
+        return self.response_cache.get(user_input, context, self.memory.system_prompt), context
+
+    def _use_cached_reply(self, user_input, assistant_reply):
+        self.memory.add("user", user_input)
+        self.memory.add("assistant", assistant_reply)
+        self.last_metrics = {"cached": True, "time_to_first_token": 0.0, "total_time": 0.0}
+        get_telemetry().mark("first_token")
+
+    def _cache_reply(self, user_input, context, assistant_reply):
+        if self.response_cache is not None and assistant_reply and assistant_reply != ERROR_REPLY:
+            self.response_cache.put(user_input, assistant_reply, context, self.memory.system_prompt)
+
     def generate_response(self, user_input):
         """Generates a response based on user input using OpenAI's language model"""
+        cached, context = self._cached_reply(user_input)
+        if cached is not None:
+            self._use_cached_reply(user_input, cached)
+            return cached
         try:
             # Add user input to conversation history
-            self.conversation_history.append({"role": "user", "content": user_input})
-            
+            self.memory.add("user", user_input)
+
             # Get response from OpenAI API
-            response = openai.chat.completions.create(
-                model="gpt-4.1-mini",
-                messages=[
-                    {"role": "system", "content": """
-                     You are a helpful, friendly, and conversational AI assistant and act as a resentionist. 
-                     Respond in a natural, engaging way as if you were talking to a client, 
-                     make it simple, and specific. do not talk in markdown and bullets, do it like a
-                     conversational, also if possible do not cross more then 3 short"""},
-                    *self.conversation_history
-                ]
+            response = self.api.chat(
+                model=self.model,
+                messages=self._build_messages()
             )
-            
+
             # Extract assistant's reply
             assistant_reply = response.choices[0].message.content.strip()
-            
+            get_telemetry().mark("first_token")
+
             # Add assistant's reply to conversation history
-            self.conversation_history.append({"role": "assistant", "content": assistant_reply})
-            
+            self.memory.add("assistant", assistant_reply)
+            self._cache_reply(user_input, context, assistant_reply)
+
             return assistant_reply
         except Exception as e:
             print(f"Error generating response: {e}")
-            return "I'm sorry, I encountered an error while processing your request."
-    
+            return ERROR_REPLY
+
+    @property
+    def async_api(self):
+        if self._async_api is None:
+            self._async_api = get_async_service()
+        return self._async_api
+
+    async def generate_response_async(self, user_input):
+        """Same as generate_response, awaiting the API call instead of blocking on it"""
+        cached, context = self._cached_reply(user_input)
+        if cached is not None:
+            self._use_cached_reply(user_input, cached)
+            return cached
+        try:
+            self.memory.add("user", user_input)
+            response = await self.async_api.chat(
+                model=self.model,
+                messages=self._build_messages()
+            )
+            assistant_reply = response.choices[0].message.content.strip()
+            self.memory.add("assistant", assistant_reply)
+            self._cache_reply(user_input, context, assistant_reply)
+            return assistant_reply
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return ERROR_REPLY
+
+    def stream_response(self, user_input):
+        """
+        Streams the response to user input, yielding text deltas as they arrive.
+        The reply is added to the conversation history once the stream ends,
+        or with whatever was produced if the consumer stops early.
+        """
+        cached, context = self._cached_reply(user_input)
+        if cached is not None:
+            self._use_cached_reply(user_input, cached)
+            yield cached
+            return
+        self.memory.add("user", user_input)
+        start = time.perf_counter()
+        self.last_metrics = {}
+        parts = []
+        completed = False
+        try:
+            stream = self.api.chat(
+                model=self.model,
+                messages=self._build_messages(),
+                stream=True
+            )
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not parts:
+                        self.last_metrics["time_to_first_token"] = time.perf_counter() - start
+                        get_telemetry().mark("first_token")
+                    parts.append(delta)
+                    yield delta
+                completed = True
+            finally:
+                stream.response.close()
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            if not parts:
+                parts.append(ERROR_REPLY)
+                yield ERROR_REPLY
+        finally:
+            self.last_metrics["total_time"] = time.perf_counter() - start
+            assistant_reply = "".join(parts).strip()
+            if assistant_reply:
+                self.memory.add("assistant", assistant_reply)
+            if completed:
+                self._cache_reply(user_input, context, assistant_reply)
+
+    async def stream_response_async(self, user_input):
+        """Async counterpart of stream_response"""
+        cached, context = self._cached_reply(user_input)
+        if cached is not None:
+            self._use_cached_reply(user_input, cached)
+            yield cached
+            return
+        self.memory.add("user", user_input)
+        start = time.perf_counter()
+        self.last_metrics = {}
+        parts = []
+        completed = False
+        try:
+            stream = await self.async_api.chat(
+                model=self.model,
+                messages=self._build_messages(),
+                stream=True
+            )
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not parts:
+                        self.last_metrics["time_to_first_token"] = time.perf_counter() - start
+                    parts.append(delta)
+                    yield delta
+                completed = True
+            finally:
+                await stream.response.aclose()
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            if not parts:
+                parts.append(ERROR_REPLY)
+                yield ERROR_REPLY
+        finally:
+            self.last_metrics["total_time"] = time.perf_counter() - start
+            assistant_reply = "".join(parts).strip()
+            if assistant_reply:
+                self.memory.add("assistant", assistant_reply)
+            if completed:
+                self._cache_reply(user_input, context, assistant_reply)
+
+    def draft_messages(self, user_input):
+        """The messages a reply to `user_input` would be generated from right now"""
+        return self._build_messages() + [{"role": "user", "content": user_input}]
+
+    def stream_draft(self, messages):
+        """
+        Streams a reply to `messages` (see draft_messages) without touching
+        the conversation history; errors are raised to the caller.
+        """
+        stream = self.api.chat(
+            model=self.model,
+            messages=messages,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.response.close()
+
+    def commit_turn(self, user_input, assistant_reply):
+        """Adds a turn whose reply was generated with stream_draft to the conversation history"""
+        self.memory.add("user", user_input)
+        if assistant_reply:
+            self.memory.add("assistant", assistant_reply)
+
+    def stream_sentences(self, user_input, segmenter=None, tokens=None):
+        """
+        Streams the response as speakable sentence or clause chunks. `tokens`
+        replaces the stream_response(user_input) deltas when the reply comes
+        from elsewhere, such as a SpeculativeGenerator.
+        """
+        segmenter = segmenter or SentenceSegmenter()
+        start = time.perf_counter()
+        first = True
+        for token in (tokens if tokens is not None else self.stream_response(user_input)):
+            for chunk in segmenter.feed(token):
+                if first:
+                    self.last_metrics["time_to_first_sentence"] = time.perf_counter() - start
+                    first = False
+                yield chunk
+        for chunk in segmenter.flush():
+            if first:
+                self.last_metrics["time_to_first_sentence"] = time.perf_counter() - start
+                first = False
+            yield chunk
+
     def clear_conversation(self):
         """Clears the conversation history"""
-        self.conversation_history = []
\ No newline at end of file
+        self.memory.clear()
@@ -1,11 +1,19 @@
 from services.TTS import TextToSpeech
 
 class OpenAITTSBlock:
-    def __init__(self, voice="alloy"):
-        self.tts = TextToSpeech()
+    def __init__(self, voice="alloy", tts=None, to_file=True, fmt="mp3"):
+        self.tts = tts or TextToSpeech()
         self.voice = voice
+        # Return a temporary mp3 path, or an AudioBuffer in `fmt` when False
+        self.to_file = to_file
+        self.fmt = fmt
 
     def __call__(self, text):
         if text:
-            return self.tts.generate_speech(text, voice=self.voice)
+            if self.to_file:
+                return self.tts.generate_speech(text, voice=self.voice)
+            try:
+                return self.tts.synthesize_audio(text, voice=self.voice, fmt=self.fmt)
+            except Exception as e:
+                print(f"Error generating speech: {e}")
         return None
\ No newline at end of file
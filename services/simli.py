@@ -1,16 +1,262 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
-from fastapi.middleware.cors import CORSMiddleware
-import requests
-from pydantic import BaseModel
-import openai
+"""
+Simli avatar service: looks up the Simli room for the frontend and speaks
+text through the avatar by streaming real-time paced PCM over a WebSocket.
+
+    uvicorn services.simli:app --port 8000
+"""
+import asyncio
 import os
-from tempfile import NamedTemporaryFile
-import speech_recognition as sr
+import time
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+
+from services.AudioBuffer import AudioBuffer
+from services.TTS import PCM_SAMPLE_RATE, TextToSpeech
 
 load_dotenv()
 
-app = FastAPI()
+# Constants for Simli API
+SIMLI_SESSION_ID = os.getenv("SIMLI_SESSION_ID")
+SIMLI_TOKEN = os.getenv("SIMLI_TOKEN")
+SIMLI_ROOM_URL = os.getenv("SIMLI_ROOM_URL", "https://pc-7efd6f2a87c8db0e8fe4ea108a6e11b6.daily.co/hoHfCDtVcKbk3uy8l2LB")
+SIMLI_API_URL = os.getenv("SIMLI_API_URL", "http://localhost:8000/api/avatar-speak")
+SIMLI_API_BASE = os.getenv("SIMLI_API_BASE", "https://api.simli.ai")
+# Room URLs rarely change; how long a looked-up one is reused, in seconds
+SIMLI_ROOM_TTL = float(os.getenv("SIMLI_ROOM_TTL", "300"))
+
+# Simli's audio input: 16 kHz 16-bit mono PCM, sent in 20 ms frames
+AVATAR_SAMPLE_RATE = 16000
+FRAME_MS = 20
+VOICE = "nova"
+
+
+class SimliError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SingleFlightCache:
+    """
+    TTL cache for the results of coroutines. Concurrent misses for the same
+    key share one fetch, which runs to completion even if the caller that
+    started it goes away; failures are not cached.
+    """
+
+    def __init__(self, ttl=300.0, max_items=1000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.metrics = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self._entries = {}  # key -> (expires, value), oldest first
+        self._inflight = {}  # key -> task fetching it
+
+    @property
+    def hit_rate(self):
+        total = self.metrics["hits"] + self.metrics["misses"] + self.metrics["coalesced"]
+        return self.metrics["hits"] / total if total else 0.0
+
+    async def get(self, key, fetch):
+        """The cached value for `key`, or the result of `await fetch()`"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.metrics["hits"] += 1
+            return entry[1]
+        task = self._inflight.get(key)
+        if task is None:
+            self.metrics["misses"] += 1
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            # Retrieve the error even when every caller was cancelled, so it isn't reported as unhandled
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = task
+        else:
+            self.metrics["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def invalidate(self, key=None):
+        """Drop `key`, or every entry"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def _fetch(self, key, fetch):
+        try:
+            value = await fetch()
+        except Exception:
+            self.metrics["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_items:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+
+class SimliClient:
+    """
+    Async client for the Simli API. Requests share one pooled keep-alive
+    connection pool, created on first use; room lookups are cached for
+    `room_ttl` seconds.
+    """
+
+    def __init__(self, base_url=None, session_id=None, token=None, room_ttl=None, timeout=10.0):
+        self.base_url = (base_url or SIMLI_API_BASE).rstrip("/")
+        self.session_id = session_id or SIMLI_SESSION_ID
+        self.token = token or SIMLI_TOKEN
+        self.timeout = timeout
+        self.rooms = SingleFlightCache(ttl=SIMLI_ROOM_TTL if room_ttl is None else room_ttl)
+        self._http = None
+
+    @property
+    def http(self):
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+            )
+        return self._http
+
+    async def room_url(self, session_id=None, token=None):
+        """The room URL of a Simli session, the configured one by default"""
+        session_id = session_id or self.session_id
+        token = token or self.token
+        return await self.rooms.get((session_id, token), lambda: self._fetch_room_url(session_id, token))
+
+    async def _fetch_room_url(self, session_id, token):
+        response = await self.http.get(f"{self.base_url}/session/{session_id}/{token}",
+                                       headers={"Accept": "application/json"})
+        if response.status_code != 200:
+            raise SimliError(response.status_code, f"API request failed with status: {response.status_code}")
+        return response.json().get("roomUrl")
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class FramePump:
+    """
+    Sends PCM as fixed-size frames at real-time pace through `send`, a
+    coroutine function taking bytes. The first `lead` seconds go out at
+    once to fill the receiver's jitter buffer, then each frame as it falls
+    due. Clips sent back to back continue the same clock, so consecutive
+    sentences play without a gap or a burst; after an underrun the clock
+    restarts with a new lead.
+    """
+
+    def __init__(self, send, sample_rate=AVATAR_SAMPLE_RATE, frame_ms=FRAME_MS, lead=0.1):
+        self.send = send
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.frame_seconds = frame_ms / 1000
+        self.lead = lead
+        self.metrics = {"frames": 0, "late_frames": 0, "underruns": 0}
+        self._due = None  # loop time the next frame is due at
+
+    async def pump(self, data):
+        """Send `data` (16-bit PCM at the pump's rate) and return how many frames it took"""
+        loop = asyncio.get_running_loop()
+        data = memoryview(data).cast("B")
+        if self._due is None or self._due < loop.time():
+            if self._due is not None:
+                self.metrics["underruns"] += 1
+            self._due = loop.time() - self.lead
+        frames = 0
+        for start in range(0, len(data), self.frame_bytes):
+            frame = bytes(data[start:start + self.frame_bytes])
+            if len(frame) < self.frame_bytes:
+                frame += bytes(self.frame_bytes - len(frame))
+            delay = self._due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -(self.lead + self.frame_seconds):
+                self.metrics["late_frames"] += 1
+            await self.send(frame)
+            self._due += self.frame_seconds
+            self.metrics["frames"] += 1
+            frames += 1
+        return frames
+
+    def reset(self):
+        """Forget the clock, e.g. after the avatar was interrupted"""
+        self._due = None
+
+
+class AvatarSpeaker:
+    """
+    Speech for one avatar connection. Text is synthesized as soon as it is
+    queued, so the next sentence is ready while the current one plays, and
+    spoken in the order it was queued.
+    """
+
+    def __init__(self, websocket, tts, voice=VOICE):
+        self.websocket = websocket
+        self.tts = tts
+        self.voice = voice
+        self.pump = FramePump(websocket.send_bytes)
+        self._queue = asyncio.Queue()
+        self._index = 0
+        self._task = None
+
+    def say(self, text, voice=None):
+        synthesis = asyncio.create_task(self._synthesize(text, voice or self.voice))
+        self._queue.put_nowait((self._index, synthesis))
+        self._index += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._speak())
+
+    async def stop(self):
+        """Drop everything not sent yet"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        while not self._queue.empty():
+            self._queue.get_nowait()[1].cancel()
+        self.pump.reset()
+
+    async def _synthesize(self, text, voice):
+        data = await self.tts.synthesize_async(text, voice=voice, response_format="pcm")
+        audio = AudioBuffer(data, "pcm", PCM_SAMPLE_RATE)
+        # Resampling is CPU work; keep it off the event loop
+        return await asyncio.to_thread(audio.convert, AVATAR_SAMPLE_RATE)
+
+    async def _speak(self):
+        while not self._queue.empty():
+            index, synthesis = self._queue.get_nowait()
+            try:
+                audio = await synthesis
+            except Exception as e:
+                print(f"[Simli] Error generating speech: {e}")
+                await self.websocket.send_json({"type": "error", "index": index, "detail": str(e)})
+                continue
+            await self.websocket.send_json({"type": "start", "index": index, "sample_rate": audio.sample_rate,
+                                            "frame_bytes": self.pump.frame_bytes})
+            frames = await self.pump.pump(audio.data)
+            await self.websocket.send_json({"type": "done", "index": index, "frames": frames})
+
+
+simli = SimliClient()
+tts = TextToSpeech()
+stats = {"connections": 0, "frames": 0, "late_frames": 0, "underruns": 0}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await simli.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for your React app
 app.add_middleware(
@@ -21,43 +267,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure OpenAI - replace with your actual API key
-openai.api_key = os.getenv("OPENAI_API_KEYs")
-
-# Constants for Simli API
-SIMLI_SESSION_ID = os.getenv("SIMLI_SESSION_ID")
-SIMLI_TOKEN = os.getenv("SIMLI_TOKEN")
-SIMLI_ROOM_URL = os.getenv("SIMLI_ROOM_URL", "https://pc-7efd6f2a87c8db0e8fe4ea108a6e11b6.daily.co/hoHfCDtVcKbk3uy8l2LB")
-SIMLI_API_URL = os.getenv("SIMLI_API_URL", "http://localhost:8000/api/avatar-speak")
-
-# Define request models
-class TextToSpeech(BaseModel):
-    text: str
-    voice_id: str = "default"
-
-class TextRequest(BaseModel):
-    text: str
 
 @app.get("/api/room-url")
 async def get_room_url():
     """
-    Python function to fetch the room URL from Simli API
+    Fetch the room URL from the Simli API, reusing it for SIMLI_ROOM_TTL seconds
     """
     try:
-        url = f"https://api.simli.ai/session/{SIMLI_SESSION_ID}/{SIMLI_TOKEN}"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=f"API request failed with status: {response.status_code}")
-            
-        data = response.json()
-        return {"roomUrl": data.get("roomUrl")}
-    
+        return {"roomUrl": await simli.room_url()}
+    except SimliError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+@app.websocket("/ws/avatar-audio")
+async def avatar_audio(websocket: WebSocket):
+    """
+    Speak text through the avatar. Send {"text": ..., "voice": ...} per
+    sentence; each comes back as binary frames of 16 kHz 16-bit mono PCM,
+    paced in real time, between {"type": "start"} and {"type": "done"}
+    messages carrying its index. {"type": "stop"} drops whatever has not
+    been sent yet and is answered with {"type": "stopped"}.
+    """
+    await websocket.accept()
+    speaker = AvatarSpeaker(websocket, tts)
+    stats["connections"] += 1
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "stop":
+                await speaker.stop()
+                await websocket.send_json({"type": "stopped"})
+            elif message.get("text"):
+                speaker.say(message["text"], message.get("voice"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await speaker.stop()
+        stats["connections"] -= 1
+        for name in ("frames", "late_frames", "underruns"):
+            stats[name] += speaker.pump.metrics[name]
+
+
+@app.get("/api/stats")
+async def get_stats():
+    """Room lookup cache and avatar audio counters"""
+    return {
+        "room_cache": {**simli.rooms.metrics, "hit_rate": simli.rooms.hit_rate},
+        "avatar_audio": stats,
+    }
@@ -1,16 +1,36 @@
-from flask import Flask, render_template, request, jsonify
-from services.TTS import TextToSpeech
+from flask import Flask, Response, abort, render_template, request, jsonify, stream_with_context
+from services.AudioBuffer import MIME_TYPES
+from services.ReplyStream import iter_reply_events, sse_event
+from services.ResponseCache import ResponseCache
+from services.SessionStore import SessionStore
 from services.TextGen import TextGenerator
 from services.pipecat_openai_tts import OpenAITTSBlock
 import os
-import tempfile
+import threading
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
-# Initialize services
-text_generator = TextGenerator()
+class ConversationSession:
+    """Conversation state of one browser session"""
+
+    def __init__(self):
+        self.text_generator = TextGenerator(response_cache=response_cache)
+        # Requests are served on several threads; a session's turns are handled one at a time
+        self.lock = threading.Lock()
+
+
+# Initialize services; the reply cache is shared, each session has its own conversation
+response_cache = ResponseCache()
+sessions = SessionStore(ConversationSession,
+                        max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+                        ttl=float(os.getenv("SESSION_TTL", "1800")))
 tts = OpenAITTSBlock(voice="nova")
 
+
+def get_session():
+    """The (session_id, session) the request belongs to, from `session_id` in the body or X-Session-Id"""
+    return sessions.get(request.json.get('session_id') or request.headers.get('X-Session-Id'))
+
 @app.route('/')
 def index():
     """Render the main page with the Simli avatar"""
@@ -18,26 +38,72 @@ def index():
 
 @app.route('/api/generate-response', methods=['POST'])
 def generate_response():
-    """Generate AI response from user input and return speech file URL"""
+    """Generate AI response from user input and return the URL of its speech"""
     if not request.json or 'text' not in request.json:
         return jsonify({'error': 'Missing text parameter'}), 400
     
     user_text = request.json['text']
+    fmt = request.json.get('format', 'mp3')
+    if fmt not in MIME_TYPES:
+        return jsonify({'error': f'Unsupported audio format: {fmt}'}), 400
     
     # Generate AI response
-    ai_response = text_generator.generate_response(user_text)
-    
-    # Generate speech file
-    speech_file = tts(ai_response)
+    session_id, session = get_session()
+    with session.lock:
+        ai_response = session.text_generator.generate_response(user_text)
     
-    # Return response with path to speech file
-    speech_url = f"/static/audio/{os.path.basename(speech_file)}"
+    # Synthesize speech; it stays in the TTS cache and is served from there
+    try:
+        tts.tts.synthesize(ai_response, voice=tts.voice, response_format=fmt)
+        speech_url = f"/api/audio/{tts.tts.cache.key(ai_response, tts.voice, tts.tts.model, fmt)}.{fmt}"
+    except Exception as e:
+        print(f"Error generating speech: {e}")
+        speech_url = None
     
     return jsonify({
         'text': ai_response,
-        'audio_url': speech_url
+        'audio_url': speech_url,
+        'session_id': session_id
     })
 
+@app.route('/api/generate-response-stream', methods=['POST'])
+def generate_response_stream():
+    """
+    Stream the AI response as Server-Sent Events: the session id first,
+    then text deltas as they are generated and the speech of each sentence
+    (mp3 unless `format` asks for another) as soon as it is synthesized;
+    with format "none" each sentence's text instead, for the Simli avatar
+    service to speak
+    """
+    if not request.json or 'text' not in request.json:
+        return jsonify({'error': 'Missing text parameter'}), 400
+    
+    user_text = request.json['text']
+    fmt = request.json.get('format', 'mp3')
+    if fmt not in MIME_TYPES and fmt != 'none':
+        return jsonify({'error': f'Unsupported audio format: {fmt}'}), 400
+    
+    session_id, session = get_session()
+    
+    def events():
+        yield sse_event('session', {'session_id': session_id})
+        with session.lock:
+            for event, data in iter_reply_events(session.text_generator, tts.tts, user_text, voice=tts.voice,
+                                                 response_format=None if fmt == 'none' else fmt):
+                yield sse_event(event, data)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/audio/<name>')
+def audio(name):
+    """Serve synthesized speech straight from the TTS cache, as <key>.<format> (mp3 without one)"""
+    key, _, fmt = name.partition('.')
+    data = tts.tts.cache.get(key)
+    if data is None or (fmt or 'mp3') not in MIME_TYPES:
+        abort(404)
+    return Response(data, mimetype=MIME_TYPES[fmt or 'mp3'])
+
 @app.route('/api/simli-config')
 def simli_config():
     """Return Simli configuration for the frontend"""
@@ -45,12 +111,10 @@ def simli_config():
         'roomUrl': os.getenv('SIMLI_ROOM_URL', 
                             'https://pc-7efd6f2a87c8db0e8fe4ea108a6e11b6.daily.co/hoHfCDtVcKbk3uy8l2LB'),
         'sessionId': os.getenv('SIMLI_SESSION_ID', ''),
-        'token': os.getenv('SIMLI_TOKEN', '')
+        'token': os.getenv('SIMLI_TOKEN', ''),
+        'audioSocketUrl': os.getenv('SIMLI_AUDIO_WS_URL', '')
     })
 
 if __name__ == '__main__':
-    # Create static audio directory if it doesn't exist
-    os.makedirs('static/audio', exist_ok=True)
-    
     # Run the Flask app
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=True, port=5000, threaded=True)
\ No newline at end of file